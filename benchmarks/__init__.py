@@ -0,0 +1,3 @@
+"""
+Offline benchmarks for the bot, run with `python -m benchmarks.run`.
+"""
@@ -0,0 +1,30 @@
+"""
+failover.py
+
+A bot stand-in for the leader failover benchmark: it only competes for the leader
+lease, like `Runtime.run_bot` does, and reports its role on stdout.
+
+    python -m benchmarks.failover sqlite /tmp/leader.db 1.0
+
+prints "STANDBY" once it waits for the lease and "LEADER" as soon as it holds it.
+"""
+
+import asyncio
+import sys
+
+from services.leader import LeaderElector, create_lease
+
+
+async def compete(backend, path, ttl):
+    elector = LeaderElector(create_lease(backend, path), ttl=ttl)
+    if not await elector._try():
+        print("STANDBY", flush=True)
+        await elector.acquire()
+    print("LEADER", flush=True)
+    await elector.hold()
+    print("LOST", flush=True)
+
+
+if __name__ == "__main__":
+    backend, path, ttl = sys.argv[1], sys.argv[2], float(sys.argv[3])
+    asyncio.run(compete(backend, path, ttl))
@@ -0,0 +1,452 @@
+"""
+fakes.py
+
+In-process stand-ins for the Google Calendar, Twilio Conversations and OpenWeather
+APIs, so the bot can be benchmarked end to end without network access.
+
+Each server runs on a local port in a background thread, answers the endpoints the
+bot uses with responses shaped like the real ones, and counts the requests it
+served. Latency, error rate and data sizes are configurable per server.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlsplit
+
+from twilio.http.http_client import TwilioHttpClient
+
+TWILIO_BASE_URL = "https://conversations.twilio.com"
+
+
+class FakeServer:
+    """
+    A local HTTP server with simulated latency and errors.
+
+    Subclasses register routes as (method, path regex, handler); a handler receives the
+    path match, the query parameters and the form body, and returns (status, payload).
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, seed=0):
+        """
+        Args:
+            latency (float): Seconds every response is delayed by.
+            jitter (float): Additional random delay of up to this many seconds.
+            error_rate (float): Fraction of requests answered with `error_status`.
+            error_status (int): The status code of a simulated error.
+            seed (int): Seed for the random errors and jitter.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.calls = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._routes = []
+        self._httpd = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def route(self, method, pattern, handler, name):
+        self._routes.append((method, re.compile(pattern + "$"), handler, name))
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this, delayed ACKs add ~40 ms
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server._dispatch(self)
+
+            def do_POST(self):
+                server._dispatch(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+
+    def _dispatch(self, request):
+        url = urlsplit(request.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(request.headers.get("Content-Length") or 0)
+        body = request.rfile.read(length).decode()
+        if request.headers.get("Content-Type", "").startswith("application/json"):
+            form = json.loads(body or "{}")
+        else:
+            form = {key: values[-1] for key, values in parse_qs(body).items()}
+
+        for method, pattern, handler, name in self._routes:
+            match = pattern.match(url.path)
+            if method == request.command and match:
+                break
+        else:
+            return self._reply(request, 404, {"message": f"No route for {request.command} {url.path}"})
+
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            return self._reply(request, self.error_status, {"message": "Simulated error", "status": self.error_status})
+        status, payload = handler(match, query, form)
+        self._reply(request, status, payload)
+
+    def _reply(self, request, status, payload):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        request.send_response(status)
+        if payload is not None:
+            request.send_header("Content-Type", "application/json; charset=UTF-8")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+class FakeCalendarServer(FakeServer):
+    """
+    Serves `calendarList.list`, `events.list` (incl. paging and sync tokens), `events.watch`,
+    `channels.stop` and `freebusy.query` of the Calendar API v3 for generated calendars.
+
+    `update_event` changes an event like a user would; the change is returned by the
+    next incremental sync and announced to the open watch channels of the calendar.
+    """
+
+    def __init__(self, calendars=3, events_per_calendar=200, days=14, page_size=250, **kwargs):
+        """
+        Args:
+            calendars (int): Number of calendars.
+            events_per_calendar (int): Events per calendar, spread over the next `days` days.
+            days (int): Time span the events are spread over, starting yesterday.
+            page_size (int): Upper bound for events per page, as the real API applies one.
+        """
+        super().__init__(**kwargs)
+        self.page_size = page_size
+        self.events = {}
+        start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) - timedelta(days=1)
+        for c in range(calendars):
+            cal_id = f"calendar-{c}@bench"
+            items = []
+            for i in range(events_per_calendar):
+                begin = start + timedelta(minutes=(i * (days + 1) * 24 * 60) // max(events_per_calendar, 1) + c * 7)
+                items.append({
+                    "kind": "calendar#event",
+                    "id": f"c{c}e{i}",
+                    "status": "confirmed",
+                    "summary": f"Termin {i} in Kalender {c}",
+                    "start": {"dateTime": begin.isoformat().replace("+00:00", "Z")},
+                    "end": {"dateTime": (begin + timedelta(minutes=30)).isoformat().replace("+00:00", "Z")},
+                    "_start": begin,
+                    "_version": 0,
+                })
+            self.events[cal_id] = items
+        # Incremented with every change; sync tokens are 'sync-<version>'
+        self.version = 0
+        self.channels = {}  # channel id -> watch request body plus calendar and resource id
+        self.route("GET", r"/calendar/v3/users/me/calendarList", self._calendar_list, "calendarList.list")
+        self.route("GET", r"/calendar/v3/calendars/(?P<cal>[^/]+)/events", self._events_list, "events.list")
+        self.route("POST", r"/calendar/v3/calendars/(?P<cal>[^/]+)/events/watch", self._events_watch, "events.watch")
+        self.route("POST", r"/calendar/v3/channels/stop", self._channels_stop, "channels.stop")
+        self.route("POST", r"/calendar/v3/freeBusy", self._freebusy, "freebusy.query")
+
+    @property
+    def sync_token(self):
+        return f"sync-{self.version}"
+
+    def update_event(self, cal_id, index, summary=None, start=None, notify=True):
+        """
+        Renames and/or moves an event and, unless `notify` is False, posts a notification
+        to every channel watching its calendar.
+
+        Args:
+            start (datetime, optional): The new tz-aware start; the event keeps its 30 minutes.
+
+        Returns:
+            list: The HTTP status of each notification.
+        """
+        with self._lock:
+            self.version += 1
+            event = self.events[cal_id][index]
+            if summary is not None:
+                event["summary"] = summary
+            if start is not None:
+                start = start.astimezone(timezone.utc)
+                event["_start"] = start
+                event["start"] = {"dateTime": start.isoformat().replace("+00:00", "Z")}
+                event["end"] = {"dateTime": (start + timedelta(minutes=30)).isoformat().replace("+00:00", "Z")}
+            event["_version"] = self.version
+        return self.notify(cal_id) if notify else []
+
+    def notify(self, cal_id, state="exists"):
+        """
+        Posts a change notification to the channels of a calendar, like Google does.
+
+        Returns:
+            list: The HTTP status of each notification.
+        """
+        with self._lock:
+            channels = [channel for channel in self.channels.values() if channel["calendar"] == cal_id]
+        return [self._post_notification(channel, state) for channel in channels]
+
+    def _post_notification(self, channel, state):
+        channel["messages"] += 1
+        headers = {
+            "X-Goog-Channel-ID": channel["id"],
+            "X-Goog-Channel-Token": channel.get("token", ""),
+            "X-Goog-Resource-ID": channel["resourceId"],
+            "X-Goog-Resource-State": state,
+            "X-Goog-Message-Number": str(channel["messages"]),
+        }
+        request = urllib.request.Request(channel["address"], data=b"", headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+        except OSError:
+            return None
+
+    def _calendar_list(self, match, query, form):
+        calendar_ids = list(self.events)
+        size = min(int(query.get("maxResults", 100)), 250)
+        offset = int(query.get("pageToken", 0))
+        response = {"kind": "calendar#calendarList", "items": [{"id": cal_id} for cal_id in calendar_ids[offset:offset + size]]}
+        if offset + size < len(calendar_ids):
+            response["nextPageToken"] = str(offset + size)
+        return 200, response
+
+    def _events_list(self, match, query, form):
+        cal_id = unquote(match.group("cal"))
+        if cal_id not in self.events:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        if "syncToken" in query:
+            # Only the events changed since the token was issued, in one page
+            since = int(query["syncToken"].rsplit("-", 1)[-1])
+            with self._lock:
+                changed = [self._public(e) for e in self.events[cal_id] if e["_version"] > since]
+                return 200, {"kind": "calendar#events", "items": changed, "nextSyncToken": self.sync_token}
+
+        items = self.events[cal_id]
+        if "timeMin" in query:
+            time_min = datetime.fromisoformat(query["timeMin"].replace("Z", "+00:00"))
+            items = [e for e in items if e["_start"] + timedelta(minutes=30) > time_min]
+        if "timeMax" in query:
+            time_max = datetime.fromisoformat(query["timeMax"].replace("Z", "+00:00"))
+            items = [e for e in items if e["_start"] < time_max]
+
+        size = min(int(query.get("maxResults", self.page_size)), self.page_size)
+        offset = int(query.get("pageToken", 0))
+        page = [self._public(e) for e in items[offset:offset + size]]
+        response = {"kind": "calendar#events", "items": page}
+        if offset + size < len(items):
+            response["nextPageToken"] = str(offset + size)
+        else:
+            response["nextSyncToken"] = self.sync_token
+        return 200, response
+
+    @staticmethod
+    def _public(event):
+        return {k: v for k, v in event.items() if not k.startswith("_")}
+
+    def _events_watch(self, match, query, form):
+        cal_id = unquote(match.group("cal"))
+        if cal_id not in self.events:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        ttl = int(form.get("params", {}).get("ttl", 7 * 24 * 60 * 60))
+        expiration = int((time.time() + ttl) * 1000)
+        channel = dict(form, calendar=cal_id, resourceId=uuid.uuid4().hex, messages=0)
+        with self._lock:
+            self.channels[channel["id"]] = channel
+        # Google confirms a new channel with a 'sync' message
+        threading.Thread(target=self._post_notification, args=(channel, "sync"), daemon=True).start()
+        return 200, {
+            "kind": "api#channel", "id": channel["id"], "resourceId": channel["resourceId"],
+            "resourceUri": f"{self.url}/calendar/v3/calendars/{match.group('cal')}/events",
+            "token": form.get("token"), "expiration": str(expiration),
+        }
+
+    def _freebusy(self, match, query, form):
+        time_min = datetime.fromisoformat(form["timeMin"].replace("Z", "+00:00"))
+        time_max = datetime.fromisoformat(form["timeMax"].replace("Z", "+00:00"))
+        calendars = {}
+        with self._lock:
+            for item in form.get("items", []):
+                items = self.events.get(item["id"])
+                if items is None:
+                    calendars[item["id"]] = {"errors": [{"domain": "global", "reason": "notFound"}], "busy": []}
+                    continue
+                calendars[item["id"]] = {"busy": [
+                    {"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]}
+                    for e in sorted(items, key=lambda e: e["_start"])
+                    if e["_start"] < time_max and e["_start"] + timedelta(minutes=30) > time_min
+                ]}
+        return 200, {"kind": "calendar#freeBusy", "timeMin": form["timeMin"], "timeMax": form["timeMax"], "calendars": calendars}
+
+    def _channels_stop(self, match, query, form):
+        with self._lock:
+            channel = self.channels.get(form.get("id"))
+            if channel is None or channel["resourceId"] != form.get("resourceId"):
+                return 404, {"error": {"code": 404, "message": "Channel not found"}}
+            del self.channels[form["id"]]
+        return 204, None
+
+
+class FakeTwilioServer(FakeServer):
+    """
+    Serves the Conversations v1 endpoints the bot uses: listing conversations and
+    listing/creating messages, with `Order`/`PageSize` paging like the real API.
+    """
+
+    def __init__(self, history=1000, started=None, **kwargs):
+        """
+        Args:
+            history (int): Number of messages already in the conversation.
+            started (datetime, optional): Creation time of the newest message in the history.
+        """
+        super().__init__(**kwargs)
+        self.conversation_sid = "CH" + "0" * 32
+        self.service_sid = "IS" + "0" * 32
+        self.messages = []
+        newest = started or datetime.now(timezone.utc) - timedelta(minutes=1)
+        for i in range(history):
+            self.add_message("user", str(i % 5 + 1), newest - timedelta(seconds=history - i))
+        base = r"/v1/Services/(?P<svc>IS\w+)/Conversations"
+        self.route("GET", base, self._list_conversations, "conversations.list")
+        self.route("GET", base + r"/(?P<conv>CH\w+)/Messages", self._list_messages, "messages.list")
+        self.route("POST", base + r"/(?P<conv>CH\w+)/Messages", self._create_message, "messages.create")
+
+    def add_message(self, author, body, created=None, attributes="{}", conversation_sid=None):
+        """
+        Appends a message to the conversation, e.g. to simulate an incoming command.
+
+        Messages posted to other conversations (e.g. of subscribers) are kept in the same
+        list with their own `conversation_sid`.
+        """
+        index = len(self.messages)
+        created = created or datetime.now(timezone.utc)
+        message = {
+            "sid": f"IM{index:032d}",
+            "index": index,
+            "conversation_sid": conversation_sid or self.conversation_sid,
+            "chat_service_sid": self.service_sid,
+            "author": author,
+            "body": body,
+            "attributes": attributes,
+            "date_created": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "date_updated": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        with self._lock:
+            self.messages.append(message)
+        return message
+
+    def _page_meta(self, path, query, key, page, has_next):
+        def url(number):
+            params = dict(query, Page=str(number), PageToken=f"PT{number}")
+            return f"{TWILIO_BASE_URL}{path}?{urlencode(params)}"
+
+        return {
+            "page": page,
+            "page_size": int(query.get("PageSize", 50)),
+            "first_page_url": url(0),
+            "previous_page_url": url(page - 1) if page > 0 else None,
+            "url": url(page),
+            "next_page_url": url(page + 1) if has_next else None,
+            "key": key,
+        }
+
+    def _list_conversations(self, match, query, form):
+        conversation = {"sid": self.conversation_sid, "chat_service_sid": self.service_sid,
+                        "friendly_name": "HackathonChat", "state": "active"}
+        path = f"/v1/Services/{match.group('svc')}/Conversations"
+        return 200, {"conversations": [conversation], "meta": self._page_meta(path, query, "conversations", 0, False)}
+
+    def _list_messages(self, match, query, form):
+        size = int(query.get("PageSize", 50))
+        page = int(query.get("Page", 0))
+        with self._lock:
+            messages = [message for message in self.messages if message["conversation_sid"] == match.group("conv")]
+        if query.get("Order") == "desc":
+            messages.reverse()
+        items = messages[page * size:(page + 1) * size]
+        path = f"/v1/Services/{match.group('svc')}/Conversations/{match.group('conv')}/Messages"
+        has_next = (page + 1) * size < len(messages)
+        return 200, {"messages": items, "meta": self._page_meta(path, query, "messages", page, has_next)}
+
+    def _create_message(self, match, query, form):
+        return 201, self.add_message(form.get("Author", "system"), form.get("Body", ""),
+                                     attributes=form.get("Attributes", "{}"), conversation_sid=match.group("conv"))
+
+
+class FakeWeatherServer(FakeServer):
+    """
+    Serves the OpenWeather current weather and 5-day/3-hour forecast endpoints for any city.
+    """
+
+    CONDITIONS = (("Clear", "klarer himmel"), ("Clouds", "bewölkt"), ("Rain", "leichter regen"))
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.route("GET", r"/data/2.5/weather", self._weather, "weather")
+        self.route("GET", r"/data/2.5/forecast", self._forecast, "forecast")
+
+    def _weather(self, match, query, form):
+        return 200, {
+            "name": query.get("q", ""),
+            "weather": [{"main": "Rain", "description": "leichter regen"}],
+            "main": {"temp": 12.4, "humidity": 80},
+        }
+
+    def _forecast(self, match, query, form):
+        # 40 entries from the current 3-hour slot on, like the real endpoint
+        first = int(time.time()) // (3 * 60 * 60) * (3 * 60 * 60)
+        entries = []
+        for i in range(40):
+            main, description = self.CONDITIONS[i % len(self.CONDITIONS)]
+            entries.append({
+                "dt": first + i * 3 * 60 * 60,
+                "main": {"temp": 8.0 + i % 8, "humidity": 70},
+                "weather": [{"main": main, "description": description}],
+            })
+        return 200, {"city": {"name": query.get("q", "")}, "list": entries}
+
+
+class RedirectingHttpClient(TwilioHttpClient):
+    """
+    A Twilio HTTP client that sends every request to a local server instead of twilio.com.
+    """
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        parts = urlsplit(url)
+        local_url = f"{self.base_url}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super().request(method, local_url, *args, **kwargs)
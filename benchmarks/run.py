@@ -0,0 +1,122 @@
+"""
+run.py
+
+Runs the offline benchmarks and compares them against the stored baseline.
+
+    python -m benchmarks.run                    # run all scenarios, compare with the baseline
+    python -m benchmarks.run command_1_today    # run selected scenarios
+    python -m benchmarks.run --update-baseline  # store the results as the new baseline
+
+A scenario regresses if it needs more API calls per operation than in the baseline, if
+its p99 latency grew by more than the tolerance, or, for scenarios that track their
+allocations, if its peak memory grew by more than `ALLOCATION_TOLERANCE`. The exit code
+is 1 if any scenario regressed, so the run can gate a change.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Allowed p99 growth over the baseline, relative and in milliseconds
+LATENCY_TOLERANCE = 0.5
+LATENCY_SLACK_MS = 5.0
+# Allowed relative growth of the peak memory of an operation
+ALLOCATION_TOLERANCE = 0.2
+
+
+def compare(result, baseline, tolerance=LATENCY_TOLERANCE):
+    """
+    Compares one scenario result with its baseline entry.
+
+    Returns:
+        list: Descriptions of the regressions; empty if there are none.
+    """
+    problems = []
+    if result["calls"] > baseline["calls"] + 0.01:
+        problems.append(f"API-Aufrufe {baseline['calls']} -> {result['calls']}")
+    if result["p99"] > baseline["p99"] * (1 + tolerance) + LATENCY_SLACK_MS:
+        problems.append(f"p99 {baseline['p99']:.1f} ms -> {result['p99']:.1f} ms")
+    if "peak_kib" in result and "peak_kib" in baseline:
+        if result["peak_kib"] > baseline["peak_kib"] * (1 + ALLOCATION_TOLERANCE):
+            problems.append(f"Speicher {baseline['peak_kib']:.0f} KiB -> {result['peak_kib']:.0f} KiB")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for MorningSync")
+    parser.add_argument("scenarios", nargs="*", help="scenario names (default: all)")
+    parser.add_argument("--latency", type=float, default=10, help="fake API latency in ms (default: 10)")
+    parser.add_argument("--jitter", type=float, default=0, help="additional random latency in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of failing API requests")
+    parser.add_argument("--calendars", type=int, default=3)
+    parser.add_argument("--events", type=int, default=200, help="events per calendar")
+    parser.add_argument("--history", type=int, default=50000, help="messages in the conversation")
+    parser.add_argument("--subscribers", type=int, default=500)
+    parser.add_argument("--iterations", type=int, help="override the repetitions per scenario")
+    parser.add_argument("--tolerance", type=float, default=LATENCY_TOLERANCE, help="allowed relative p99 growth")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own output")
+    args = parser.parse_args(argv)
+
+    from benchmarks.scenarios import SCENARIOS, BenchEnvironment, run_scenario
+
+    selected = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    unknown = set(args.scenarios) - {s.name for s in SCENARIOS}
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    env = BenchEnvironment(
+        latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate,
+        calendars=args.calendars, events=args.events, history=args.history, subscribers=args.subscribers
+    )
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if baseline and baseline.get("params") != env.params:
+        print("⚠️ Parameter weichen von der Baseline ab, Vergleich nur bedingt aussagekräftig.")
+
+    print(f"{'Szenario':<26}{'Ops':>5}{'p50 ms':>10}{'p99 ms':>10}{'Calls/Op':>10}{'Peak KiB':>10}  Baseline p99 / Calls")
+    results = {}
+    regressions = 0
+    try:
+        for scenario in selected:
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                result = run_scenario(env, scenario, args.iterations)
+            results[scenario.name] = result
+            reference = baseline.get("scenarios", {}).get(scenario.name)
+            peak = f"{result['peak_kib']:.0f}" if "peak_kib" in result else "-"
+            line = f"{scenario.name:<26}{result['ops']:>5}{result['p50']:>10.1f}{result['p99']:>10.1f}{result['calls']:>10.2f}{peak:>10}"
+            if reference:
+                problems = compare(result, reference, args.tolerance)
+                line += f"  {reference['p99']:>8.1f} / {reference['calls']:<6}"
+                if "peak_kib" in reference:
+                    line += f" / {reference['peak_kib']:.0f} KiB"
+                line += "  ❌ " + ", ".join(problems) if problems else "  ✅"
+                regressions += bool(problems)
+            print(line)
+    finally:
+        env.close()
+
+    if args.update_baseline:
+        merged = dict(baseline.get("scenarios", {}), **results)
+        with open(args.baseline, "w") as f:
+            json.dump({"params": env.params, "scenarios": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"💾 Baseline gespeichert: {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"❌ {regressions} Szenario(s) langsamer als die Baseline.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
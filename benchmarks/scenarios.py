@@ -0,0 +1,736 @@
+"""
+scenarios.py
+
+The benchmark scenarios and the environment they run in.
+
+`BenchEnvironment` starts the fake servers and points the bot's Calendar, Twilio and
+OpenWeather clients at them. Every scenario is one user-visible operation (a command,
+the daily digest, a poll, ...) that is timed end to end, including the delivery of
+the reply through the outbox.
+"""
+
+import asyncio
+import heapq
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytz
+
+from benchmarks.fakes import FakeCalendarServer, FakeTwilioServer, FakeWeatherServer, RedirectingHttpClient
+
+# Subscribers of the cold wave, and how many threads the bot may start for it (its pools)
+COLD_WAVE_SUBSCRIBERS = 10000
+COLD_WAVE_MAX_NEW_THREADS = 100
+
+
+class BenchEnvironment:
+    """
+    The fake servers plus the bot modules wired up to use them.
+    """
+
+    def __init__(self, latency=0.01, jitter=0.0, error_rate=0.0, calendars=3, events=200,
+                 history=50000, subscribers=500, format_events=10000, alert_events=100000,
+                 dense_calendars=20, dense_events=100):
+        """
+        Args:
+            latency (float): Seconds every fake API response is delayed by.
+            jitter (float): Additional random delay per response in seconds.
+            error_rate (float): Fraction of API requests that fail with a 503.
+            calendars (int): Number of calendars.
+            events (int): Events per calendar.
+            history (int): Messages already in the conversation.
+            subscribers (int): Subscribers in the digest wave.
+            format_events (int): Events rendered by the formatter scenario.
+            alert_events (int): Upcoming events planned by the alert scenarios.
+            dense_calendars (int): Calendars of the dense week in the availability scenario.
+            dense_events (int): Events per calendar in that week.
+        """
+        self.params = {
+            "latency": latency, "jitter": jitter, "error_rate": error_rate, "calendars": calendars,
+            "events": events, "history": history, "subscribers": subscribers, "format_events": format_events,
+            "alert_events": alert_events, "dense_calendars": dense_calendars, "dense_events": dense_events,
+        }
+        server_options = {"latency": latency, "jitter": jitter, "error_rate": error_rate}
+        self.calendar = FakeCalendarServer(calendars=calendars, events_per_calendar=events, **server_options).start()
+        self.twilio = FakeTwilioServer(history=history, **server_options).start()
+        self.weather = FakeWeatherServer(**server_options).start()
+        self.servers = {"calendar": self.calendar, "twilio": self.twilio, "weather": self.weather}
+        self._tmp = tempfile.TemporaryDirectory(prefix="morningsync-bench-")
+        self._cleanups = []
+        self._install()
+
+    def _install(self):
+        """
+        Configures the bot through its environment variables and swaps in clients that
+        talk to the fake servers. Must run before any bot module is imported.
+        """
+        os.environ.update({
+            "ACCOUNT_SID": "AC" + "0" * 32,
+            "API_KEY_SID": "SK" + "0" * 32,
+            "API_KEY_SECRET": "bench",
+            "CHAT_SERVICE_SID": self.twilio.service_sid,
+            "CONVERSATION_SID_PATH": self.path("conversation_sid.txt"),
+            "MESSAGE_CURSOR_PATH": self.path("message_cursor.json"),
+            "EVENT_STORE_PATH": "",
+            "OPENWEATHER_API_KEY": "bench",
+            "INCLUDE_WEATHER_MESSAGE": "true",
+            "INCLUDE_FUNNY_WEATHER": "true",
+            "INCLUDE_OUTFIT_TIP": "true",
+            "INCLUDE_EVENT_WEATHER": "true",
+            "MESSAGE_LANGUAGE": "de",
+            "OUTBOX_SIZE": "100000",
+            "OUTBOX_RATE_PER_SECOND": "100000",
+            "OUTBOX_BURST": "1000",
+        })
+
+        from google.oauth2.credentials import Credentials
+        from twilio.rest import Client
+
+        from services import google_calendar, twilio_api, weather
+        from services.calendar_client import CalendarClient
+        from services.event_store import EventStore
+
+        class BenchCalendarClient(CalendarClient):
+            def _load_credentials(self):
+                self.stats["auth"] += 1
+                return Credentials(token="bench")
+
+        self.calendar_client = BenchCalendarClient(api_endpoint=f"{self.calendar.url}/calendar/v3/")
+        self.store = EventStore(google_calendar.timezone, client=self.calendar_client, path="")
+        google_calendar._event_store = self.store
+
+        twilio_api.client = Client(
+            os.environ["API_KEY_SID"], os.environ["API_KEY_SECRET"], os.environ["ACCOUNT_SID"],
+            http_client=RedirectingHttpClient(self.twilio.url, timeout=twilio_api.TWILIO_TIMEOUT_SECONDS)
+        )
+        weather._provider = weather.WeatherProvider("bench", url=f"{self.weather.url}/data/2.5/weather")
+        weather._forecast_provider = weather.ForecastProvider("bench", url=f"{self.weather.url}/data/2.5/forecast")
+
+    def path(self, name):
+        """
+        Returns:
+            str: A path in the environment's temporary directory.
+        """
+        return os.path.join(self._tmp.name, name)
+
+    def calls(self):
+        """
+        Returns:
+            int: Requests served by all fake servers so far.
+        """
+        return sum(server.total_calls() for server in self.servers.values())
+
+    def on_close(self, cleanup):
+        """
+        Registers a function that `close` calls, e.g. to stop a scenario's own servers.
+        """
+        self._cleanups.append(cleanup)
+
+    def close(self):
+        for cleanup in reversed(self._cleanups):
+            cleanup()
+        for server in self.servers.values():
+            server.stop()
+        self._tmp.cleanup()
+
+
+class Scenario:
+    """
+    One benchmarked operation.
+
+    Attributes:
+        name (str): The name used in reports and the baseline.
+        iterations (int): Timed repetitions.
+        warmup (int): Untimed repetitions before, e.g. to fill caches.
+        track_allocations (bool): Also measure the peak memory allocated by one operation.
+    """
+
+    def __init__(self, name, setup, iterations=50, warmup=1, track_allocations=False):
+        """
+        Args:
+            setup (Callable[[BenchEnvironment], Callable[[], None]]): Prepares the scenario
+                and returns the operation to time. If only part of the operation counts,
+                it returns the duration of that part as float seconds.
+        """
+        self.name = name
+        self.setup = setup
+        self.iterations = iterations
+        self.warmup = warmup
+        self.track_allocations = track_allocations
+
+
+def _command(number):
+    def setup(env):
+        from services.twilio_api import handle_incoming_message, outbox
+
+        def run():
+            handle_incoming_message(number)
+            outbox.join()
+        return run
+    return setup
+
+
+def _daily_digest(env):
+    from services.google_calendar import build_daily_digest
+
+    return build_daily_digest
+
+
+def _full_sync(env):
+    from services.event_store import EventStore
+    from services.google_calendar import timezone
+
+    def run():
+        EventStore(timezone, client=env.calendar_client, path="").sync(force=True)
+    return run
+
+
+def _delta_sync(env):
+    def run():
+        env.store.invalidate()
+        env.store.sync()
+    return run
+
+
+def _parallel_fetch(env):
+    from services.calendar_fetch import fetch_events
+    from services.google_calendar import timezone
+
+    calendar_ids = env.calendar_client.calendar_ids()
+
+    def run():
+        now = datetime.now(timezone)
+        fetch_events(calendar_ids, timezone, client=env.calendar_client, timeMin=now.isoformat(), timeMax=(now + timedelta(days=7)).isoformat())
+    return run
+
+
+def _poll_long_history(env):
+    from services.message_cursor import MessageCursor
+    from services.twilio_api import fetch_new_messages, get_or_create_conversation
+
+    conversation_sid = get_or_create_conversation()
+    cursor = MessageCursor(os.environ["MESSAGE_CURSOR_PATH"])
+    cursor.reset(conversation_sid)
+    cursor.last_index = len(env.twilio.messages) - 1
+
+    def run():
+        env.twilio.add_message("user", "1")
+        for msg in fetch_new_messages(conversation_sid, cursor):
+            cursor.advance(msg)
+    return run
+
+
+def _first_poll(env):
+    from services.message_cursor import MessageCursor
+    from services import twilio_api
+    from services.twilio_api import fetch_new_messages, get_or_create_conversation
+
+    conversation_sid = get_or_create_conversation()
+    # As if the bot had just been restarted: the whole history is older than the start
+    twilio_api.BOT_START_TIME = datetime.now(pytz.utc)
+
+    def run():
+        cursor = MessageCursor(env.path("first_poll.json"))
+        cursor.reset(conversation_sid)
+        fetch_new_messages(conversation_sid, cursor)
+    return run
+
+
+def _push_update(env):
+    from services.calendar_watch import WATCH_PATH, CalendarWatcher
+    from services.google_calendar import timezone
+    from services.scheduler import Scheduler
+    from utils.http_server import HttpServer
+
+    # The receiver runs on its own event loop, as in the bot
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="calendar-watch", daemon=True).start()
+    server = HttpServer("127.0.0.1", 0)
+    asyncio.run_coroutine_threadsafe(server.start(), loop).result()
+    watcher = CalendarWatcher(env.store, Scheduler(timezone), f"http://127.0.0.1:{server.port}{WATCH_PATH}")
+    server.route("POST", WATCH_PATH, watcher.handle)
+    watcher.start()
+    env.store.sync()
+
+    def close():
+        watcher.stop()
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+    env.on_close(close)
+
+    cal_id = env.calendar_client.calendar_ids()[0]
+    changes = iter(range(1, 1 << 30))
+
+    def run():
+        # From the change in Google Calendar until the store has pulled it
+        version = env.store.version
+        env.calendar.update_event(cal_id, 0, f"Geänderter Termin {next(changes)}")
+        deadline = time.monotonic() + 5
+        while env.store.version == version:
+            if time.monotonic() > deadline:
+                raise TimeoutError("Änderung wurde nicht übernommen")
+            time.sleep(0.0005)
+    return run
+
+
+def _leader_failover(backend):
+    # Lease TTL of the competing processes; short, so the sqlite takeover is quick to measure
+    ttl = 1.0
+
+    def setup(env):
+        path = env.path(f"leader.{backend}")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        processes = []
+
+        def spawn():
+            process = subprocess.Popen(
+                [sys.executable, "-m", "benchmarks.failover", backend, path, str(ttl)],
+                cwd=root, stdout=subprocess.PIPE, text=True
+            )
+            processes.append(process)
+            return process
+
+        def wait_for(process, role):
+            for line in process.stdout:
+                if line.strip() == role:
+                    return
+            raise RuntimeError(f"Prozess beendet, bevor er {role} wurde")
+
+        def close():
+            for process in processes:
+                process.kill()
+                process.wait()
+        env.on_close(close)
+
+        leader = spawn()
+        wait_for(leader, "LEADER")
+
+        def run():
+            # From the crash of the leader until the standby has taken over
+            nonlocal leader
+            standby = spawn()
+            wait_for(standby, "STANDBY")
+            leader.kill()
+            started = time.perf_counter()
+            wait_for(standby, "LEADER")
+            leader.wait()
+            leader = standby
+            return time.perf_counter() - started
+        return run
+    return setup
+
+
+def _alert_events(env):
+    from services.event import Event
+    from services.google_calendar import timezone
+
+    # Upcoming events spread over the next 90 days
+    start = datetime.now(timezone) + timedelta(hours=1)
+    count = env.params["alert_events"]
+    step = 90 * 24 * 60 * 60 / count
+    return [
+        Event(start + timedelta(seconds=i * step), start + timedelta(seconds=i * step + 1800),
+              False, "bench", f"Termin {i}", str(i))
+        for i in range(count)
+    ]
+
+
+def _alert_load(env):
+    from services.alerts import AlertEngine
+    from services.google_calendar import timezone
+    from services.scheduler import Scheduler
+
+    events = _alert_events(env)
+
+    def run():
+        AlertEngine(env.store, Scheduler(timezone), print, timedelta(minutes=15)).load(events)
+    return run
+
+
+def _alert_replan(env):
+    import random
+
+    from services.alerts import AlertEngine
+    from services.google_calendar import timezone
+    from services.scheduler import Scheduler
+
+    events = _alert_events(env)
+    engine = AlertEngine(env.store, Scheduler(timezone), print, timedelta(minutes=15))
+    engine.load(events)
+    rng = random.Random(0)
+
+    def run():
+        # Move a random event by up to a day, as a delta sync would report it
+        i = rng.randrange(len(events))
+        old = events[i]
+        shift = timedelta(minutes=rng.randint(-24 * 60, 24 * 60))
+        events[i] = old._replace(start=old.start + shift, end=old.end + shift)
+        engine.on_change(old, events[i])
+    return run
+
+
+def _format_week(env):
+    from services.event import Event
+    from services.google_calendar import timezone
+    from utils.formatter import format_week
+
+    start = datetime.now(timezone).replace(hour=0, minute=0, second=0, microsecond=0)
+    count = env.params["format_events"]
+    events = [
+        Event(start + timedelta(minutes=i * 7 * 24 * 60 // count), start + timedelta(minutes=i * 7 * 24 * 60 // count + 30),
+              False, "bench", f"Termin {i}", str(i))
+        for i in range(count)
+    ]
+    return lambda: format_week(events)
+
+
+def _dense_week(env):
+    import random
+
+    from services.event import Event
+    from services.google_calendar import timezone
+
+    # Overlapping events of 15 minutes to 2 hours in many calendars, merged by start time
+    rng = random.Random(0)
+    monday = timezone.localize(datetime(2024, 4, 1))
+    events = []
+    for c in range(env.params["dense_calendars"]):
+        for i in range(env.params["dense_events"]):
+            start = monday + timedelta(minutes=rng.randrange(7 * 24 * 4) * 15)
+            end = start + timedelta(minutes=rng.choice((15, 30, 45, 60, 90, 120)))
+            events.append(Event(start, end, False, f"calendar-{c}", f"Termin {i}", f"c{c}e{i}"))
+    events.sort(key=lambda event: event.start)
+    return monday, events
+
+
+def _availability(env):
+    from services.availability import busy_intervals, find_conflicts, free_slots
+    from utils.formatter import format_conflicts, format_free_slots
+
+    monday, events = _dense_week(env)
+
+    def run():
+        # Free time of every day of the week plus all overlaps, rendered
+        busy = busy_intervals(events)
+        for day in range(7):
+            start = monday + timedelta(days=day, hours=8)
+            format_free_slots(free_slots(busy, start, start + timedelta(hours=12), timedelta(minutes=30)))
+        format_conflicts(find_conflicts(events))
+    return run
+
+
+def _freebusy(env):
+    from services.availability import query_freebusy
+    from services.google_calendar import timezone
+
+    cal_ids = env.calendar_client.calendar_ids()
+
+    def run():
+        # One request for all calendars instead of one events.list per calendar
+        now = datetime.now(timezone)
+        query_freebusy(env.calendar_client, cal_ids, now, now + timedelta(days=7), timezone)
+    return run
+
+
+def _range_cached(env):
+    from services.range_query import RangeQueryEngine
+    from services.google_calendar import timezone
+
+    engine = RangeQueryEngine(env.store, timezone)
+    queries = ["Termine nächste 14 Tage", "Termine am Freitag", "nächste Woche", "Montag bis Mittwoch"]
+    for query in queries:
+        engine.answer(query)
+    rotation = iter(range(1 << 30))
+
+    def run():
+        # Parsing plus the cached answer, without sending
+        engine.answer(queries[next(rotation) % len(queries)])
+    return run
+
+
+def _range_past(env):
+    from services.range_query import RangeQueryEngine
+    from services.google_calendar import timezone
+
+    engine = RangeQueryEngine(env.store, timezone)
+    today = datetime.now(timezone).date()
+    first, last = today - timedelta(days=40), today - timedelta(days=10)
+    engine.answer(f"vom {first:%d.%m.%Y} bis {last:%d.%m.%Y}")
+    days = [today - timedelta(days=offset) for offset in range(10, 41)]
+    rotation = iter(range(1 << 30))
+
+    def run():
+        # Single past days and weeks inside the fetched window need no new events.list call
+        day = days[next(rotation) % len(days)]
+        engine.events(*_bounds(day, day + timedelta(days=6 if day.day % 2 else 0)))
+    return run
+
+
+def _bounds(first, last):
+    from services.google_calendar import timezone
+    from utils.date_parser import day_bounds
+
+    return day_bounds(first, min(last, datetime.now(timezone).date() - timedelta(days=10)), timezone)
+
+
+def _plan_wave(env, count, token_dir=None):
+    """
+    Plans `count` subscribers, each with their own conversation, in one wave due in an hour.
+
+    Args:
+        token_dir (str, optional): Gives every subscriber their own calendar client and
+            store with the token 's<i>.pkl' from this directory; by default they share
+            the environment's store.
+
+    Returns:
+        tuple: The BatchScheduler holding the wave and the subscribers' conversation SIDs.
+    """
+    from services.google_calendar import send_subscriber_digest, timezone
+    from services.scheduler import BatchScheduler, Scheduler
+    from services.subscribers import Subscriber
+    from services.twilio_api import send_message
+    from services.weather import prefetch_weather
+
+    # Start from warm caches, as after the scenarios before, so only the sends are counted
+    env.store.sync()
+    prefetch_weather(["Berlin"])
+    scheduler = Scheduler(timezone)
+    batches = BatchScheduler(scheduler, lambda subscriber: send_subscriber_digest(subscriber, send_message))
+    at = (datetime.now(timezone) + timedelta(hours=1)).time().replace(second=0, microsecond=0)
+    conversations = []
+    for i in range(count):
+        conversations.append(f"CH{i:032d}")
+        token_path = os.path.join(token_dir, f"s{i}.pkl") if token_dir else os.devnull
+        subscriber = Subscriber(f"s{i}", conversations[-1], token_path, reminder_time=at.strftime("%H:%M"), city="Berlin")
+        if token_dir is None:
+            subscriber._store = env.store
+        batches.add(subscriber, subscriber.reminder_time, subscriber.tz)
+    return batches, conversations
+
+
+def _fire_wave(env, batches, conversations, outbox):
+    """
+    Fires the earliest wave right away instead of waiting for its time, waits until the
+    wave is processed and the outbox is drained, and checks that every subscriber
+    received their digest.
+    """
+    failed = outbox.metrics()["failed"]
+    first_message = len(env.twilio.messages)
+    scheduler = batches.scheduler
+    with scheduler._lock:
+        job = heapq.heappop(scheduler._heap)[2]
+    job.callback()
+    batches.join()
+    outbox.join()
+    received = {message["conversation_sid"] for message in env.twilio.messages[first_message:]}
+    missing = set(conversations) - received
+    if missing or outbox.metrics()["failed"] != failed:
+        raise AssertionError(f"{len(missing)} von {len(conversations)} Digests nicht zugestellt")
+
+
+def _subscriber_wave(env):
+    from services.twilio_api import outbox
+
+    batches, conversations = _plan_wave(env, env.params["subscribers"])
+    return lambda: _fire_wave(env, batches, conversations, outbox)
+
+
+def _cold_wave(env):
+    """
+    A wave of 10,000 subscribers that each create their own calendar client and store,
+    as on the first morning after a start. Every 100th subscriber has no token and must
+    be skipped without blocking the wave; the others must all receive their digest, and
+    the clients must neither start a thread each nor plan a background token refresh.
+    """
+    import pickle
+
+    from google.oauth2.credentials import Credentials
+
+    from services import calendar_client, subscribers
+    from services.calendar_client import CalendarClient
+    from services.twilio_api import outbox
+
+    # A small calendar per subscriber, so 10,000 stores fit in memory
+    calendar = FakeCalendarServer(calendars=1, events_per_calendar=5, latency=env.params["latency"]).start()
+    endpoint = f"{calendar.url}/calendar/v3/"
+
+    class WaveCalendarClient(CalendarClient):
+        def __init__(self, **kwargs):
+            super().__init__(api_endpoint=endpoint, **kwargs)
+
+    subscribers.CalendarClient = WaveCalendarClient
+    env.servers["wave_calendar"] = calendar
+
+    def close():
+        subscribers.CalendarClient = CalendarClient
+        del env.servers["wave_calendar"]
+        calendar.stop()
+    env.on_close(close)
+
+    token_dir = env.path("tokens")
+    os.makedirs(token_dir, exist_ok=True)
+    creds = Credentials(
+        token="bench", refresh_token="bench", token_uri=f"{calendar.url}/token", client_id="bench",
+        client_secret="bench", expiry=datetime.utcnow() + timedelta(hours=1)
+    )
+    token = pickle.dumps(creds)
+    for i in range(COLD_WAVE_SUBSCRIBERS):
+        if i % 100:
+            with open(os.path.join(token_dir, f"s{i}.pkl"), "wb") as f:
+                f.write(token)
+    batches, conversations = _plan_wave(env, COLD_WAVE_SUBSCRIBERS, token_dir=token_dir)
+    authorized = [sid for i, sid in enumerate(conversations) if i % 100]
+
+    def run():
+        threads = len(_bot_threads())
+        _fire_wave(env, batches, authorized, outbox)
+        started = len(_bot_threads()) - threads
+        if started > COLD_WAVE_MAX_NEW_THREADS:
+            raise AssertionError(f"{started} neue Threads für die Welle")
+        refresher = calendar_client._refresher
+        if refresher is not None and refresher.next_run() is not None:
+            raise AssertionError("Token-Erneuerung im Hintergrund für Abonnenten geplant")
+    return run
+
+
+def _bot_threads():
+    # The fake servers run one thread per open connection; those are not the bot's
+    return [thread for thread in threading.enumerate() if "process_request_thread" not in thread.name]
+
+
+def _default_outbox_wave(env):
+    """
+    A wave through an outbox with the default OUTBOX_* settings (100 slots, 1 message per
+    second, burst 5): the senders have to wait for room, and no digest may be dropped.
+    """
+    from services import twilio_api
+    from services.outbox import Outbox
+    from utils.settings import Settings
+
+    defaults = Settings.from_env({})
+    outbox = Outbox(
+        twilio_api.deliver_message,
+        is_delivered=twilio_api.is_message_delivered,
+        maxsize=defaults.outbox_size,
+        rate=defaults.outbox_rate_per_second,
+        burst=defaults.outbox_burst
+    )
+    # More digests than the queue holds, sent by the default 16 digest workers
+    batches, conversations = _plan_wave(env, 2 * defaults.outbox_size)
+
+    def run():
+        shared, twilio_api.outbox = twilio_api.outbox, outbox
+        try:
+            _fire_wave(env, batches, conversations, outbox)
+        finally:
+            twilio_api.outbox = shared
+    return run
+
+
+def _weather_prefetch(env):
+    from services.weather import get_forecast_provider, get_weather_provider, prefetch_weather
+
+    # One wave of subscribers spread over 20 cities
+    cities = [f"Stadt {i % 20}" for i in range(env.params["subscribers"])]
+
+    def run():
+        get_weather_provider()._cache.clear()
+        get_forecast_provider()._cache.clear()
+        prefetch_weather(cities)
+    return run
+
+
+SCENARIOS = [
+    Scenario("command_1_today", _command("1")),
+    Scenario("command_2_tomorrow", _command("2")),
+    Scenario("command_3_week", _command("3")),
+    Scenario("command_4_next", _command("4")),
+    Scenario("command_5_free", _command("5")),
+    Scenario("command_6_conflicts", _command("6")),
+    Scenario("command_range_14_days", _command("Termine nächste 14 Tage")),
+    Scenario("daily_digest", _daily_digest),
+    Scenario("calendar_full_sync", _full_sync, iterations=20),
+    Scenario("calendar_delta_sync", _delta_sync),
+    Scenario("parallel_fetch", _parallel_fetch),
+    Scenario("poll_long_history", _poll_long_history),
+    Scenario("first_poll_long_history", _first_poll),
+    Scenario("format_week_10k", _format_week, iterations=20, track_allocations=True),
+    Scenario("availability_dense_week", _availability, iterations=20),
+    Scenario("freebusy_week", _freebusy),
+    Scenario("range_query_cached", _range_cached, iterations=1000),
+    Scenario("range_query_past", _range_past, iterations=100),
+    Scenario("subscriber_wave", _subscriber_wave, iterations=3, warmup=0),
+    Scenario("subscriber_wave_10k", _cold_wave, iterations=1, warmup=0),
+    Scenario("subscriber_wave_throttled", _default_outbox_wave, iterations=1, warmup=0),
+    Scenario("weather_prefetch_20_cities", _weather_prefetch, iterations=20),
+    Scenario("alert_load_100k", _alert_load, iterations=3),
+    Scenario("alert_replan_100k", _alert_replan, iterations=1000),
+    Scenario("leader_failover_file", _leader_failover("file"), iterations=10, warmup=0),
+    Scenario("leader_failover_sqlite", _leader_failover("sqlite"), iterations=10, warmup=0),
+    # Last, since it leaves the store's calendars marked as watched
+    Scenario("calendar_push_update", _push_update),
+]
+
+
+def run_scenario(env, scenario, iterations=None):
+    """
+    Times a scenario.
+
+    Tracing allocations slows Python down considerably, so the peak memory of scenarios
+    with `track_allocations` is measured in one extra, untimed run after the timed ones.
+
+    Returns:
+        dict: 'p50' and 'p99' latency in milliseconds, 'calls' (API requests per operation)
+              and 'ops' (timed repetitions); 'peak_kib' (peak memory allocated during one
+              operation, in KiB) if the scenario tracks allocations.
+    """
+    run = scenario.setup(env)
+    for _ in range(scenario.warmup):
+        run()
+
+    iterations = iterations or scenario.iterations
+    latencies = []
+    calls_before = env.calls()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        elapsed = run()
+        if not isinstance(elapsed, float):
+            elapsed = time.perf_counter() - started
+        latencies.append(elapsed * 1000)
+    calls = env.calls() - calls_before
+
+    latencies.sort()
+    result = {
+        "ops": iterations,
+        "p50": round(_percentile(latencies, 0.50), 3),
+        "p99": round(_percentile(latencies, 0.99), 3),
+        "calls": round(calls / iterations, 2),
+    }
+    if scenario.track_allocations:
+        result["peak_kib"] = _peak_allocation(run)
+    return result
+
+
+def _peak_allocation(run):
+    """
+    Returns the peak memory allocated while `run` executes, in KiB, not counting what
+    was allocated before.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return round((peak - before) / 1024, 1)
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
@@ -2,24 +2,25 @@
 main.py
 
 This module starts the WhatsApp bot and the reminder service.
-It uses threads to run the reminder loop in parallel with message checking.
+Both run as tasks on a single asyncio event loop (see services/runtime.py); incoming
+messages are either polled or received via webhook, depending on 'MESSAGE_MODE'.
 """
 
-from services.twilio_api import check_new_messages, send_message
-from services.google_calendar import reminder_loop
-import threading
+import asyncio
+
+from services.runtime import Runtime
 
 def main():
     """
     Starts the WhatsApp bot and the reminder service.
 
-    - Initializes the reminder loop in a separate thread.
-    - Starts checking for incoming WhatsApp messages.
+    - Plans the daily reminder and the weekly summary on the event loop.
+    - Receives incoming WhatsApp messages via webhook ('MESSAGE_MODE=webhook')
+      or by polling the conversation (default).
+    - Shuts down cleanly on SIGTERM or Ctrl+C, sending replies still in the queue.
     """
     print("🤖 WhatsApp-Bot wird gestartet...")
-    threading.Thread(target=lambda: reminder_loop(send_message), daemon=True).start()
-    print("💬 Warte auf eingehende Nachrichten...")
-    check_new_messages()
+    asyncio.run(Runtime().run_bot())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
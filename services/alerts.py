@@ -0,0 +1,252 @@
+"""
+alerts.py
+
+Reminders a configurable time before each event ('EVENT_ALERT_MINUTES').
+
+The alert engine keeps the alert times of all upcoming events of the event store in a
+heap and arms a single scheduler job for the earliest one. The store reports every
+added, moved or cancelled event, and each report re-plans in O(log n): the new alert
+time is pushed onto the heap and the outdated entry is skipped lazily when it comes up.
+The timer is only re-armed if the earliest alert changed. The event data comes from
+the store's syncs (or push notifications), so the alerts need no polling of their own.
+"""
+
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from utils.formatter import format_alert
+
+# How often the store is asked to pull changes; it skips calendars that are fresh
+SYNC_INTERVAL = timedelta(minutes=5)
+# Delay before retrying to load the events when the calendar was unreachable at start
+LOAD_RETRY_DELAY = timedelta(minutes=1)
+# The heap is rebuilt once outdated entries outnumber the live ones by this much
+COMPACT_SLACK = 1000
+
+
+class AlertEngine:
+    """
+    Sends one alert per upcoming timed event, `lead` before it starts.
+
+    Attributes:
+        stats (dict): Counts of sent alerts, re-plans triggered by changed events and
+            timer re-arms ('sent', 'replans', 'rearms').
+    """
+
+    def __init__(self, store, scheduler, send, lead):
+        """
+        Args:
+            store (EventStore): The source of the events.
+            scheduler (Scheduler): Runs the alert timer.
+            send (Callable[[str], None]): Sends an alert message, e.g. `send_message`.
+            lead (timedelta): How long before the start an event is announced.
+        """
+        self.store = store
+        self.scheduler = scheduler
+        self.send = send
+        self.lead = lead
+        self.stats = {"sent": 0, "replans": 0, "rearms": 0}
+        self._heap = []  # (alert timestamp, start timestamp, calendar id, event id)
+        self._planned = {}  # (calendar id, event id) -> (alert timestamp, Event)
+        self._sent = {}  # (calendar id, event id) -> start timestamp of the announced event
+        self._timer = None
+        self._sync_job = None
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Plans the alerts of all upcoming events and follows the store's changes. Blocking,
+        since it syncs the store first. If the calendar cannot be reached, the failure is
+        logged and the events are loaded on the scheduler later, so the bot still starts.
+        """
+        self.store.subscribe(self.on_change)
+        self._load_upcoming()
+
+    def _load_upcoming(self):
+        try:
+            events = self.store.next_events(datetime.now(pytz.utc), limit=None)
+        except Exception as e:
+            print(f"⚠️ Termine für die Erinnerungen konnten nicht geladen werden: {e}")
+            with self._lock:
+                if not self._stopped:
+                    self._sync_job = self.scheduler.run_at(
+                        datetime.now(self.scheduler.tz) + LOAD_RETRY_DELAY, self._load_upcoming, name="alert load"
+                    )
+            return
+        self.load(events)
+        self._plan_sync()
+
+    def stop(self):
+        """
+        Stops following the store and cancels the pending timers.
+        """
+        self.store.unsubscribe(self.on_change)
+        with self._lock:
+            self._stopped = True
+            for job in (self._timer, self._sync_job):
+                if job is not None:
+                    self.scheduler.cancel(job)
+            self._timer = self._sync_job = None
+
+    def load(self, events):
+        """
+        Plans the alerts of many events at once in O(n).
+
+        Args:
+            events (Iterable[Event]): Upcoming events.
+        """
+        now = time.time()
+        with self._lock:
+            for event in events:
+                self._plan(event, now, push=False)
+            self._rebuild()
+            self._rearm()
+
+    def set_lead(self, lead):
+        """
+        Changes the lead time and re-plans all alerts; announced events stay announced.
+        """
+        with self._lock:
+            self.lead = lead
+            lead_seconds = lead.total_seconds()
+            self._planned = {
+                key: (event.start.timestamp() - lead_seconds, event) for key, (_, event) in self._planned.items()
+            }
+            self._rebuild()
+            self._rearm()
+
+    def pending(self):
+        """
+        Returns:
+            int: The number of planned alerts.
+        """
+        with self._lock:
+            return len(self._planned)
+
+    def on_change(self, old, new):
+        """
+        Re-plans the alert of one event; called by the store for every change.
+
+        Args:
+            old (Event or None): The event before the change, None if it is new.
+            new (Event or None): The event after the change, None if it was removed.
+        """
+        event = new or old
+        key = (event.calendar_id, event.id)
+        with self._lock:
+            self._planned.pop(key, None)
+            if new is not None:
+                self._plan(new, time.time())
+            self.stats["replans"] += 1
+            if len(self._heap) > 2 * len(self._planned) + COMPACT_SLACK:
+                self._rebuild()
+            self._rearm()
+
+    def _plan(self, event, now, push=True):
+        """
+        Records the alert of an event if it is still ahead and was not sent yet.
+        """
+        if event.all_day:
+            return
+        start = event.start.timestamp()
+        key = (event.calendar_id, event.id)
+        if start <= now or self._sent.get(key) == start:
+            return
+        alert_at = start - self.lead.total_seconds()
+        self._planned[key] = (alert_at, event)
+        if push:
+            heapq.heappush(self._heap, (alert_at, start, event.calendar_id, event.id))
+
+    def _rebuild(self):
+        self._heap = [
+            (alert_at, event.start.timestamp(), cal_id, event_id)
+            for (cal_id, event_id), (alert_at, event) in self._planned.items()
+        ]
+        heapq.heapify(self._heap)
+
+    def _peek(self):
+        """
+        Drops outdated heap entries and returns the earliest live one, or None.
+        """
+        heap = self._heap
+        while heap:
+            alert_at, start, cal_id, event_id = heap[0]
+            planned = self._planned.get((cal_id, event_id))
+            if planned is not None and planned[0] == alert_at and planned[1].start.timestamp() == start:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def _rearm(self):
+        """
+        Points the single timer at the earliest alert, if that changed.
+        """
+        head = self._peek()
+        when = head[0] if head else None
+        timer = self._timer
+        if timer is not None and not timer.cancelled and when is not None and timer.next_run.timestamp() == when:
+            return
+        if timer is not None:
+            self.scheduler.cancel(timer)
+        self._timer = None
+        if when is not None:
+            self._timer = self.scheduler.run_at(
+                datetime.fromtimestamp(when, self.scheduler.tz), self._fire, name="event alert"
+            )
+            self.stats["rearms"] += 1
+
+    def _fire(self):
+        """
+        Sends the due alerts and arms the timer for the next one.
+        """
+        # Pick up last-minute moves and cancellations; changes re-plan through on_change
+        try:
+            self.store.sync()
+        except Exception as e:
+            print(f"⚠️ Kalender vor der Terminerinnerung nicht abgeglichen: {e}")
+
+        now = time.time()
+        due = []
+        with self._lock:
+            # Unless a change during the sync already armed a later timer, this was it
+            if self._timer is not None and self._timer.next_run.timestamp() <= now:
+                self._timer = None
+            while True:
+                head = self._peek()
+                if head is None or head[0] > now:
+                    break
+                heapq.heappop(self._heap)
+                key = (head[2], head[3])
+                _, event = self._planned.pop(key)
+                self._sent[key] = head[1]
+                due.append(event)
+            self._sent = {key: start for key, start in self._sent.items() if start > now}
+            self._rearm()
+
+        for event in due:
+            minutes = max(0, round((event.start.timestamp() - now) / 60))
+            try:
+                self.send(format_alert(event, minutes))
+                self.stats["sent"] += 1
+            except Exception as e:
+                print(f"❌ Terminerinnerung für '{event.summary}' nicht gesendet: {e}")
+
+    def _plan_sync(self):
+        def sync():
+            try:
+                self.store.sync()
+            except Exception as e:
+                print(f"⚠️ Kalender konnte nicht abgeglichen werden: {e}")
+            self._plan_sync()
+
+        with self._lock:
+            if self._stopped:
+                return
+            self._sync_job = self.scheduler.run_at(
+                datetime.now(self.scheduler.tz) + SYNC_INTERVAL, sync, name="alert sync"
+            )
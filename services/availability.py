@@ -0,0 +1,142 @@
+"""
+availability.py
+
+Free time and overlapping events across all calendars.
+
+Both are answered with a sweep over the events in start-time order, as the event store
+returns them: busy times are merged in one pass, and the gaps between them are the free
+slots. Overlaps are found by keeping the events still running at each start in a heap
+ordered by end time, so n events with k overlapping pairs cost O(n log n + k) instead of
+comparing every pair. All-day events (birthdays, holidays) do not block time.
+
+Instead of the events, the busy times can also come from the Calendar `freebusy.query`
+endpoint ('USE_FREEBUSY'), which covers up to 50 calendars per request.
+"""
+
+import heapq
+from datetime import datetime
+
+# Calendars per freebusy.query request, the API's limit
+FREEBUSY_MAX_CALENDARS = 50
+FREEBUSY_FIELDS = "calendars"
+
+
+def busy_intervals(events):
+    """
+    Merges the times covered by timed events.
+
+    Args:
+        events (Iterable[Event]): Events in start-time order.
+
+    Returns:
+        list: Disjoint (start, end) datetime pairs in order.
+    """
+    return merge_intervals((event.start, event.end) for event in events if not event.all_day)
+
+
+def merge_intervals(intervals):
+    """
+    Merges overlapping or touching intervals.
+
+    Args:
+        intervals (Iterable[tuple]): (start, end) pairs ordered by start.
+
+    Returns:
+        list: Disjoint (start, end) pairs in order.
+    """
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_slots(busy, start, end, min_length):
+    """
+    Returns the gaps between busy times within a window.
+
+    Args:
+        busy (list): Disjoint (start, end) pairs in order, e.g. from `busy_intervals`.
+        start (datetime): Start of the window.
+        end (datetime): End of the window.
+        min_length (timedelta): Shorter gaps are left out.
+
+    Returns:
+        list: (start, end) pairs of the free slots.
+    """
+    slots = []
+    cursor = start
+    for busy_start, busy_end in busy:
+        if busy_end <= cursor:
+            continue
+        if busy_start >= end:
+            break
+        if busy_start - cursor >= min_length:
+            slots.append((cursor, busy_start))
+        cursor = max(cursor, busy_end)
+    if end - cursor >= min_length:
+        slots.append((cursor, end))
+    return slots
+
+
+def find_conflicts(events):
+    """
+    Finds all pairs of timed events that overlap.
+
+    Args:
+        events (Iterable[Event]): Events in start-time order.
+
+    Returns:
+        list: (earlier, later) Event pairs, ordered by the start of the later one.
+    """
+    conflicts = []
+    running = []  # (end timestamp, sequence, event) of the events still running
+    for sequence, event in enumerate(events):
+        if event.all_day:
+            continue
+        start = event.start.timestamp()
+        while running and running[0][0] <= start:
+            heapq.heappop(running)
+        for _, _, other in running:
+            conflicts.append((other, event))
+        heapq.heappush(running, (event.end.timestamp(), sequence, event))
+    return conflicts
+
+
+def query_freebusy(client, cal_ids, time_min, time_max, local_tz):
+    """
+    Fetches the merged busy times of calendars with `freebusy.query`.
+
+    Args:
+        client (CalendarClient): The API client.
+        cal_ids (list): The calendars to check.
+        time_min (datetime): Start of the window.
+        time_max (datetime): End of the window.
+        local_tz (pytz.tzinfo.BaseTzInfo): The timezone of the returned times.
+
+    Returns:
+        list: Disjoint (start, end) datetime pairs in order.
+    """
+    per_calendar = []
+    for offset in range(0, len(cal_ids), FREEBUSY_MAX_CALENDARS):
+        body = {
+            "timeMin": time_min.isoformat(),
+            "timeMax": time_max.isoformat(),
+            "items": [{"id": cal_id} for cal_id in cal_ids[offset:offset + FREEBUSY_MAX_CALENDARS]],
+        }
+        response = client.execute(client.service.freebusy().query(body=body, fields=FREEBUSY_FIELDS))
+        for cal_id, calendar in response.get("calendars", {}).items():
+            if calendar.get("errors"):
+                print(f"⚠️ Belegte Zeiten von Kalender {cal_id} nicht verfügbar: {calendar['errors']}")
+            per_calendar.append([
+                (_parse(period["start"], local_tz), _parse(period["end"], local_tz))
+                for period in calendar.get("busy", [])
+            ])
+    return merge_intervals(heapq.merge(*per_calendar))
+
+
+def _parse(value, local_tz):
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(local_tz)
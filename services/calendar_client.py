@@ -0,0 +1,306 @@
+"""
+calendar_client.py
+
+A long-lived Google Calendar client that is shared between the reminder thread and
+the message polling thread. The credentials are loaded and the discovery service is
+built only once; afterwards each request only costs the API call itself.
+
+The credentials of interactive clients are refreshed by one shared background thread.
+Unattended clients (of subscribers) are used about once a day, so they refresh their
+credentials when a request finds them about to expire instead of every hour.
+"""
+
+import os.path
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+
+import httplib2
+import pytz
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build
+
+from services.scheduler import Scheduler
+from utils.metrics import REGISTRY, ApiCall
+
+SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
+
+# Credentials are refreshed this long before they expire
+REFRESH_MARGIN = timedelta(minutes=5)
+# Delay before retrying a failed background refresh
+REFRESH_RETRY_SECONDS = 60
+# Socket timeout for a single API request
+HTTP_TIMEOUT_SECONDS = 30
+# How long the list of subscribed calendars is reused
+CALENDAR_LIST_TTL_SECONDS = 600
+# Partial responses: only the fields the bot reads (the page and sync tokens must stay in)
+CALENDAR_LIST_FIELDS = "items(id),nextPageToken"
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+
+class AuthorizationRequired(Exception):
+    """
+    Raised by a non-interactive client whose token is missing or can no longer be refreshed.
+    """
+
+
+def _refresh_scheduler():
+    """
+    Returns the scheduler that refreshes the credentials of all clients, starting its
+    thread on first use.
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = Scheduler(pytz.utc)
+            threading.Thread(target=_refresher.run, name="token-refresh", daemon=True).start()
+        return _refresher
+
+
+class CalendarClient:
+    """
+    Thread-safe wrapper around the Google Calendar API service.
+
+    The service object is built lazily on first use and then reused. Because the
+    underlying httplib2 connection is not thread-safe, every thread executes its
+    requests over its own authorized connection. The credentials are refreshed shortly
+    before they expire: on the shared refresh thread for interactive clients, on the next
+    request for unattended ones.
+
+    Attributes:
+        stats (dict): Counts of the expensive operations that actually ran
+            ('auth', 'build', 'refresh').
+    """
+
+    def __init__(self, token_path='token.pkl', secrets_path='credentials.json', api_endpoint=None,
+                 interactive=True):
+        """
+        Args:
+            token_path (str): Where the OAuth2 token is stored.
+            secrets_path (str): The OAuth2 client secrets used for the browser flow.
+            api_endpoint (str, optional): Overrides the API base URL, e.g. for a local stand-in server.
+            interactive (bool): Run the browser flow if there is no valid token. Clients used
+                unattended (e.g. of subscribers) raise `AuthorizationRequired` instead.
+        """
+        self.token_path = token_path
+        self.secrets_path = secrets_path
+        self.api_endpoint = api_endpoint
+        self.interactive = interactive
+        self.stats = {"auth": 0, "build": 0, "refresh": 0}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._connections = []  # the AuthorizedHttp of every thread, for close_connections
+        self._creds = None
+        self._service = None
+        self._refresh_job = None
+        self._calendar_ids = None
+        self._calendar_ids_fetched = 0.0
+
+    @property
+    def service(self):
+        """
+        Returns:
+            googleapiclient.discovery.Resource: The shared Calendar API service object.
+        """
+        return self._ensure_service()
+
+    def _ensure_service(self):
+        with self._lock:
+            if self._service is None:
+                self._creds = self._load_credentials()
+                options = {"api_endpoint": self.api_endpoint} if self.api_endpoint else None
+                self._service = build('calendar', 'v3', credentials=self._creds, client_options=options)
+                self.stats["build"] += 1
+                if self.interactive:
+                    self._schedule_refresh()
+            return self._service
+
+    def execute(self, request):
+        """
+        Executes an API request over the calling thread's own connection.
+
+        Args:
+            request (googleapiclient.http.HttpRequest): The prepared API request.
+
+        Returns:
+            dict: The decoded response body.
+        """
+        local = self._local
+        http = getattr(local, "http", None)
+        if http is None:
+            self._ensure_service()
+            http = local.http = AuthorizedHttp(self._creds, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS))
+            with self._lock:
+                self._connections.append(http)
+        if not self.interactive:
+            self._refresh_if_expiring()
+        with ApiCall("calendar", getattr(request, "methodId", "request")):
+            return request.execute(http=http)
+
+    def pages(self, collection, **params):
+        """
+        Lists a collection page by page, following `nextPageToken`.
+
+        Only one page is held at a time, so a long listing does not have to fit in
+        memory. Pass a `fields` projection to shrink the pages; it must keep
+        `nextPageToken`.
+
+        Args:
+            collection (str): The API collection, e.g. "events" or "calendarList".
+            **params: Parameters of its `list` method, e.g. calendarId, maxResults, fields.
+
+        Yields:
+            dict: The decoded response of each page.
+        """
+        resource = getattr(self.service, collection)()
+        request = resource.list(**params)
+        while request is not None:
+            response = self.execute(request)
+            yield response
+            request = resource.list_next(request, response)
+
+    def calendar_ids(self):
+        """
+        Returns the IDs of all calendars of the user, cached for a few minutes.
+
+        Returns:
+            list: A list of calendar ID strings.
+        """
+        with self._lock:
+            if self._calendar_ids is not None and time.monotonic() - self._calendar_ids_fetched < CALENDAR_LIST_TTL_SECONDS:
+                return self._calendar_ids
+        calendar_ids = [
+            calendar["id"]
+            for page in self.pages("calendarList", fields=CALENDAR_LIST_FIELDS)
+            for calendar in page.get("items", [])
+        ]
+        with self._lock:
+            self._calendar_ids = calendar_ids
+            self._calendar_ids_fetched = time.monotonic()
+            return self._calendar_ids
+
+    def close_connections(self):
+        """
+        Closes the open connections of all threads; the next request opens a new one.
+
+        Meant for clients that are idle most of the day, e.g. of subscribers, so thousands
+        of them do not keep a socket open each. Requests still running on the closed
+        connections fail.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for http in connections:
+            http.close()
+
+    def close(self):
+        """
+        Cancels the pending background refresh.
+        """
+        with self._lock:
+            if self._refresh_job is not None:
+                _refresh_scheduler().cancel(self._refresh_job)
+                self._refresh_job = None
+
+    def _load_credentials(self):
+        """
+        Loads the stored OAuth2 credentials, refreshing them or running the browser flow if needed.
+
+        Returns:
+            google.oauth2.credentials.Credentials: Valid user credentials.
+
+        Raises:
+            AuthorizationRequired: If the client is not interactive and the token is missing
+                or was revoked.
+        """
+        self.stats["auth"] += 1
+        creds = None
+
+        if os.path.exists(self.token_path):
+            with open(self.token_path, 'rb') as token:
+                creds = pickle.load(token)
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                try:
+                    creds.refresh(Request())
+                except RefreshError as e:
+                    if self.interactive:
+                        raise
+                    raise AuthorizationRequired(f"Google-Token {self.token_path} ungültig: {e}") from e
+                self.stats["refresh"] += 1
+            elif not self.interactive:
+                raise AuthorizationRequired(f"Kein gültiges Google-Token in {self.token_path}")
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.secrets_path, SCOPES)
+                creds = flow.run_local_server(port=8080)
+            self._save_credentials(creds)
+
+        return creds
+
+    def _save_credentials(self, creds):
+        with open(self.token_path, 'wb') as token:
+            pickle.dump(creds, token)
+
+    def _schedule_refresh(self, delay=None):
+        """
+        Plans the background refresh of the credentials before they expire.
+        """
+        if delay is None:
+            if self._creds.expiry is None or not self._creds.refresh_token:
+                return
+            # google-auth stores the expiry as naive UTC
+            delay = (self._creds.expiry - REFRESH_MARGIN - datetime.utcnow()).total_seconds()
+        refresher = _refresh_scheduler()
+        if self._refresh_job is not None:
+            refresher.cancel(self._refresh_job)
+        when = datetime.now(pytz.utc) + timedelta(seconds=max(delay, 0))
+        self._refresh_job = refresher.run_at(when, self._refresh, name=f"token refresh {self.token_path}")
+
+    def _refresh_if_expiring(self):
+        """
+        Refreshes the credentials of an unattended client if they expire soon.
+
+        Raises:
+            AuthorizationRequired: If the token was revoked.
+        """
+        # google-auth stores the expiry as naive UTC
+        deadline = datetime.utcnow() + REFRESH_MARGIN
+        creds = self._creds
+        if creds.expiry is None or creds.expiry > deadline or not creds.refresh_token:
+            return
+        with self._lock:
+            if creds.expiry > deadline:
+                return  # refreshed by another thread meanwhile
+            try:
+                creds.refresh(Request())
+            except RefreshError as e:
+                raise AuthorizationRequired(f"Google-Token {self.token_path} ungültig: {e}") from e
+            self._save_credentials(creds)
+            self.stats["refresh"] += 1
+
+    def _refresh(self):
+        with self._lock:
+            try:
+                self._creds.refresh(Request())
+                self._save_credentials(self._creds)
+                self.stats["refresh"] += 1
+            except Exception as e:
+                print(f"❌ Google-Token konnte nicht erneuert werden: {e}")
+                self._schedule_refresh(REFRESH_RETRY_SECONDS)
+                return
+            self._schedule_refresh()
+
+
+# Shared client used by all calendar functions
+calendar_client = CalendarClient()
+REGISTRY.register_stats(
+    "morningsync_calendar_client", lambda: calendar_client.stats, "Google Calendar client",
+    counters=("auth", "build", "refresh")
+)
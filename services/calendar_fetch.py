@@ -0,0 +1,202 @@
+"""
+calendar_fetch.py
+
+Concurrent fetching of events from several Google calendars.
+
+The per-calendar `events.list` queries are sent through a bounded thread pool, so a
+multi-calendar query takes as long as the slowest calendar instead of the sum of all
+of them. Each calendar is read page by page with a partial-response projection, so
+only the fields the bot uses are transferred and raw pages are dropped as soon as they
+are parsed. `stream_events` combines the calendars (each already ordered by start
+time) with a lazy k-way heap merge, fetching each calendar only one page ahead of the
+consumer, so at most two pages per calendar are held at a time.
+"""
+
+import heapq
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from services.calendar_client import calendar_client
+from services.event import Event
+from utils.settings import get_settings
+
+# Events per page; the API caps it at 2500
+PAGE_SIZE = 250
+# Partial response with just what `Event.from_api` reads
+EVENT_FIELDS = "items(id,summary,start,end),nextPageToken"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Returns the shared worker pool, creating it on first use.
+
+    The pool size is configured via 'CALENDAR_FETCH_WORKERS'.
+
+    Returns:
+        concurrent.futures.ThreadPoolExecutor: The shared pool.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = get_settings().calendar_fetch_workers
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calendar-fetch")
+        return _executor
+
+
+def run_per_calendar(calendar_ids, func, timeout=None):
+    """
+    Runs `func(calendar_id)` for all calendars concurrently on the shared pool.
+
+    Calendars that do not finish within the timeout (configured via 'CALENDAR_FETCH_TIMEOUT'
+    in seconds) or raise an error are left out of the result.
+
+    Args:
+        calendar_ids (list): The calendar IDs.
+        func (Callable[[str], Any]): The per-calendar work.
+        timeout (float, optional): Overrides the configured timeout.
+
+    Returns:
+        dict: The results of the calendars that finished in time, keyed by calendar ID,
+              in the order of `calendar_ids`.
+    """
+    if timeout is None:
+        timeout = get_settings().calendar_fetch_timeout
+
+    executor = get_executor()
+    futures = {executor.submit(func, cal_id): cal_id for cal_id in calendar_ids}
+    done, not_done = wait(futures, timeout=timeout)
+
+    for future in not_done:
+        future.cancel()
+        print(f"⚠️ Kalender {futures[future]} hat nicht rechtzeitig geantwortet.")
+
+    results = {}
+    for future, cal_id in futures.items():
+        if future not in done:
+            continue
+        try:
+            results[cal_id] = future.result()
+        except Exception as e:
+            print(f"⚠️ Kalender {cal_id} konnte nicht geladen werden: {e}")
+
+    return results
+
+
+class _CalendarStream:
+    """
+    The events of one calendar, with the next page fetched on the shared pool while the
+    current one is consumed.
+    """
+
+    def __init__(self, client, cal_id, local_tz, query):
+        self.cal_id = cal_id
+        self.local_tz = local_tz
+        self._pages = _event_pages(client, cal_id, **query)
+        # The first page is requested right away, so all calendars load concurrently
+        self._next = get_executor().submit(next, self._pages, None)
+
+    def events(self, deadline, timeout):
+        """
+        Yields the events page by page. A calendar whose first page misses the deadline, or
+        whose next page takes longer than `timeout`, or that fails, ends early.
+        """
+        wait_for = max(0.0, deadline - time.monotonic())
+        while True:
+            try:
+                page = self._next.result(wait_for)
+            except FutureTimeoutError:
+                self._next.cancel()
+                print(f"⚠️ Kalender {self.cal_id} hat nicht rechtzeitig geantwortet.")
+                return
+            except Exception as e:
+                print(f"⚠️ Kalender {self.cal_id} konnte nicht geladen werden: {e}")
+                return
+            if page is None:
+                return
+            self._next = get_executor().submit(next, self._pages, None)
+            wait_for = timeout
+            for event in page.get("items", []):
+                yield Event.from_api(event, self.cal_id, self.local_tz)
+
+
+def stream_events(calendar_ids, local_tz, timeout=None, client=calendar_client, **query):
+    """
+    Queries all calendars concurrently and returns an iterator over their events in
+    start-time order.
+
+    The merge is lazy and each calendar is fetched only one page ahead of it, so memory
+    stays bounded by two pages per calendar however many events there are. Consumers
+    that render as they go (e.g. `format_week` with `ordered=True`) never build a
+    combined list. Calendars whose first page does not arrive within the timeout, or
+    that fail, are skipped; one that fails after its first page ends early.
+
+    Args:
+        calendar_ids (list): The calendar IDs to query.
+        local_tz (pytz.tzinfo.BaseTzInfo): The local timezone used for the event times.
+        timeout (float, optional): Overrides the configured timeout ('CALENDAR_FETCH_TIMEOUT'),
+            both for the first pages of all calendars together and for each further page.
+        client (CalendarClient): The client used to talk to the API.
+        **query: Parameters passed to `events.list` (e.g. timeMin, timeMax).
+
+    Returns:
+        Iterator[Event]: Event objects of all calendars, ordered by start time.
+    """
+    if timeout is None:
+        timeout = get_settings().calendar_fetch_timeout
+    deadline = time.monotonic() + timeout
+    streams = [_CalendarStream(client, cal_id, local_tz, query) for cal_id in calendar_ids]
+    return heapq.merge(*(stream.events(deadline, timeout) for stream in streams), key=_start)
+
+
+def fetch_events(calendar_ids, local_tz, timeout=None, client=calendar_client, **query):
+    """
+    Queries all calendars concurrently and merges their events in start-time order.
+
+    Calendars that do not answer within the timeout (configured via 'CALENDAR_FETCH_TIMEOUT'
+    in seconds) or fail are skipped, so the caller still gets the events of all others.
+
+    Args:
+        calendar_ids (list): The calendar IDs to query.
+        local_tz (pytz.tzinfo.BaseTzInfo): The local timezone used for the event times.
+        timeout (float, optional): Overrides the configured timeout.
+        client (CalendarClient): The client used to talk to the API.
+        **query: Parameters passed to `events.list` (e.g. timeMin, timeMax, maxResults).
+
+    Returns:
+        list: Event objects of all calendars, ordered by start time.
+    """
+    return list(stream_events(calendar_ids, local_tz, timeout, client, **query))
+
+
+def iter_events(client, cal_id, local_tz, **query):
+    """
+    Streams the events of one calendar, ordered by start time, one page at a time.
+
+    Args:
+        client (CalendarClient): The client used to talk to the API.
+        cal_id (str): The calendar to list.
+        local_tz (pytz.tzinfo.BaseTzInfo): The local timezone used for the event times.
+        **query: Parameters passed to `events.list`; 'maxResults' and 'fields' default
+            to `PAGE_SIZE` and `EVENT_FIELDS`.
+
+    Yields:
+        Event: The parsed events.
+    """
+    for page in _event_pages(client, cal_id, **query):
+        for event in page.get("items", []):
+            yield Event.from_api(event, cal_id, local_tz)
+
+
+def _event_pages(client, cal_id, **query):
+    query.setdefault("maxResults", PAGE_SIZE)
+    query.setdefault("fields", EVENT_FIELDS)
+    return client.pages("events", calendarId=cal_id, singleEvents=True, orderBy="startTime", **query)
+
+
+def _start(event):
+    return event.start
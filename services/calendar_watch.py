@@ -0,0 +1,278 @@
+"""
+calendar_watch.py
+
+Push notifications for calendar changes via `events.watch` channels.
+
+Instead of re-syncing every calendar once 'EVENT_STORE_MAX_AGE' has passed, the bot
+asks Google to post a notification to 'CALENDAR_WATCH_URL' whenever a calendar
+changes. The receiver marks only that calendar as outdated and pulls its changes with
+a delta sync in the background, so commands are answered from fresh data without
+polling. Channels expire; each one is renewed on the bot's scheduler shortly before
+its expiration. A calendar whose channel could not be opened falls back to the
+time-based sync.
+"""
+
+import asyncio
+import hmac
+import secrets
+import threading
+import uuid
+from datetime import datetime, timedelta
+from http import HTTPStatus
+
+import pytz
+
+from utils.http_server import HttpServer, Response
+from utils.metrics import REGISTRY
+from utils.settings import get_settings
+
+WATCH_PATH = "/google/calendar"
+# Channels are renewed this long before they expire
+RENEW_MARGIN = timedelta(hours=1)
+# Delay before retrying a channel that could not be opened or renewed
+RETRY_DELAY = timedelta(minutes=15)
+
+# The watcher of the running `serve_calendar_watch`, read by the metrics collector
+_watcher = None
+
+
+class Channel:
+    """
+    An open notification channel for one calendar.
+    """
+
+    __slots__ = ("id", "cal_id", "resource_id", "expiration", "renew_job")
+
+    def __init__(self, id, cal_id, resource_id, expiration):
+        self.id = id
+        self.cal_id = cal_id
+        self.resource_id = resource_id
+        self.expiration = expiration
+        self.renew_job = None
+
+
+class CalendarWatcher:
+    """
+    Opens, renews and closes the watch channels and handles their notifications.
+
+    Attributes:
+        stats (dict): Counts of received notifications, triggered refreshes and opened
+            channels ('notifications', 'refreshes', 'channels_opened').
+    """
+
+    def __init__(self, store, scheduler, address, token=None, ttl=None, call=None):
+        """
+        Args:
+            store (EventStore): The store whose calendars are watched.
+            scheduler (Scheduler): Runs the channel renewals.
+            address (str): The public HTTPS URL Google posts notifications to.
+            token (str, optional): Shared secret sent back with every notification;
+                a random one is generated if omitted.
+            ttl (int, optional): Requested channel lifetime in seconds; Google may shorten it.
+            call (Callable[..., Awaitable], optional): Runs a blocking function off the event
+                loop, e.g. `Runtime.call`; defaults to the loop's default executor.
+        """
+        self.store = store
+        self.client = store.client
+        self.scheduler = scheduler
+        self.address = address
+        self.token = token or secrets.token_urlsafe(24)
+        self.ttl = ttl
+        self.call = call or _run_in_executor
+        self.stats = {"notifications": 0, "refreshes": 0, "channels_opened": 0}
+        self._channels = {}  # channel id -> Channel
+        self._by_calendar = {}  # calendar id -> Channel
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._in_flight = set()
+        self._retry_jobs = {}  # calendar id -> Job retrying to open its channel
+        self._stopped = False
+
+    def start(self):
+        """
+        Opens a channel for every calendar that does not have one yet. Blocking.
+        """
+        for cal_id in self.client.calendar_ids():
+            with self._lock:
+                watched = cal_id in self._by_calendar
+            if not watched:
+                self._open(cal_id)
+
+    def stop(self):
+        """
+        Closes all channels and cancels the pending retries, so Google stops sending
+        notifications and no channel is opened for this watcher afterwards. Blocking.
+        """
+        with self._lock:
+            self._stopped = True
+            channels = list(self._channels.values())
+            retries, self._retry_jobs = list(self._retry_jobs.values()), {}
+        for job in retries:
+            self.scheduler.cancel(job)
+        for channel in channels:
+            self._close(channel)
+
+    def _open(self, cal_id):
+        """
+        Opens a channel for one calendar and plans its renewal. On failure the calendar
+        keeps its time-based sync and the attempt is repeated after `RETRY_DELAY`.
+        """
+        body = {"id": str(uuid.uuid4()), "type": "web_hook", "address": self.address, "token": self.token}
+        if self.ttl:
+            body["params"] = {"ttl": str(int(self.ttl))}
+        try:
+            result = self.client.execute(self.client.service.events().watch(calendarId=cal_id, body=body))
+        except Exception as e:
+            print(f"⚠️ Push-Kanal für Kalender {cal_id} konnte nicht geöffnet werden: {e}")
+            with self._lock:
+                if not self._stopped and cal_id not in self._retry_jobs:
+                    self._retry_jobs[cal_id] = self.scheduler.run_at(
+                        datetime.now(pytz.utc) + RETRY_DELAY, lambda: self._renew(cal_id), name=f"watch retry {cal_id}"
+                    )
+            return None
+
+        expiration = datetime.fromtimestamp(int(result["expiration"]) / 1000, pytz.utc)
+        channel = Channel(result["id"], cal_id, result["resourceId"], expiration)
+        channel.renew_job = self.scheduler.run_at(
+            max(expiration - RENEW_MARGIN, datetime.now(pytz.utc)),
+            lambda: self._renew(cal_id),
+            name=f"watch renew {cal_id}"
+        )
+        with self._lock:
+            self._channels[channel.id] = channel
+            self._by_calendar[cal_id] = channel
+            self.stats["channels_opened"] += 1
+        self.store.set_watched(cal_id, True)
+        print(f"📡 Push-Kanal für Kalender {cal_id} offen bis {expiration.isoformat()}")
+        return channel
+
+    def _renew(self, cal_id):
+        """
+        Replaces the channel of a calendar before it expires. The old channel is only
+        closed once the new one is open, so no notification is lost in between.
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            old = self._by_calendar.pop(cal_id, None)
+            self._retry_jobs.pop(cal_id, None)
+        if cal_id not in self.client.calendar_ids():
+            if old is not None:
+                self._close(old)
+            return
+        channel = self._open(cal_id)
+        if old is not None:
+            self._close(old)
+        if channel is None:
+            # Changes may have been missed while no channel was open
+            self.store.set_watched(cal_id, False)
+            self.store.invalidate(cal_id)
+
+    def _close(self, channel):
+        with self._lock:
+            self._channels.pop(channel.id, None)
+            if self._by_calendar.get(channel.cal_id) is channel:
+                del self._by_calendar[channel.cal_id]
+        if channel.renew_job is not None:
+            self.scheduler.cancel(channel.renew_job)
+        try:
+            self.client.execute(
+                self.client.service.channels().stop(body={"id": channel.id, "resourceId": channel.resource_id})
+            )
+        except Exception as e:
+            print(f"⚠️ Push-Kanal {channel.id} konnte nicht geschlossen werden: {e}")
+
+    async def handle(self, request):
+        """
+        Handles a notification and starts a delta sync of the affected calendar.
+
+        Google retries notifications that are not acknowledged with a 2xx status, so the
+        sync runs after the response has been sent.
+
+        Args:
+            request (Request): The incoming HTTP request.
+
+        Returns:
+            Response: 200 once accepted, 403 for a wrong channel token.
+        """
+        token = request.headers.get("x-goog-channel-token", "")
+        if not hmac.compare_digest(token.encode(), self.token.encode()):
+            print("⚠️ Kalender-Benachrichtigung mit ungültigem Token abgelehnt.")
+            return Response(HTTPStatus.FORBIDDEN, "Forbidden")
+
+        with self._lock:
+            channel = self._channels.get(request.headers.get("x-goog-channel-id", ""))
+        # 'sync' only confirms a new channel; notifications of closed channels are ignored
+        if channel is None or request.headers.get("x-goog-resource-state") == "sync":
+            return Response(HTTPStatus.OK)
+
+        self.stats["notifications"] += 1
+        if channel.cal_id not in self._pending:
+            # Further notifications until the sync starts are covered by it
+            self._pending.add(channel.cal_id)
+            self.store.invalidate(channel.cal_id)
+            task = asyncio.create_task(self._refresh(channel.cal_id))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+        return Response(HTTPStatus.OK)
+
+    async def _refresh(self, cal_id):
+        self._pending.discard(cal_id)
+        try:
+            await self.call(self.store.sync)
+            self.stats["refreshes"] += 1
+        except Exception as e:
+            print(f"❌ Kalender {cal_id} konnte nicht aktualisiert werden: {e!r}")
+
+
+async def _run_in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def serve_calendar_watch(store, scheduler, call=None):
+    """
+    Opens the watch channels and receives their notifications until cancelled; the
+    channels are closed again on the way out.
+
+    Configured via 'CALENDAR_WATCH_URL', 'CALENDAR_WATCH_TOKEN', 'CALENDAR_WATCH_TTL',
+    'CALENDAR_WATCH_HOST' and 'CALENDAR_WATCH_PORT'. The public URL must be HTTPS and
+    forward to `WATCH_PATH` on the local port.
+
+    Args:
+        store (EventStore): The store whose calendars are watched.
+        scheduler (Scheduler): Runs the channel renewals.
+        call (Callable[..., Awaitable], optional): Runs blocking functions off the event loop.
+    """
+    global _watcher
+    settings = get_settings()
+    call = call or _run_in_executor
+    watcher = CalendarWatcher(
+        store, scheduler, settings.calendar_watch_url, settings.calendar_watch_token,
+        ttl=settings.calendar_watch_ttl, call=call
+    )
+    _watcher = watcher
+    server = HttpServer(settings.calendar_watch_host, settings.calendar_watch_port)
+    server.route("POST", WATCH_PATH, watcher.handle)
+    await server.start()
+    try:
+        await call(watcher.start)
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        await call(watcher.stop)
+        if _watcher is watcher:
+            _watcher = None
+
+
+def _watcher_stats():
+    watcher = _watcher
+    if watcher is None:
+        return {}
+    return dict(watcher.stats, channels=len(watcher._channels))
+
+
+# Registered once; a process that becomes leader again starts a new watcher
+REGISTRY.register_stats(
+    "morningsync_calendar_watch", _watcher_stats, "Calendar push notifications",
+    counters=("notifications", "refreshes", "channels_opened")
+)
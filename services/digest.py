@@ -0,0 +1,124 @@
+"""
+digest.py
+
+Pre-rendering of the daily digest.
+
+The digest (calendar events plus weather) is built a configurable lead time before
+the reminder time and kept up to date while waiting, so at the reminder time the
+finished message only has to be handed to the sender.
+"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from utils.metrics import REMINDER_LAG
+
+
+class DigestPrefetcher:
+    """
+    Builds a message ahead of its send time and refreshes it when the source data changes.
+    """
+
+    def __init__(self, scheduler, build, version, send, at, lead, refresh_interval=60):
+        """
+        Args:
+            scheduler (Scheduler): Runs the prepare, refresh and send jobs.
+            build (Callable[[], str]): Builds the message.
+            version (Callable[[], Any]): Returns a value that changes whenever the data
+                behind the message changes (may pull updates first).
+            send (Callable[[str or None], None]): Receives the prepared message (None if
+                preparing failed) at the send time.
+            at (datetime.time): The local send time.
+            lead (timedelta): How long before `at` the message is built.
+            refresh_interval (float): Seconds between checks for changed data.
+        """
+        self.scheduler = scheduler
+        self.build = build
+        self.version = version
+        self.send = send
+        self.at = at
+        self.lead = lead
+        self.refresh_interval = refresh_interval
+        self.stats = {"builds": 0, "refreshes": 0, "last_send_lag": None}
+        self._message = None
+        self._built_version = None
+        self._prepare_job = None
+        self._send_job = None
+        self._lock = threading.Lock()
+
+    def install(self):
+        """
+        Schedules the daily prepare and send jobs.
+        """
+        prepare_at = (datetime.combine(date(2000, 1, 1), self.at) - self.lead).time()
+        self._prepare_job = self.scheduler.every_day(prepare_at, self.prepare, name="digest prepare")
+        self._send_job = self.scheduler.every_day(self.at, self.deliver, name="digest send", durable=True)
+
+    def reschedule(self, at, lead):
+        """
+        Moves the daily prepare and send jobs to a new send time and lead time.
+
+        Args:
+            at (datetime.time): The new local send time.
+            lead (timedelta): The new lead time.
+        """
+        for job in (self._prepare_job, self._send_job):
+            if job is not None:
+                self.scheduler.cancel(job)
+        self.at = at
+        self.lead = lead
+        self.install()
+
+    def prepare(self):
+        """
+        Builds the message and plans the checks for changed data until the send time.
+        """
+        self._rebuild()
+        self._plan_refresh()
+
+    def deliver(self):
+        """
+        Hands the prepared message to the sender and records how late that happened.
+        """
+        with self._lock:
+            message, self._message = self._message, None
+        due = self._send_job.next_run if self._send_job else None
+        self.send(message)
+        # A catch-up run after a restart is not measured against the next regular run
+        if due is not None and due.timestamp() <= time.time():
+            self.stats["last_send_lag"] = time.time() - due.timestamp()
+            REMINDER_LAG.set(self.stats["last_send_lag"])
+
+    def _rebuild(self):
+        try:
+            version = self.version()
+            message = self.build()
+        except Exception as e:
+            print(f"⚠️ Digest konnte nicht vorbereitet werden: {e}")
+            return
+        with self._lock:
+            self._message = message
+            self._built_version = version
+        self.stats["builds"] += 1
+
+    def _refresh(self):
+        try:
+            changed = self.version() != self._built_version
+        except Exception as e:
+            print(f"⚠️ Änderungen konnten nicht geprüft werden: {e}")
+            changed = False
+        if changed:
+            self.stats["refreshes"] += 1
+            self._rebuild()
+        self._plan_refresh()
+
+    def _plan_refresh(self):
+        """
+        Plans the next check, unless it could still be running at the send time.
+        """
+        if self._send_job is None:
+            return
+        next_check = datetime.now(self.scheduler.tz) + timedelta(seconds=self.refresh_interval)
+        if next_check + timedelta(seconds=self.refresh_interval) < self._send_job.next_run:
+            self.scheduler.run_at(next_check, self._refresh, name="digest refresh")
@@ -0,0 +1,67 @@
+"""
+event.py
+
+The structured calendar event used between the calendar service and the formatters.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+
+
+def parse_time(value, local_tz):
+    """
+    Parses a start or end field of a raw API event into a tz-aware datetime in the local timezone.
+
+    Args:
+        value (dict): The 'start' or 'end' field of an event (with 'dateTime' or 'date').
+        local_tz (pytz.tzinfo.BaseTzInfo): The local timezone.
+
+    Returns:
+        datetime: The parsed time; all-day dates resolve to local midnight.
+    """
+    raw = value.get('dateTime', value.get('date'))
+
+    if 'Z' in raw:
+        return datetime.fromisoformat(raw.replace('Z', '+00:00')).astimezone(local_tz)
+    dt = datetime.fromisoformat(raw)
+    if dt.tzinfo is None:
+        return local_tz.localize(dt)
+    return dt.astimezone(local_tz)
+
+
+class Event(namedtuple("Event", "start end all_day calendar_id summary id")):
+    """
+    A calendar event with tz-aware start and end times in the local timezone.
+
+    Attributes:
+        start (datetime): The start of the event.
+        end (datetime): The end of the event.
+        all_day (bool): Whether the event spans whole days instead of a time range.
+        calendar_id (str): The ID of the calendar the event belongs to.
+        summary (str): The title of the event.
+        id (str): The event ID within its calendar.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_api(cls, event, calendar_id, local_tz):
+        """
+        Creates an Event from a raw event resource as returned by `events.list`.
+
+        Args:
+            event (dict): The raw event resource.
+            calendar_id (str): The calendar the event was listed from.
+            local_tz (pytz.tzinfo.BaseTzInfo): The local timezone.
+
+        Returns:
+            Event: The parsed event.
+        """
+        return cls(
+            start=parse_time(event['start'], local_tz),
+            end=parse_time(event['end'], local_tz),
+            all_day='date' in event['start'],
+            calendar_id=calendar_id,
+            summary=event.get('summary', 'Kein Titel'),
+            id=event.get('id', ''),
+        )
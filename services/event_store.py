@@ -0,0 +1,342 @@
+"""
+event_store.py
+
+A local store of calendar events that is kept up to date incrementally.
+
+Each calendar is downloaded in full once. Afterwards only the changes since the last
+sync are pulled using the `nextSyncToken` returned by the Calendar API, and the
+today/tomorrow/week/next queries are answered from a sorted in-memory index.
+The store can optionally be persisted in a SQLite file, so a restart resumes with
+the saved sync tokens instead of a full download.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+
+from googleapiclient.errors import HttpError
+
+from services.calendar_client import calendar_client
+from services.calendar_fetch import run_per_calendar
+from services.event import Event
+from utils.settings import get_settings
+from utils.tracing import span
+
+# How far into the past the initial full sync reaches
+FULL_SYNC_LOOKBACK = timedelta(days=1)
+PAGE_SIZE = 2500
+# Partial response: the stored event fields plus 'status' to detect deletions
+SYNC_FIELDS = "items(id,status,summary,start,end),nextPageToken,nextSyncToken"
+# Calendars with a push channel are re-synced this rarely, in case a notification got lost
+WATCHED_MAX_AGE = 6 * 60 * 60
+
+
+class CalendarState:
+    """
+    The synced events of one calendar.
+    """
+
+    __slots__ = ("sync_token", "events", "synced_at")
+
+    def __init__(self, sync_token=None):
+        self.sync_token = sync_token
+        self.events = {}  # event id -> Event
+        self.synced_at = 0.0
+
+
+class EventStore:
+    """
+    In-memory event store with incremental sync and optional SQLite persistence.
+
+    Events of all calendars are kept in one list sorted by start time, so range
+    queries are a binary search plus a short scan.
+    """
+
+    def __init__(self, local_tz, client=calendar_client, path=None, max_age=None):
+        """
+        Args:
+            local_tz (pytz.tzinfo.BaseTzInfo): The local timezone for parsed event times.
+            client (CalendarClient): The client used to talk to the API.
+            path (str, optional): SQLite file for persistence ('EVENT_STORE_PATH').
+            max_age (float, optional): Seconds after which a calendar is synced again
+                before answering a query ('EVENT_STORE_MAX_AGE').
+        """
+        self.local_tz = local_tz
+        self.client = client
+        settings = get_settings()
+        self.path = path if path is not None else settings.event_store_path
+        self.max_age = max_age if max_age is not None else settings.event_store_max_age
+        self.stats = {"full_syncs": 0, "delta_syncs": 0, "requests": 0}
+        # Incremented whenever a sync changes the stored events
+        self.version = 0
+        self._lock = threading.RLock()
+        self._calendars = {}
+        self._index = []  # sorted (start timestamp, calendar id, event id)
+        self._max_duration = 0.0
+        self._watched = set()
+        self._listeners = []
+        self._db = None
+        if self.path:
+            self._open_db()
+
+    def events_between(self, time_min, time_max):
+        """
+        Returns the events overlapping [time_min, time_max), like `events.list` with timeMin/timeMax.
+
+        Args:
+            time_min (datetime): Events must end after this time.
+            time_max (datetime): Events must start before this time.
+
+        Returns:
+            list: Event objects ordered by start time.
+        """
+        with span("sync"):
+            self.sync()
+        min_ts, max_ts = time_min.timestamp(), time_max.timestamp()
+        with self._lock:
+            # Events that started before time_min may still be running
+            lo = bisect_left(self._index, (min_ts - self._max_duration,))
+            hi = bisect_left(self._index, (max_ts,))
+            result = []
+            for _, cal_id, event_id in self._index[lo:hi]:
+                event = self._calendars[cal_id].events[event_id]
+                if event.end.timestamp() > min_ts:
+                    result.append(event)
+            return result
+
+    def next_events(self, after, limit=1):
+        """
+        Returns the first events that start after the given time.
+
+        Args:
+            after (datetime): The reference time.
+            limit (int or None): The maximum number of events; None for all.
+
+        Returns:
+            list: Event objects ordered by start time.
+        """
+        with span("sync"):
+            self.sync()
+        with self._lock:
+            lo = bisect_right(self._index, (after.timestamp(), chr(0x10FFFF)))
+            return [
+                self._calendars[cal_id].events[event_id]
+                for _, cal_id, event_id in self._index[lo:None if limit is None else lo + limit]
+            ]
+
+    def sync(self, force=False):
+        """
+        Pulls changes for every calendar whose data is older than `max_age`.
+
+        Calendars that fail or time out keep their previous data.
+
+        Args:
+            force (bool): Sync all calendars regardless of their age.
+        """
+        calendar_ids = self.client.calendar_ids()
+        now = time.monotonic()
+        with self._lock:
+            for cal_id in set(self._calendars) - set(calendar_ids):
+                self._drop_calendar(cal_id)
+                self._persist_removal(cal_id)
+            stale = [
+                cal_id for cal_id in calendar_ids
+                if force or cal_id not in self._calendars
+                or now - self._calendars[cal_id].synced_at >= (WATCHED_MAX_AGE if cal_id in self._watched else self.max_age)
+            ]
+        if stale:
+            run_per_calendar(stale, self._sync_calendar)
+
+    def invalidate(self, cal_id=None):
+        """
+        Marks one or all calendars as outdated, so the next query syncs them.
+
+        Args:
+            cal_id (str, optional): The calendar to invalidate; all calendars if omitted.
+        """
+        with self._lock:
+            for state_id, state in self._calendars.items():
+                if cal_id is None or state_id == cal_id:
+                    state.synced_at = float("-inf")
+
+    def subscribe(self, listener):
+        """
+        Registers a listener called as `listener(old, new)` for every event a sync adds
+        (old is None), changes or removes (new is None). Listeners run with the store
+        locked and must not call back into it.
+
+        Args:
+            listener (Callable[[Event or None, Event or None], None]): The listener.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def set_watched(self, cal_id, watched):
+        """
+        Marks a calendar as covered by push notifications (see `calendar_watch`). Such a
+        calendar is only synced after `invalidate` or after `WATCHED_MAX_AGE`, instead of
+        after `max_age`.
+
+        Args:
+            cal_id (str): The calendar.
+            watched (bool): Whether a notification channel is open for it.
+        """
+        with self._lock:
+            if watched:
+                self._watched.add(cal_id)
+            else:
+                self._watched.discard(cal_id)
+
+    def _sync_calendar(self, cal_id):
+        """
+        Runs a full or incremental sync of one calendar and applies the changes.
+        """
+        with self._lock:
+            state = self._calendars.get(cal_id)
+            sync_token = state.sync_token if state else None
+
+        try:
+            items, next_sync_token = self._list_changes(cal_id, sync_token)
+        except HttpError as e:
+            if e.resp.status != 410 or sync_token is None:
+                raise
+            # The sync token expired: start over with a full sync
+            print(f"🔄 Sync-Token für Kalender {cal_id} abgelaufen, lade neu.")
+            sync_token = None
+            items, next_sync_token = self._list_changes(cal_id, None)
+
+        with self._lock:
+            if sync_token is None:
+                self._drop_calendar(cal_id)
+                self._calendars[cal_id] = CalendarState()
+                self.stats["full_syncs"] += 1
+            else:
+                self.stats["delta_syncs"] += 1
+            state = self._calendars[cal_id]
+            for event in items:
+                self._apply(cal_id, state, event)
+            if items or sync_token is None:
+                self.version += 1
+            state.sync_token = next_sync_token
+            state.synced_at = time.monotonic()
+            self._persist(cal_id, state, items, full=sync_token is None)
+
+    def _list_changes(self, cal_id, sync_token):
+        """
+        Lists all pages of a full or incremental sync.
+
+        Returns:
+            tuple: The changed events and the next sync token.
+        """
+        params = {"calendarId": cal_id, "singleEvents": True, "maxResults": PAGE_SIZE, "fields": SYNC_FIELDS}
+        if sync_token:
+            params["syncToken"] = sync_token
+        else:
+            params["timeMin"] = (datetime.now(self.local_tz) - FULL_SYNC_LOOKBACK).isoformat()
+
+        items = []
+        for page in self.client.pages("events", **params):
+            with self._lock:
+                self.stats["requests"] += 1
+            items.extend(page.get("items", []))
+        return items, page.get("nextSyncToken")
+
+    def _apply(self, cal_id, state, event):
+        """
+        Inserts, moves or removes one event in the calendar state and the index.
+        """
+        old = state.events.pop(event["id"], None)
+        if old is not None:
+            key = (old.start.timestamp(), cal_id, event["id"])
+            pos = bisect_left(self._index, key)
+            if pos < len(self._index) and self._index[pos] == key:
+                del self._index[pos]
+
+        if event.get("status") == "cancelled":
+            if old is not None:
+                self._notify(old, None)
+            return
+
+        parsed = Event.from_api(event, cal_id, self.local_tz)
+        state.events[event["id"]] = parsed
+        insort(self._index, (parsed.start.timestamp(), cal_id, event["id"]))
+        self._max_duration = max(self._max_duration, (parsed.end - parsed.start).total_seconds())
+        if old != parsed:
+            self._notify(old, parsed)
+
+    def _notify(self, old, new):
+        for listener in self._listeners:
+            try:
+                listener(old, new)
+            except Exception as e:
+                print(f"❌ Änderung an '{(new or old).summary}' konnte nicht gemeldet werden: {e}")
+
+    def _drop_calendar(self, cal_id):
+        state = self._calendars.pop(cal_id, None)
+        if state is not None and state.events:
+            self._index = [entry for entry in self._index if entry[1] != cal_id]
+            for event in state.events.values():
+                self._notify(event, None)
+
+    def _open_db(self):
+        """
+        Opens the SQLite file and loads the persisted calendars into memory.
+        """
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS calendars (id TEXT PRIMARY KEY, sync_token TEXT);
+            CREATE TABLE IF NOT EXISTS events (
+                calendar_id TEXT, event_id TEXT, data TEXT,
+                PRIMARY KEY (calendar_id, event_id)
+            );
+        """)
+        with self._lock:
+            for cal_id, sync_token in self._db.execute("SELECT id, sync_token FROM calendars"):
+                self._calendars[cal_id] = CalendarState(sync_token)
+            for cal_id, data in self._db.execute("SELECT calendar_id, data FROM events"):
+                state = self._calendars.get(cal_id)
+                if state is not None:
+                    self._apply(cal_id, state, json.loads(data))
+
+    def _persist(self, cal_id, state, items, full):
+        """
+        Writes the result of a sync to the SQLite file, if persistence is enabled.
+        """
+        if self._db is None:
+            return
+        with self._db:
+            if full:
+                self._db.execute("DELETE FROM events WHERE calendar_id = ?", (cal_id,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO calendars (id, sync_token) VALUES (?, ?)",
+                (cal_id, state.sync_token)
+            )
+            for event in items:
+                if event.get("status") == "cancelled":
+                    self._db.execute(
+                        "DELETE FROM events WHERE calendar_id = ? AND event_id = ?",
+                        (cal_id, event["id"])
+                    )
+                else:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO events (calendar_id, event_id, data) VALUES (?, ?, ?)",
+                        (cal_id, event["id"], json.dumps(event))
+                    )
+
+    def _persist_removal(self, cal_id):
+        """
+        Removes a calendar that is no longer subscribed from the SQLite file.
+        """
+        if self._db is None:
+            return
+        with self._db:
+            self._db.execute("DELETE FROM events WHERE calendar_id = ?", (cal_id,))
+            self._db.execute("DELETE FROM calendars WHERE id = ?", (cal_id,))
@@ -1,53 +1,38 @@
-import os
-import os.path
-import pickle
-import time
+import threading
 from datetime import datetime, timedelta
 
 import pytz
-from dotenv import load_dotenv
-from google.auth.transport.requests import Request
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 
-from utils.formatter import format_today
-from services.weather import get_weather_forecast
+from utils.formatter import format_today, format_week
+from services.alerts import AlertEngine
+from services.availability import busy_intervals, find_conflicts, free_slots, query_freebusy
+from services.calendar_client import AuthorizationRequired, calendar_client
+from services.digest import DigestPrefetcher
+from services.event_store import EventStore
+from services.job_journal import JobJournal
+from services.scheduler import BatchScheduler, Scheduler
+from services.subscribers import load_subscribers
+from services.weather import get_event_weather, get_weather_forecast, prefetch_weather
+from utils.metrics import REGISTRY
+from utils.settings import get_settings, on_change, watch_settings
 
-last_sent_date = None
-
-SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 timezone = pytz.timezone("Europe/Berlin")
 
+_event_store = None
+_event_store_lock = threading.Lock()
+
 
 def authenticate_google():
     """
-    Authenticates the user with the Google Calendar API using OAuth2.
+    Returns the authenticated Google Calendar service object.
 
-    This function checks if valid credentials are stored in 'token.pkl'. If found,
-    these credentials are used to build a service object for the Google Calendar API.
-    Otherwise, it prompts the user to authenticate via a web browser and stores the new credentials.
+    Credentials are loaded and the service is built only once by the shared `CalendarClient`;
+    subsequent calls reuse it.
 
     Returns:
         googleapiclient.discovery.Resource: A service object for interacting with the Google Calendar API.
     """
-    creds = None
-
-    if os.path.exists('token.pkl'):
-        with open('token.pkl', 'rb') as token:
-            creds = pickle.load(token)
-
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            creds = flow.run_local_server(port=8080)
-
-        with open('token.pkl', 'wb') as token:
-            pickle.dump(creds, token)
-
-    service = build('calendar', 'v3', credentials=creds)
-    return service
+    return calendar_client.service
 
 
 def list_calendars():
@@ -57,266 +42,362 @@ def list_calendars():
     Returns:
         list: A list of calendar ID strings.
     """
-    service = authenticate_google()
-    calendar_list = service.calendarList().list().execute()
-    return [calendar["id"] for calendar in calendar_list["items"]]
+    return calendar_client.calendar_ids()
 
 
-def get_events_for_today():
+def get_event_store():
     """
-    Retrieves events scheduled for today from all available calendars.
+    Returns the shared event store, creating it on first use.
 
-    The function gathers events occurring between the current time and the end of the day
-    for each calendar and formats them as a list of strings, converting all times to the local timezone.
+    Persistence and sync interval are configured via 'EVENT_STORE_PATH' and 'EVENT_STORE_MAX_AGE'.
 
     Returns:
-        list: A list of strings representing today's events.
+        EventStore: The store all calendar queries are answered from.
     """
-    service = authenticate_google()
-
-    local_tz = pytz.timezone("Europe/Berlin")
-
-    now = datetime.now(local_tz)
-    end_of_day = now.replace(hour=23, minute=59, second=59)
+    global _event_store
+    with _event_store_lock:
+        if _event_store is None:
+            _event_store = store = EventStore(timezone)
+            REGISTRY.register_stats(
+                "morningsync_event_store", lambda: dict(store.stats, version=store.version),
+                "Shared calendar event store", counters=("full_syncs", "delta_syncs", "requests")
+            )
+        return _event_store
+
+
+def get_events_between(time_min, time_max, store=None):
+    """
+    Retrieves the events of all available calendars that overlap the given time range.
 
-    today = []
+    Args:
+        time_min (datetime): Start of the range (events ending after it are included).
+        time_max (datetime): End of the range (events starting before it are included).
+        store (EventStore, optional): The store to query; defaults to the shared store.
 
-    calendar_ids = list_calendars()
-    for cal_id in calendar_ids:
-        events_result = service.events().list(
-            calendarId=cal_id,
-            timeMin=now.isoformat(),
-            timeMax=end_of_day.isoformat(),
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+    Returns:
+        list: Event objects ordered by start time, with times in the local timezone.
+    """
+    return (store or get_event_store()).events_between(time_min, time_max)
 
-        events = events_result.get("items", [])
 
-        for event in events:
-            start_raw = event['start'].get('dateTime', event['start'].get('date'))
-            summary = event.get('summary', 'Kein Titel')
+def get_events_for_today(tz=timezone, store=None):
+    """
+    Retrieves events scheduled for today from all available calendars.
 
-            if 'Z' in start_raw:
-                dt = datetime.fromisoformat(start_raw.replace('Z', '+00:00')).astimezone(local_tz)
-            else:
-                dt = datetime.fromisoformat(start_raw)
-                if dt.tzinfo is None:
-                    dt = local_tz.localize(dt)
-                else:
-                    dt = dt.astimezone(local_tz)
+    The function gathers events occurring between the current time and the end of the day.
 
-            today.append(f"– {dt.isoformat()} Uhr: {summary}")
+    Args:
+        tz (pytz.tzinfo.BaseTzInfo): The timezone that defines "today".
+        store (EventStore, optional): The store to query; defaults to the shared store.
 
-    return today
+    Returns:
+        list: Event objects representing today's events.
+    """
+    now = datetime.now(tz)
+    end_of_day = now.replace(hour=23, minute=59, second=59)
+    return get_events_between(now, end_of_day, store)
 
 
-def get_events_for_tomorrow():
+def get_events_for_tomorrow(tz=timezone, store=None):
     """
     Retrieves events scheduled for tomorrow from all available calendars.
 
-    The function gathers events occurring between the start and end of tomorrow for each
-    calendar and formats them as a list of strings, converting all times to the local timezone.
+    The function gathers events occurring between the start and end of tomorrow.
+
+    Args:
+        tz (pytz.tzinfo.BaseTzInfo): The timezone that defines "tomorrow".
+        store (EventStore, optional): The store to query; defaults to the shared store.
 
     Returns:
-        list: A list of strings representing tomorrow's events.
+        list: Event objects representing tomorrow's events.
     """
-    service = authenticate_google()
-    local_tz = pytz.timezone("Europe/Berlin")
+    tomorrow = datetime.now(tz) + timedelta(days=1)
+    start_of_tomorrow = tz.localize(datetime(tomorrow.year, tomorrow.month, tomorrow.day, 0, 0, 0))
+    end_of_tomorrow = tz.localize(datetime(tomorrow.year, tomorrow.month, tomorrow.day, 23, 59, 59))
+    return get_events_between(start_of_tomorrow, end_of_tomorrow, store)
 
-    now = datetime.now(local_tz)
-    tomorrow = now + timedelta(days=1)
-    start_of_tomorrow = local_tz.localize(datetime(tomorrow.year, tomorrow.month, tomorrow.day, 0, 0, 0))
-    end_of_tomorrow = local_tz.localize(datetime(tomorrow.year, tomorrow.month, tomorrow.day, 23, 59, 59))
 
-    events_list = []
+def get_events_for_the_week(tz=timezone, store=None):
+    """
+    Retrieves events from now until the end of the current week from all available calendars.
 
-    calendar_ids = list_calendars()
-    for cal_id in calendar_ids:
-        events_result = service.events().list(
-            calendarId=cal_id,
-            timeMin=start_of_tomorrow.isoformat(),
-            timeMax=end_of_tomorrow.isoformat(),
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+    Args:
+        tz (pytz.tzinfo.BaseTzInfo): The timezone that defines the week.
+        store (EventStore, optional): The store to query; defaults to the shared store.
 
-        events = events_result.get("items", [])
+    Returns:
+        list: Event objects representing the events for the week.
+    """
+    now = datetime.now(tz)
+    end_of_week = now + timedelta(days=(6 - now.weekday()))
+    end_of_week = tz.localize(datetime(end_of_week.year, end_of_week.month, end_of_week.day, 23, 59, 59))
+    return get_events_between(now, end_of_week, store)
 
-        for event in events:
-            start_raw = event['start'].get('dateTime', event['start'].get('date'))
-            summary = event.get('summary', 'Kein Titel')
 
-            if 'Z' in start_raw:
-                dt = datetime.fromisoformat(start_raw.replace('Z', '+00:00')).astimezone(local_tz)
-            else:
-                dt = datetime.fromisoformat(start_raw)
-                if dt.tzinfo is None:
-                    dt = local_tz.localize(dt)
-                else:
-                    dt = dt.astimezone(local_tz)
+def get_next_event(tz=timezone, store=None):
+    """
+    Retrieves the next upcoming event from all available calendars.
 
-            events_list.append(f"– {dt.isoformat()} Uhr: {summary}")
+    Args:
+        tz (pytz.tzinfo.BaseTzInfo): The timezone of the returned event times.
+        store (EventStore, optional): The store to query; defaults to the shared store.
 
-    return events_list
+    Returns:
+        list: A list containing the soonest Event that starts in the future,
+              or an empty list if no events are found.
+    """
+    return (store or get_event_store()).next_events(datetime.now(tz))
 
 
-def get_events_for_the_week():
+def get_free_slots_for_today(tz=timezone, store=None):
     """
-    Retrieves events from today until the end of the current week from all available calendars.
+    Finds the free time left today across all calendars.
 
-    The function gathers events occurring during this week and formats them as a list of strings,
-    converting all times to the local timezone.
+    The day is bounded by 'FREE_DAY_START' and 'FREE_DAY_END' (default 08:00–20:00); gaps
+    shorter than 'FREE_SLOT_MINUTES' are left out. The busy times come from the event store,
+    or from one `freebusy.query` request if 'USE_FREEBUSY' is set.
+
+    Args:
+        tz (pytz.tzinfo.BaseTzInfo): The timezone that defines "today".
+        store (EventStore, optional): The store to query; defaults to the shared store.
 
     Returns:
-        list: A list of strings representing the events for the week.
+        list: (start, end) datetime pairs of the free slots.
     """
-    service = authenticate_google()
-    local_tz = pytz.timezone("Europe/Berlin")
-
-    now = datetime.now(local_tz)
-    start_of_today = now
-    end_of_week = now + timedelta(days=(6 - now.weekday()))
-    end_of_week = local_tz.localize(datetime(end_of_week.year, end_of_week.month, end_of_week.day, 23, 59, 59))
+    settings = get_settings()
+    now = datetime.now(tz)
+    start = max(now, tz.localize(datetime.combine(now.date(), settings.free_day_start)))
+    end = tz.localize(datetime.combine(now.date(), settings.free_day_end))
+    if start >= end:
+        return []
+    if settings.use_freebusy:
+        client = (store or get_event_store()).client
+        busy = query_freebusy(client, client.calendar_ids(), start, end, tz)
+    else:
+        busy = busy_intervals(get_events_between(start, end, store))
+    return free_slots(busy, start, end, settings.free_slot_min)
 
-    events_list = []
 
-    calendar_ids = list_calendars()
-    for cal_id in calendar_ids:
-        events_result = service.events().list(
-            calendarId=cal_id,
-            timeMin=start_of_today.isoformat(),
-            timeMax=end_of_week.isoformat(),
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+def get_conflicts_for_the_week(tz=timezone, store=None):
+    """
+    Finds the overlapping events from now until the end of the current week.
 
-        events = events_result.get("items", [])
+    Args:
+        tz (pytz.tzinfo.BaseTzInfo): The timezone that defines the week.
+        store (EventStore, optional): The store to query; defaults to the shared store.
 
-        for event in events:
-            start_raw = event['start'].get('dateTime', event['start'].get('date'))
-            summary = event.get('summary', 'Kein Titel')
+    Returns:
+        list: (earlier, later) Event pairs that overlap.
+    """
+    return find_conflicts(get_events_for_the_week(tz, store))
 
-            if 'Z' in start_raw:
-                dt = datetime.fromisoformat(start_raw.replace('Z', '+00:00')).astimezone(local_tz)
-            else:
-                dt = datetime.fromisoformat(start_raw)
-                if dt.tzinfo is None:
-                    dt = local_tz.localize(dt)
-                else:
-                    dt = dt.astimezone(local_tz)
 
-            events_list.append(f"– {dt.isoformat()} Uhr: {summary}")
+def build_daily_digest(tz=timezone, store=None, city=None):
+    """
+    Builds the daily digest with today's calendar events and optional weather info.
 
-    return events_list
+    If 'INCLUDE_EVENT_WEATHER' is set, each event is annotated with the forecast for its
+    start time (e.g. rain at a 17:00 appointment).
 
+    Args:
+        tz (pytz.tzinfo.BaseTzInfo): The timezone of the recipient.
+        store (EventStore, optional): The recipient's event store; defaults to the shared store.
+        city (str, optional): The city for the weather; defaults to 'CITY'.
 
-def get_next_event():
+    Returns:
+        str: The digest message.
     """
-    Retrieves the next upcoming event from all available calendars.
+    events = get_events_for_today(tz, store)
+    notes = get_event_weather(events, city) if get_settings().include_event_weather else None
+    message = format_today(events, notes=notes)
+    weather = get_weather_forecast(city)
+    if weather:
+        city = city or get_settings().city or "deiner Stadt"
+        message += f"\n\n\U0001F324 Wetter heute in {city}: {weather}"
+    return message
 
-    The function collects the next event from each calendar, determines the soonest event
-    that starts in the future, and returns it formatted as a list of strings, converting
-    the time to the local timezone.
-
-    Returns:
-        list: A list containing a header and the next event's details. If no events are found,
-              a list with a message indicating that no events were found is returned.
-    """
-    service = authenticate_google()
-    local_tz = pytz.timezone("Europe/Berlin")
-
-    now = datetime.now(local_tz)
-    all_events = []
-
-    calendar_ids = list_calendars()
-    for cal_id in calendar_ids:
-        events_result = service.events().list(
-            calendarId=cal_id,
-            timeMin=now.isoformat(),
-            maxResults=3,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-
-        events = events_result.get("items", [])
-        for event in events:
-            start_str = event['start'].get('dateTime', event['start'].get('date'))
-
-            if 'Z' in start_str:
-                dt = datetime.fromisoformat(start_str.replace('Z', '+00:00')).astimezone(local_tz)
-            else:
-                dt = datetime.fromisoformat(start_str)
-                if dt.tzinfo is None:
-                    dt = local_tz.localize(dt)
-                else:
-                    dt = dt.astimezone(local_tz)
-
-            if dt > now:
-                all_events.append((dt, event))
-                break
-
-    if not all_events:
-        return []
 
-    all_events.sort(key=lambda x: x[0])
-    next_event = all_events[0][1]
+def get_daily_reminder(prepared=None):
+    """
+    Generates the daily reminder message with today's calendar events and optional weather info.
 
-    summary = next_event.get("summary", "kein titel")
-    return [f"– {all_events[0][0].isoformat()} Uhr: {summary}"]
+    The time at which the reminder is sent is decided by the scheduler in `reminder_loop`;
+    that it goes out only once per day, also across restarts, is ensured by the job journal
+    (see `services/job_journal.py`). If enabled via environment settings, it will also
+    append a weather summary to the message.
 
+    Args:
+        prepared (str, optional): A digest that was already built ahead of time.
 
-def get_daily_reminder():
+    Returns:
+        str: The reminder message string.
     """
-    Checks if the current time matches the configured reminder time and returns a formatted
-    list of today's events if it hasn't been sent yet today.
-    Generates a daily reminder message with today's calendar events and optional weather info.
+    return prepared or build_daily_digest()
 
-    The reminder time is configured via the environment variable 'DAILY_REMINDER_TIME' in the format 'HH:MM'.
-    This function ensures that the reminder is only sent once per day.
-    The function checks if the current time matches the configured reminder time. If the reminder
-    has not yet been sent today, it formats a message including today's calendar events. If enabled
-    via environment settings, it will also append a weather summary to the message.
+
+def get_weekly_summary():
+    """
+    Generates the weekly summary message with the remaining events of the current week.
 
     Returns:
-        str or None: A formatted string of today's events if the reminder should be sent, otherwise None.
-        str or None: The reminder message string if it is time to send it, otherwise None.
+        str: The formatted week overview.
     """
-    global last_sent_date
+    return format_week(get_events_for_the_week())
 
-    load_dotenv()
-    reminder_time_str = os.getenv("DAILY_REMINDER_TIME", "08:00")  # Format: "HH:MM"
-    reminder_hour, reminder_minute = map(int, reminder_time_str.split(":"))
 
-    local_tz = timezone
-    now = datetime.now(local_tz)
+def send_subscriber_digest(subscriber, send_func):
+    """
+    Builds and sends the daily digest of one subscriber. A subscriber without a valid
+    Google token is reported and skipped.
 
-    if now.hour == reminder_hour and now.minute == reminder_minute:
-        if last_sent_date != now.date():
-            events = get_events_for_today()
-            message = format_today(events)
-            weather = get_weather_forecast()
-            if weather:
-                city = os.getenv("CITY", "deiner Stadt")
-                message += f"\n\n\U0001F324 Wetter heute in {city}: {weather}"
-            last_sent_date = now.date()
-            return message
-    return None
+    Args:
+        subscriber (Subscriber): The recipient.
+        send_func (Callable[..., None]): Sends a message like `send_message`; called with the
+            subscriber's conversation SID and `wait=True`, so a full outbox slows the wave
+            down instead of dropping digests.
+    """
+    try:
+        message = build_daily_digest(subscriber.tz, subscriber.event_store(), subscriber.city)
+    except AuthorizationRequired as e:
+        print(f"⚠️ Digest für Abonnent {subscriber.id} übersprungen: {e}")
+        return
+    finally:
+        # The client is idle until tomorrow's digest
+        subscriber.close_connections()
+    send_func(message, conversation_sid=subscriber.conversation_sid, wait=True)
 
 
 def reminder_loop(send_func):
     """
-    Continuously checks whether it's time to send the daily reminder and sends it using the provided function.
+    Sends the daily reminder (and the optional weekly summary) at the configured times,
+    blocking the calling thread.
+
+    Args:
+        send_func (Callable[[str], None]): A function that takes a string message and handles sending it.
+    """
+    watch_settings()
+    build_reminder_scheduler(send_func).run()
+
+
+def build_reminder_scheduler(send_func):
+    """
+    Plans the daily reminder (and the optional weekly summary) at the configured times.
 
-    This loop runs indefinitely, checking every 30 seconds if the reminder message should be sent. If so, it calls
-    the provided `send_func` with the generated message.
+    The reminder time is configured via the environment variable 'DAILY_REMINDER_TIME' in the format 'HH:MM'.
+    The optional weekly summary is configured via 'WEEKLY_SUMMARY_TIME' in the format 'Mo 07:30'.
+    The scheduler sleeps until the next job is due instead of polling the clock, and the jobs are
+    moved when these settings change in '.env' while the bot is running.
+    The daily digest is built 'DIGEST_LEAD_MINUTES' ahead of time and refreshed if the calendar
+    changes, so it goes out on time even when the calendar or weather API is slow.
+    Digest and summary runs are recorded in the job journal ('JOB_JOURNAL_PATH'): a run is
+    never sent twice, and a run missed while the bot was down is sent on startup if it is
+    at most 'CATCH_UP_GRACE_MINUTES' late.
+
+    If 'EVENT_ALERT_MINUTES' is set, every timed event is additionally announced that many
+    minutes before it starts (see `services/alerts.py`).
+
+    If 'SUBSCRIBERS_PATH' lists subscribers, each of them receives their own digest at their
+    own reminder time; subscribers due at the same instant are processed as one batch
+    (pool size 'DIGEST_WORKERS'). The weather of a batch is loaded up front, once per
+    distinct city. A batch is sent in the background, so a wave that waits for the
+    outbox for hours does not hold up the other jobs. Each subscriber's digest is
+    recorded in the job journal and caught up like the own digest.
 
     Args:
         send_func (Callable[[str], None]): A function that takes a string message and handles sending it.
+
+    Returns:
+        Scheduler: The scheduler with all jobs planned; run it with `run` or `run_async`.
     """
-    while True:
-        message = get_daily_reminder()
-        if message:
-            send_func(message)
-            print("Sent MorningSync Message")
-        time.sleep(30)
\ No newline at end of file
+    settings = get_settings()
+    journal = JobJournal(settings.job_journal_path) if settings.job_journal_path else None
+    scheduler = Scheduler(timezone, journal=journal)
+
+    alerts = None
+    if settings.alert_lead:
+        alerts = AlertEngine(get_event_store(), scheduler, send_func, settings.alert_lead)
+        alerts.start()
+
+    def set_alert_lead(lead):
+        nonlocal alerts
+        if alerts is not None and lead:
+            alerts.set_lead(lead)
+        elif alerts is not None:
+            alerts.stop()
+            alerts = None
+        elif lead:
+            alerts = AlertEngine(get_event_store(), scheduler, send_func, lead)
+            alerts.start()
+
+    subscribers = load_subscribers()
+    if subscribers:
+        batches = BatchScheduler(
+            scheduler,
+            lambda subscriber: send_subscriber_digest(subscriber, send_func),
+            workers=settings.digest_workers,
+            prepare=lambda batch: prefetch_weather(subscriber.city for subscriber in batch),
+            name=lambda subscriber: f"digest {subscriber.id}"
+        )
+        batches.add_all((subscriber, subscriber.reminder_time, subscriber.tz) for subscriber in subscribers)
+        batches.catch_up(settings.catch_up_grace)
+
+        def apply_subscriber_settings(old, new, changed):
+            if "alert_lead" in changed:
+                set_alert_lead(new.alert_lead)
+            if "digest_workers" in changed:
+                batches.set_workers(new.digest_workers)
+
+        on_change(apply_subscriber_settings)
+        print(f"👥 {len(subscribers)} Abonnenten in {len(batches.bucket_sizes())} Versandwellen geplant.")
+        print(f"⏰ Nächste Erinnerung: {scheduler.next_run().isoformat()}")
+        return scheduler
+
+    def send_daily_reminder(prepared):
+        send_func(get_daily_reminder(prepared))
+        print("Sent MorningSync Message")
+
+    def digest_version():
+        store = get_event_store()
+        store.sync(force=True)
+        return store.version
+
+    def send_weekly_summary():
+        send_func(get_weekly_summary())
+        print("Sent MorningSync Weekly Summary")
+
+    prefetcher = DigestPrefetcher(
+        scheduler,
+        build=build_daily_digest,
+        version=digest_version,
+        send=send_daily_reminder,
+        at=settings.daily_reminder_time,
+        lead=settings.digest_lead
+    )
+    prefetcher.install()
+
+    weekly_job = None
+    if settings.weekly_summary_time:
+        weekday, at = settings.weekly_summary_time
+        weekly_job = scheduler.every_week(weekday, at, send_weekly_summary, name="weekly summary", durable=True)
+    scheduler.catch_up(settings.catch_up_grace)
+
+    def apply_settings(old, new, changed):
+        nonlocal weekly_job
+        if "alert_lead" in changed:
+            set_alert_lead(new.alert_lead)
+        if changed & {"daily_reminder_time", "digest_lead"}:
+            prefetcher.reschedule(new.daily_reminder_time, new.digest_lead)
+        if "weekly_summary_time" in changed:
+            if weekly_job is not None:
+                scheduler.cancel(weekly_job)
+                weekly_job = None
+            if new.weekly_summary_time:
+                weekday, at = new.weekly_summary_time
+                weekly_job = scheduler.every_week(weekday, at, send_weekly_summary, name="weekly summary", durable=True)
+        if changed & {"daily_reminder_time", "digest_lead", "weekly_summary_time"}:
+            print(f"⏰ Nächste Erinnerung: {scheduler.next_run().isoformat()}")
+
+    on_change(apply_settings)
+
+    print(f"⏰ Nächste Erinnerung: {scheduler.next_run().isoformat()}")
+    return scheduler
@@ -0,0 +1,195 @@
+"""
+job_journal.py
+
+A durable record of the scheduler's important job runs (daily digest, weekly summary).
+
+Every run of a durable job goes through the states 'planned' (scheduled), 'started'
+(about to send) and 'delivered' (handed to the outbox), or ends as 'failed', 'missed'
+or 'interrupted'. The journal lives in a SQLite file in WAL mode, and each state
+change is committed before the next step, so after a crash or restart it tells:
+
+- which runs were planned but never started, and are therefore caught up if they are
+  at most 'CATCH_UP_GRACE_MINUTES' late;
+- which runs were already started, and are therefore never repeated. A run that
+  crashed between 'started' and 'delivered' may or may not have gone out; it is
+  reported instead of being sent a second time (at most once).
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+PLANNED = "planned"
+STARTED = "started"
+DELIVERED = "delivered"
+FAILED = "failed"
+MISSED = "missed"
+INTERRUPTED = "interrupted"
+
+# Finished runs are kept this long for inspection
+RETENTION = timedelta(days=30)
+
+
+class JobJournal:
+    """
+    The run states of durable jobs, keyed by job name and due time.
+
+    All methods are safe to call from several threads, and from several processes
+    sharing the file: a run can only be claimed once.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The SQLite file ('JOB_JOURNAL_PATH').
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # A claimed run must be on disk before the message goes out
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                job TEXT, due INTEGER, state TEXT, updated_at REAL,
+                PRIMARY KEY (job, due)
+            )
+        """)
+
+    def plan(self, job, due):
+        """
+        Records an upcoming run; a run that is already known keeps its state.
+
+        Args:
+            job (str): The job name.
+            due (datetime): The tz-aware due time of the run.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR IGNORE INTO job_runs (job, due, state, updated_at) VALUES (?, ?, ?, ?)",
+                (job, _key(due), PLANNED, time.time())
+            )
+
+    def plan_many(self, runs):
+        """
+        Records many upcoming runs in one transaction, see `plan`.
+
+        Args:
+            runs (Iterable[tuple]): (job name, tz-aware due time) pairs.
+        """
+        now = time.time()
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO job_runs (job, due, state, updated_at) VALUES (?, ?, ?, ?)",
+                [(job, _key(due), PLANNED, now) for job, due in runs]
+            )
+
+    def unplan(self, job, due):
+        """
+        Forgets a planned run that was cancelled, e.g. because the reminder time moved.
+        Runs that already started are kept.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM job_runs WHERE job = ? AND due = ? AND state = ?", (job, _key(due), PLANNED)
+            )
+
+    def claim(self, job, due):
+        """
+        Marks a run as started, unless it was started before.
+
+        Returns:
+            bool: True if the caller may run it; False if it already ran or is running.
+        """
+        key = _key(due)
+        with self._lock, self._db:
+            claimed = self._db.execute(
+                "UPDATE job_runs SET state = ?, updated_at = ? WHERE job = ? AND due = ? AND state = ?",
+                (STARTED, time.time(), job, key, PLANNED)
+            ).rowcount
+            if not claimed:
+                # A run that was never planned (e.g. the journal was deleted) can still be claimed once
+                claimed = self._db.execute(
+                    "INSERT OR IGNORE INTO job_runs (job, due, state, updated_at) VALUES (?, ?, ?, ?)",
+                    (job, key, STARTED, time.time())
+                ).rowcount
+        return bool(claimed)
+
+    def finish(self, job, due, state=DELIVERED):
+        """
+        Records the outcome of a claimed run.
+
+        Args:
+            state (str): DELIVERED or FAILED.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE job_runs SET state = ?, updated_at = ? WHERE job = ? AND due = ?",
+                (state, time.time(), job, _key(due))
+            )
+
+    def state(self, job, due):
+        """
+        Returns:
+            str or None: The state of a run, None if it is unknown.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM job_runs WHERE job = ? AND due = ?", (job, _key(due))
+            ).fetchone()
+        return row[0] if row else None
+
+    def recover(self, now, grace):
+        """
+        Sorts out the runs that were due while the bot was not running.
+
+        Planned runs that are overdue by at most `grace` are returned for catch-up; older
+        ones are marked as missed. Runs left in 'started' by a crash are reported once and
+        marked as interrupted. Old finished runs are removed.
+
+        Args:
+            now (datetime): The current tz-aware time.
+            grace (timedelta): How late a run may still be caught up.
+
+        Returns:
+            list: (job name, due datetime in UTC) of the runs to catch up, oldest first.
+        """
+        now_key, oldest_key = _key(now), _key(now - grace)
+        with self._lock, self._db:
+            overdue = self._db.execute(
+                "SELECT job, due FROM job_runs WHERE state = ? AND due <= ? ORDER BY due",
+                (PLANNED, now_key)
+            ).fetchall()
+            interrupted = self._db.execute(
+                "SELECT job, due FROM job_runs WHERE state = ?", (STARTED,)
+            ).fetchall()
+            self._db.execute(
+                "UPDATE job_runs SET state = ?, updated_at = ? WHERE state = ? AND due < ?",
+                (MISSED, time.time(), PLANNED, oldest_key)
+            )
+            self._db.execute(
+                "UPDATE job_runs SET state = ?, updated_at = ? WHERE state = ?", (INTERRUPTED, time.time(), STARTED)
+            )
+            self._db.execute("DELETE FROM job_runs WHERE due < ? AND state != ?", (_key(now - RETENTION), PLANNED))
+
+        for job, due in interrupted:
+            print(f"⚠️ Job '{job}' ({_time(due).isoformat()}) wurde unterbrochen und wird nicht wiederholt.")
+        for job, due in overdue:
+            if due < oldest_key:
+                print(f"⏭️ Job '{job}' ({_time(due).isoformat()}) verpasst, zu spät zum Nachholen.")
+        return [(job, _time(due)) for job, due in overdue if due >= oldest_key]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _key(due):
+    return int(due.timestamp())
+
+
+def _time(key):
+    return datetime.fromtimestamp(key, pytz.utc)
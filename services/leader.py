@@ -0,0 +1,245 @@
+"""
+leader.py
+
+Leader election, so that several copies of the bot can run for availability while
+only one of them sends.
+
+Each copy tries to take a lease; the holder runs the scheduler and the message intake,
+the others wait as standbys and take the lease over when the holder stops renewing it.
+The lease is kept in a pluggable backend ('LEADER_BACKEND'):
+
+- 'file': an exclusive `flock` on a shared file. The operating system drops the lock
+  as soon as the holder dies, so a standby takes over within one poll interval. Needs
+  a local or lock-capable file system (POSIX only).
+- 'sqlite': a lease row with an expiry time in a shared SQLite file. A standby takes
+  over once the lease expired, i.e. within 'LEADER_LEASE_TTL' seconds.
+
+A leader that could not renew its lease for a whole TTL steps down by itself. Durable
+jobs are additionally claimed in the job journal, so even two leaders overlapping for
+a moment do not send the same digest twice.
+"""
+
+import abc
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Seconds a lease is valid without renewal
+DEFAULT_TTL = 6.0
+
+
+def default_owner():
+    """
+    Returns:
+        str: An ID unique to this process, e.g. "host:1234:1a2b3c4d".
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease(abc.ABC):
+    """
+    Interface of a lease backend. Methods are blocking and called off the event loop.
+    """
+
+    @abc.abstractmethod
+    def acquire(self, owner, ttl):
+        """
+        Takes the lease if it is free or expired, or renews it if `owner` holds it.
+
+        Args:
+            owner (str): The ID of the caller.
+            ttl (float): Seconds the lease stays valid without renewal.
+
+        Returns:
+            bool: Whether `owner` holds the lease now.
+        """
+
+    @abc.abstractmethod
+    def release(self, owner):
+        """
+        Gives the lease up, if `owner` holds it, so a standby can take over at once.
+        """
+
+
+class FileLease(Lease):
+    """
+    A lease held as an exclusive `flock` on a file; released by the OS when the process dies.
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise RuntimeError("LEADER_BACKEND=file wird unter Windows nicht unterstützt, bitte 'sqlite' verwenden.")
+        self.path = path
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def acquire(self, owner, ttl):
+        with self._lock:
+            if self._fd is not None:
+                return True
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            # The owner is only informational, e.g. for `cat leader.lease`
+            os.ftruncate(fd, 0)
+            os.write(fd, owner.encode())
+            self._fd = fd
+            return True
+
+    def release(self, owner):
+        with self._lock:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
+
+
+class SqliteLease(Lease):
+    """
+    A lease stored as a row with owner and expiry time in a SQLite file.
+    """
+
+    def __init__(self, path, name="leader"):
+        """
+        Args:
+            path (str): The SQLite file shared by all copies.
+            name (str): The lease name, so one file can hold several leases.
+        """
+        self.path = path
+        self.name = name
+        self._lock = threading.Lock()
+        # Autocommit mode, transactions are opened explicitly
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL)")
+
+    def acquire(self, owner, ttl):
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two standbys cannot both take over
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (self.name,)).fetchone()
+                if row is not None and row[0] != owner and row[1] > now:
+                    self._db.execute("COMMIT")
+                    return False
+                self._db.execute(
+                    "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)",
+                    (self.name, owner, now + ttl)
+                )
+                self._db.execute("COMMIT")
+                return True
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def release(self, owner):
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (self.name, owner))
+
+
+LEASE_BACKENDS = {
+    "file": FileLease,
+    "sqlite": SqliteLease,
+}
+
+
+def create_lease(backend, path):
+    """
+    Creates the configured lease backend.
+
+    Args:
+        backend (str): A key of `LEASE_BACKENDS`.
+        path (str): The shared file of the lease.
+
+    Returns:
+        Lease: The backend.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend not in LEASE_BACKENDS:
+        raise ValueError(f"Unbekanntes LEADER_BACKEND '{backend}' (möglich: {', '.join(LEASE_BACKENDS)})")
+    return LEASE_BACKENDS[backend](path)
+
+
+class LeaderElector:
+    """
+    Acquires and keeps a lease on behalf of this process.
+    """
+
+    def __init__(self, lease, owner=None, ttl=DEFAULT_TTL, call=None):
+        """
+        Args:
+            lease (Lease): The backend.
+            owner (str, optional): The ID of this process; generated if omitted.
+            ttl (float): Seconds the lease stays valid without renewal. It is renewed every
+                third of that; standbys retry every sixth.
+            call (Callable[..., Awaitable], optional): Runs a blocking function off the event
+                loop, e.g. `Runtime.call`; defaults to the loop's default executor.
+        """
+        self.lease = lease
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self.call = call or _run_in_executor
+        self.is_leader = False
+
+    async def acquire(self):
+        """
+        Waits until this process holds the lease.
+        """
+        while not await self._try():
+            await asyncio.sleep(self.ttl / 6)
+        self.is_leader = True
+        print(f"👑 Leader-Lease übernommen ({self.owner}).")
+
+    async def hold(self):
+        """
+        Renews the lease until it is lost; returns then. A renewal that fails with an error
+        is retried, but after a whole TTL without renewal the lease counts as lost.
+        """
+        renewed = time.monotonic()
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                renewal = self.call(self.lease.acquire, self.owner, self.ttl)
+                if not await asyncio.wait_for(renewal, self.ttl / 3):
+                    break
+                renewed = time.monotonic()
+            except Exception as e:
+                print(f"⚠️ Leader-Lease konnte nicht erneuert werden: {e!r}")
+                if time.monotonic() - renewed >= self.ttl:
+                    break
+        self.is_leader = False
+        print("⚠️ Leader-Lease verloren, wechsle in den Standby.")
+
+    async def release(self):
+        """
+        Gives the lease up, so a standby takes over without waiting for it to expire.
+        """
+        if self.is_leader:
+            self.is_leader = False
+            await self.call(self.lease.release, self.owner)
+
+    async def _try(self):
+        try:
+            return await self.call(self.lease.acquire, self.owner, self.ttl)
+        except Exception as e:
+            print(f"⚠️ Leader-Lease nicht erreichbar: {e!r}")
+            return False
+
+
+async def _run_in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
@@ -0,0 +1,114 @@
+"""
+message_cursor.py
+
+A persisted read position in a Twilio conversation.
+
+The cursor remembers the index of the last processed message and the SIDs of the most
+recent ones, so polling only has to look at messages newer than the cursor and a
+restart does not replay commands that were already answered.
+"""
+
+import json
+import os
+from collections import deque
+
+# Number of processed message SIDs remembered for deduplication
+RECENT_SIDS = 200
+
+
+class MessageCursor:
+    """
+    The position of the last processed message in a conversation.
+
+    Attributes:
+        conversation_sid (str or None): The conversation the cursor belongs to.
+        last_index (int or None): Index of the last processed message, None before the first poll.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The JSON file the cursor is persisted in.
+        """
+        self.path = path
+        self.conversation_sid = None
+        self.last_index = None
+        self._recent = deque(maxlen=RECENT_SIDS)
+        self._recent_set = set()
+        self._load()
+
+    def reset(self, conversation_sid):
+        """
+        Starts over for another conversation, discarding the stored position.
+
+        Args:
+            conversation_sid (str): The conversation to track.
+        """
+        self.conversation_sid = conversation_sid
+        self.last_index = None
+        self._recent.clear()
+        self._recent_set.clear()
+
+    def seen(self, sid):
+        """
+        Returns whether a message SID is among the recently processed ones.
+
+        Args:
+            sid (str): The message SID.
+
+        Returns:
+            bool: True if the message was already processed.
+        """
+        return sid in self._recent_set
+
+    def is_new(self, message):
+        """
+        Returns whether a message lies behind the cursor and has not been processed yet.
+
+        Args:
+            message: A Twilio conversation message instance.
+
+        Returns:
+            bool: True if the message still has to be processed.
+        """
+        if self.seen(message.sid):
+            return False
+        return self.last_index is None or message.index > self.last_index
+
+    def advance(self, message):
+        """
+        Moves the cursor past a message and persists it.
+
+        Args:
+            message: The processed Twilio conversation message instance.
+        """
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_set.discard(self._recent[0])
+        self._recent.append(message.sid)
+        self._recent_set.add(message.sid)
+        if self.last_index is None or message.index > self.last_index:
+            self.last_index = message.index
+        self.save()
+
+    def save(self):
+        """
+        Writes the cursor atomically to its file.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "conversation_sid": self.conversation_sid,
+                "last_index": self.last_index,
+                "recent_sids": list(self._recent),
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            data = json.load(f)
+        self.conversation_sid = data.get("conversation_sid")
+        self.last_index = data.get("last_index")
+        self._recent.extend(data.get("recent_sids", []))
+        self._recent_set.update(self._recent)
@@ -0,0 +1,236 @@
+"""
+outbox.py
+
+Asynchronous delivery of outgoing messages.
+
+Messages are put on a bounded queue and sent by a single worker thread, so callers
+return as soon as their message is enqueued. The worker respects a token-bucket rate
+limit, retries transient failures with exponential backoff and jitter, and uses an
+idempotency key per message so a retry never sends the same message twice.
+"""
+
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+import requests
+from twilio.base.exceptions import TwilioRestException
+
+# Number of recent send latencies kept for the percentiles
+LATENCY_WINDOW = 1000
+# Seconds `enqueue` waits for room before it drops a message
+ENQUEUE_TIMEOUT_SECONDS = 5
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter: `rate` tokens per second, up to `burst` at once.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def acquire(self):
+        """
+        Takes one token, sleeping until one is available.
+        """
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            time.sleep((1 - self._tokens) / self.rate)
+
+
+class OutgoingMessage:
+    """
+    A queued message together with its recipient and idempotency key.
+    """
+
+    __slots__ = ("text", "recipient", "key", "enqueued_at")
+
+    def __init__(self, text, recipient=None, key=None):
+        self.text = text
+        self.recipient = recipient
+        self.key = key or uuid.uuid4().hex
+        self.enqueued_at = time.monotonic()
+
+
+def is_retryable(error):
+    """
+    Returns whether a failed send may succeed when retried.
+
+    Args:
+        error (Exception): The error raised by the delivery function.
+
+    Returns:
+        bool: True for rate limiting (429), server errors and network problems.
+    """
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def is_ambiguous(error):
+    """
+    Returns whether the message may have been delivered despite the error.
+
+    A 429 is rejected before processing, while a timeout or server error can happen
+    after the message was already created.
+    """
+    return not (isinstance(error, TwilioRestException) and error.status == 429)
+
+
+class Outbox:
+    """
+    A bounded queue of outgoing messages drained by one sender thread.
+    """
+
+    def __init__(self, deliver, is_delivered=None, maxsize=100, rate=1.0, burst=5,
+                 max_attempts=5, base_delay=1.0, max_delay=60.0):
+        """
+        Args:
+            deliver (Callable[[str, str, Any], None]): Sends a text with its idempotency key
+                to a recipient (None for the default recipient).
+            is_delivered (Callable[[str, Any], bool], optional): Checks whether a message with the
+                given key was already delivered to the recipient, used before retrying after an
+                ambiguous error.
+            maxsize (int): Capacity of the queue.
+            rate (float): Sustained messages per second.
+            burst (int): Messages that may be sent back to back.
+            max_attempts (int): Attempts per message before it is given up.
+            base_delay (float): Backoff before the first retry in seconds.
+            max_delay (float): Upper bound for the backoff in seconds.
+        """
+        self.deliver = deliver
+        self.is_delivered = is_delivered
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._bucket = TokenBucket(rate, burst)
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counts = {"sent": 0, "failed": 0, "retries": 0}
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def enqueue(self, text, recipient=None, key=None, timeout=ENQUEUE_TIMEOUT_SECONDS):
+        """
+        Puts a message on the queue and returns immediately.
+
+        Args:
+            text (str): The message text.
+            recipient (optional): Passed through to the delivery function.
+            key (str, optional): Idempotency key; generated if omitted.
+            timeout (float or None): Seconds to wait if the queue is full; None waits until
+                there is room, so a producer is slowed down to the send rate instead of
+                losing messages.
+
+        Returns:
+            bool: True if the message was enqueued, False if the queue stayed full.
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put(OutgoingMessage(text, recipient, key), timeout=timeout)
+        except queue.Full:
+            print(f"❌ Warteschlange voll, Nachricht verworfen: {text}")
+            with self._lock:
+                self._counts["failed"] += 1
+            return False
+        return True
+
+    def join(self, timeout=None):
+        """
+        Blocks until every enqueued message was sent or given up.
+
+        Args:
+            timeout (float, optional): Gives up waiting after this many seconds.
+
+        Returns:
+            bool: True if the queue was drained, False if the timeout passed first.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def metrics(self):
+        """
+        Returns:
+            dict: Queue depth, send counters and latency percentiles (seconds, from enqueue to delivery).
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            counts = dict(self._counts)
+        return {
+            "queue_depth": self._queue.qsize(),
+            **counts,
+            "latency_p50": _percentile(latencies, 0.50),
+            "latency_p99": _percentile(latencies, 0.99),
+        }
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="outbox", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            try:
+                self._send(message)
+            finally:
+                self._queue.task_done()
+
+    def _send(self, message):
+        """
+        Delivers one message, retrying transient failures with backoff.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            self._bucket.acquire()
+            try:
+                self.deliver(message.text, message.key, message.recipient)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts:
+                    print(f"❌ Nachricht konnte nicht gesendet werden: {e}")
+                    with self._lock:
+                        self._counts["failed"] += 1
+                    return
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                print(f"⚠️ Senden fehlgeschlagen ({e}), neuer Versuch in {delay:.1f} s.")
+                with self._lock:
+                    self._counts["retries"] += 1
+                time.sleep(delay)
+                if is_ambiguous(e) and self.is_delivered is not None and self._check_delivered(message):
+                    break
+                continue
+            break
+
+        with self._lock:
+            self._counts["sent"] += 1
+            self._latencies.append(time.monotonic() - message.enqueued_at)
+
+    def _check_delivered(self, message):
+        try:
+            return self.is_delivered(message.key, message.recipient)
+        except Exception:
+            return False
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
@@ -0,0 +1,249 @@
+"""
+range_query.py
+
+Event queries for arbitrary date ranges, e.g. from "Termine am Freitag" or
+"nächste 14 Tage" (see `utils/date_parser.py`).
+
+All ranges go through one engine. Ranges from yesterday on are answered from the event
+store, which already holds every upcoming event, so they cost no API call. Older ranges
+are fetched once with `events.list` and kept as windows; a later query that overlaps
+them only fetches the days not covered yet. Rendered answers are cached by range and
+data version, so repeating a query costs a parse and a dictionary lookup.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from services.calendar_fetch import iter_events, run_per_calendar
+from services.event_store import FULL_SYNC_LOOKBACK
+from services.google_calendar import get_event_store, timezone
+from utils.date_parser import day_bounds, parse_date_range
+from utils.formatter import format_range
+
+# How long fetched past windows are reused before they are fetched again
+PAST_WINDOW_TTL = 60 * 60
+# Rendered answers kept for repeated queries
+RENDER_CACHE_SIZE = 128
+
+
+class Window:
+    """
+    Fetched events of all calendars for a time span before the event store's range.
+    """
+
+    __slots__ = ("start", "end", "events", "starts", "max_duration", "fetched_at")
+
+    def __init__(self, start, end, events, fetched_at):
+        self.start = start
+        self.end = end
+        self.events = events  # ordered by start time
+        self.starts = [event.start for event in events]
+        self.max_duration = max((event.end - event.start for event in events), default=timedelta(0))
+        self.fetched_at = fetched_at
+
+
+class RangeQueryEngine:
+    """
+    Answers event queries for any time range from the event store and cached windows.
+
+    Attributes:
+        stats (dict): Answered queries, answers served from the render cache and windows
+            fetched from the API ('queries', 'render_hits', 'fetches').
+    """
+
+    def __init__(self, store, tz):
+        """
+        Args:
+            store (EventStore): Answers the ranges it covers and provides the API client.
+            tz (pytz.tzinfo.BaseTzInfo): The local timezone.
+        """
+        self.store = store
+        self.tz = tz
+        self.stats = {"queries": 0, "render_hits": 0, "fetches": 0}
+        self._windows = []  # disjoint Windows ordered by start
+        self._generation = 0  # incremented whenever the windows change
+        self._rendered = OrderedDict()
+        self._lock = threading.Lock()
+
+    def events(self, start, end):
+        """
+        Returns the events overlapping [start, end), like `events.list` with timeMin/timeMax.
+
+        Args:
+            start (datetime): Events must end after this time.
+            end (datetime): Events must start before this time.
+
+        Returns:
+            list: Event objects ordered by start time.
+        """
+        covered_from = datetime.now(self.tz) - FULL_SYNC_LOOKBACK
+        if start >= covered_from:
+            return self.store.events_between(start, end)
+        past = self._past_events(start, min(end, covered_from))
+        if end <= covered_from:
+            return past
+        # Events running across the border are in both parts
+        seen = {(event.calendar_id, event.id) for event in past}
+        recent = [
+            event for event in self.store.events_between(covered_from, end)
+            if (event.calendar_id, event.id) not in seen
+        ]
+        return past + recent
+
+    def answer(self, text, locale=None):
+        """
+        Answers a message that names a date range.
+
+        Args:
+            text (str): The message, e.g. "Termine am Freitag".
+            locale (str, optional): Locale key, see `get_formatter`.
+
+        Returns:
+            str or None: The rendered events of the range, an explanation if the range is
+                invalid, or None if the text is no date expression.
+        """
+        now = datetime.now(self.tz)
+        try:
+            days = parse_date_range(text, now.date())
+        except ValueError as e:
+            return f"⚠️ {e}"
+        if days is None:
+            return None
+        start, end = day_bounds(*days, self.tz)
+        self.stats["queries"] += 1
+
+        # Syncing is a no-op while the store is fresh; afterwards its version tells
+        # whether a cached answer is still current
+        self.store.sync()
+        key = (start, end, self.store.version, self._generation, locale)
+        with self._lock:
+            message = self._rendered.get(key)
+            if message is not None:
+                self._rendered.move_to_end(key)
+                self.stats["render_hits"] += 1
+                return message
+
+        message = format_range(self.events(start, end), days[0], days[1], locale)
+        with self._lock:
+            # Fetching a past window changed the generation
+            self._rendered[(start, end, self.store.version, self._generation, locale)] = message
+            while len(self._rendered) > RENDER_CACHE_SIZE:
+                self._rendered.popitem(last=False)
+        return message
+
+    def _past_events(self, start, end):
+        """
+        Returns the events of a past range from the windows, fetching the uncovered parts.
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [window for window in self._windows if now - window.fetched_at >= PAST_WINDOW_TTL]
+            if expired:
+                self._windows = [window for window in self._windows if window not in expired]
+                self._generation += 1
+            gaps = self._gaps(start, end)
+
+        for gap_start, gap_end in gaps:
+            self._fetch(gap_start, gap_end)
+
+        with self._lock:
+            result = []
+            seen = set()
+            for window in self._windows:
+                if window.end <= start or window.start >= end:
+                    continue
+                # Events that started before the range may still be running
+                lo = bisect_left(window.starts, start - window.max_duration)
+                hi = bisect_left(window.starts, end)
+                for event in window.events[lo:hi]:
+                    key = (event.calendar_id, event.id)
+                    if event.end > start and key not in seen:
+                        seen.add(key)
+                        result.append(event)
+            result.sort(key=_start)
+            return result
+
+    def _gaps(self, start, end):
+        """
+        Returns the parts of [start, end) that no window covers.
+        """
+        gaps = []
+        cursor = start
+        for window in self._windows:
+            if window.end <= cursor:
+                continue
+            if window.start >= end:
+                break
+            if window.start > cursor:
+                gaps.append((cursor, window.start))
+            cursor = max(cursor, window.end)
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def _fetch(self, start, end):
+        """
+        Fetches one uncovered span and merges it into the windows. If a calendar fails,
+        the events are returned for this query but not kept.
+        """
+        client = self.store.client
+        cal_ids = client.calendar_ids()
+        query = {"timeMin": start.isoformat(), "timeMax": end.isoformat()}
+        results = run_per_calendar(cal_ids, lambda cal_id: list(iter_events(client, cal_id, self.tz, **query)))
+        events = sorted((event for events in results.values() for event in events), key=_start)
+        self.stats["fetches"] += 1
+        window = Window(start, end, events, time.monotonic())
+        if len(results) < len(cal_ids):
+            window.fetched_at -= PAST_WINDOW_TTL  # expires with the next query
+
+        with self._lock:
+            windows = sorted(self._windows + [window], key=_window_start)
+            # Join touching windows, so later queries find one contiguous window
+            merged = [windows[0]]
+            for window in windows[1:]:
+                last = merged[-1]
+                if window.start <= last.end:
+                    events = sorted(last.events + window.events, key=_start)
+                    merged[-1] = Window(
+                        last.start, max(last.end, window.end), events, min(last.fetched_at, window.fetched_at)
+                    )
+                else:
+                    merged.append(window)
+            self._windows = merged
+            self._generation += 1
+
+
+def _start(event):
+    return event.start
+
+
+def _window_start(window):
+    return window.start
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_range_engine():
+    """
+    Returns the shared range query engine on the shared event store, creating it on first use.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = RangeQueryEngine(get_event_store(), timezone)
+        return _engine
+
+
+def answer_date_query(text, locale=None):
+    """
+    Answers a message that names a date range, e.g. "nächste 14 Tage".
+
+    Returns:
+        str or None: The answer, or None if the text is no date expression.
+    """
+    return get_range_engine().answer(text, locale)
@@ -0,0 +1,227 @@
+"""
+runtime.py
+
+The bot's asyncio runtime.
+
+A single event loop runs the reminder scheduler, the message intake (polling or
+webhook) and the command handlers as tasks. The Google, Twilio and OpenWeather clients
+are blocking, so their calls run on one shared, bounded thread pool and are awaited
+with a timeout; their HTTP connections stay pooled per client as before. On SIGTERM
+or SIGINT the tasks are cancelled and queued replies are flushed before the process
+exits. With 'LEADER_BACKEND' set, several copies can run side by side and only the
+holder of the leader lease runs these tasks (see `services/leader.py`).
+"""
+
+import asyncio
+import functools
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from services.calendar_watch import serve_calendar_watch
+from services.google_calendar import build_reminder_scheduler, get_event_store
+from services.leader import LeaderElector, create_lease
+from services.message_cursor import MessageCursor
+from services.twilio_api import (
+    POLL_INTERVAL_SECONDS,
+    fetch_new_messages,
+    get_or_create_conversation,
+    handle_incoming_message,
+    outbox,
+    send_message
+)
+from services.webhook import serve_webhook
+from utils.metrics import serve_metrics
+from utils.settings import get_settings, watch_settings
+
+# Threads available for blocking API calls
+BLOCKING_WORKERS = 16
+# Default timeout for one blocking call; scheduler jobs may take longer (a digest built
+# from a slow calendar). Digest waves hand their batch to a pool and return at once.
+CALL_TIMEOUT_SECONDS = 30
+JOB_TIMEOUT_SECONDS = 600
+# How long queued replies may take to go out on shutdown
+SHUTDOWN_FLUSH_SECONDS = 10
+
+
+class Runtime:
+    """
+    Runs blocking calls off the event loop and keeps track of the bot's tasks.
+    """
+
+    def __init__(self, workers=BLOCKING_WORKERS, call_timeout=CALL_TIMEOUT_SECONDS):
+        """
+        Args:
+            workers (int): Size of the thread pool for blocking calls.
+            call_timeout (float): Default timeout of `call` in seconds.
+        """
+        self.call_timeout = call_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="io")
+        self._stopping = None
+        self._metrics_server = None
+        self._elector = None
+        self._scheduler = None
+
+    async def call(self, func, *args, timeout=None, **kwargs):
+        """
+        Runs a blocking function on the thread pool.
+
+        Args:
+            func (Callable): The blocking function.
+            *args: Positional arguments for `func`.
+            timeout (float, optional): Seconds to wait; defaults to `call_timeout`.
+            **kwargs: Keyword arguments for `func`.
+
+        Returns:
+            Any: The result of `func`.
+
+        Raises:
+            asyncio.TimeoutError: If `func` did not finish in time. The thread keeps running
+                until the underlying client gives up on its own socket timeout.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        return await asyncio.wait_for(future, timeout or self.call_timeout)
+
+    async def poll_messages(self):
+        """
+        Polls the conversation for new messages and answers them. The commands of one
+        author are answered one after another, so the replies arrive in the order of the
+        commands; different authors are answered concurrently (at most
+        'COMMAND_CONCURRENCY' at a time).
+        """
+        conversation_sid = await self.call(get_or_create_conversation)
+        settings = get_settings()
+        cursor = MessageCursor(settings.message_cursor_path)
+        if cursor.conversation_sid != conversation_sid:
+            cursor.reset(conversation_sid)
+        limit = asyncio.Semaphore(settings.command_concurrency)
+
+        async def handle(msg):
+            async with limit:
+                print(f"📥 Eingehend von {msg.author}: {msg.body}")
+                try:
+                    await self.call(handle_incoming_message, msg.body)
+                except Exception as e:
+                    print(f"❌ Nachricht {msg.sid} konnte nicht verarbeitet werden: {e!r}")
+
+        async def handle_in_order(author_messages):
+            for msg in author_messages:
+                await handle(msg)
+
+        while True:
+            try:
+                messages = await self.call(fetch_new_messages, conversation_sid, cursor)
+            except Exception as e:
+                print(f"⚠️ Nachrichten konnten nicht abgerufen werden: {e!r}")
+                messages = []
+            by_author = {}
+            for msg in messages:
+                if msg.author != "bot":
+                    by_author.setdefault(msg.author, []).append(msg)
+            await asyncio.gather(*(handle_in_order(author_messages) for author_messages in by_author.values()))
+            for msg in messages:
+                cursor.advance(msg)
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    async def run_bot(self):
+        """
+        Runs the reminder scheduler and the message intake until SIGTERM or SIGINT.
+
+        If 'METRICS_PORT' is set, `/metrics` is served on 'METRICS_HOST' (default 127.0.0.1).
+        If 'CALENDAR_WATCH_URL' is set, calendar changes are pushed by Google instead of
+        being polled (see `calendar_watch`).
+        If 'LEADER_BACKEND' is set, the tasks only run while this process holds the leader
+        lease; otherwise it waits as a standby.
+        """
+        loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self._stopping.set)
+            except NotImplementedError:
+                pass  # not supported on Windows; Ctrl+C still raises KeyboardInterrupt
+
+        watch_settings()
+        settings = get_settings()
+        if settings.metrics_port:
+            self._metrics_server = await serve_metrics(settings.metrics_host, settings.metrics_port)
+        if settings.leader_backend:
+            lease = await self.call(create_lease, settings.leader_backend, settings.leader_lease_path)
+            self._elector = LeaderElector(lease, ttl=settings.leader_lease_ttl, call=self.call)
+
+        stop = asyncio.create_task(self._stopping.wait())
+        try:
+            while not self._stopping.is_set():
+                if self._elector is not None:
+                    print("⏳ Standby, warte auf die Leader-Lease...")
+                    acquire = asyncio.create_task(self._elector.acquire())
+                    await asyncio.wait([stop, acquire], return_when=asyncio.FIRST_COMPLETED)
+                    if not acquire.done():
+                        acquire.cancel()
+                        break
+                await self.run_active(stop)
+                if self._elector is None:
+                    break
+        finally:
+            await self.shutdown([stop])
+
+    async def run_active(self, stop):
+        """
+        Runs the scheduler, the message intake and the optional calendar watch until
+        `stop` completes, a task fails or the leader lease is lost.
+
+        The scheduler is built on the first run and kept when the lease is lost, so it
+        resumes its plan when this process becomes leader again; durable jobs that the
+        other leader ran in between are skipped through the job journal.
+        """
+        settings = get_settings()
+        if self._scheduler is None:
+            self._scheduler = await self.call(build_reminder_scheduler, send_message)
+        scheduler = self._scheduler
+        run_job = functools.partial(self.call, timeout=JOB_TIMEOUT_SECONDS)
+        if settings.message_mode == "webhook":
+            intake = serve_webhook(call=self.call)
+        else:
+            intake = self.poll_messages()
+        tasks = [
+            asyncio.create_task(scheduler.run_async(run_job), name="scheduler"),
+            asyncio.create_task(intake, name="messages"),
+        ]
+        if settings.calendar_watch_url:
+            store = await self.call(get_event_store)
+            tasks.append(asyncio.create_task(serve_calendar_watch(store, scheduler, call=self.call), name="calendar watch"))
+        if self._elector is not None:
+            tasks.append(asyncio.create_task(self._elector.hold(), name="leader lease"))
+        print("💬 Warte auf eingehende Nachrichten...")
+
+        done, _ = await asyncio.wait([stop, *tasks], return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task is not stop and not task.cancelled() and task.exception():
+                print(f"❌ Task '{task.get_name()}' abgebrochen: {task.exception()!r}")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def shutdown(self, tasks):
+        """
+        Cancels the tasks, gives up the leader lease, flushes queued replies and releases
+        the thread pool.
+        """
+        print("🛑 Bot wird beendet...")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._elector is not None:
+            await self._elector.release()
+        if self._metrics_server is not None:
+            await self._metrics_server.stop()
+        if not await self.call(outbox.join, SHUTDOWN_FLUSH_SECONDS, timeout=SHUTDOWN_FLUSH_SECONDS + 1):
+            print(f"⚠️ {outbox.metrics()['queue_depth']} Nachrichten nicht mehr gesendet.")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        """
+        Asks `run_bot` to shut down; must be called on the event loop.
+        """
+        if self._stopping is not None:
+            self._stopping.set()
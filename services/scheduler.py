@@ -0,0 +1,525 @@
+"""
+scheduler.py
+
+A small heap-backed timer for the bot's recurring jobs (daily digest, weekly summary,
+one-shot alerts), plus batching of per-subscriber daily jobs. Instead of polling the
+clock, the scheduler sleeps until the earliest job is due, so it uses practically no
+CPU while idle. Jobs run on the thread that calls `Scheduler.run`, or off the event
+loop when driven by `Scheduler.run_async`; `BatchScheduler` hands its batches to a
+worker pool.
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import pytz
+
+from services.job_journal import DELIVERED, FAILED
+from utils.metrics import JOB_LAG
+
+# Upper bound for a single sleep, so wall clock jumps (NTP, suspend) are picked up
+MAX_SLEEP_SECONDS = 300
+
+
+def localize(tz, naive):
+    """
+    Attaches a timezone to a naive local time, resolving DST transitions.
+
+    A time that falls into the spring-forward gap is moved behind the gap, and a time
+    that occurs twice when the clocks fall back resolves to its first occurrence.
+
+    Args:
+        tz (pytz.tzinfo.BaseTzInfo): The timezone of the wall clock time.
+        naive (datetime): The naive local time.
+
+    Returns:
+        datetime: The tz-aware time.
+    """
+    try:
+        return tz.localize(naive, is_dst=None)
+    except pytz.AmbiguousTimeError:
+        return tz.localize(naive, is_dst=True)
+    except pytz.NonExistentTimeError:
+        return tz.normalize(tz.localize(naive, is_dst=False))
+
+
+def next_occurrence(now, at, tz, weekday=None):
+    """
+    Computes the next occurrence of a wall clock time after `now`.
+
+    Args:
+        now (datetime): The tz-aware reference time.
+        at (datetime.time): The time of day in local wall clock time.
+        tz (pytz.tzinfo.BaseTzInfo): The timezone the time of day refers to.
+        weekday (int, optional): Restricts occurrences to one weekday (0 = Monday).
+
+    Returns:
+        datetime: The next tz-aware fire time strictly after `now`.
+    """
+    day = now.astimezone(tz).date()
+    while True:
+        if weekday is None or day.weekday() == weekday:
+            candidate = localize(tz, datetime.combine(day, at))
+            if candidate > now:
+                return candidate
+        day += timedelta(days=1)
+
+
+def run_once(journal, name, due, callback):
+    """
+    Runs a durable run: it is claimed in the journal first and skipped if it already
+    ran, e.g. before a restart, and its outcome is recorded.
+
+    Args:
+        journal (JobJournal or None): The journal; without one, `callback` just runs.
+        name (str): The stable job name.
+        due (datetime): The due time of the run.
+        callback (Callable[[], None]): Sends the run.
+    """
+    if journal is not None and not journal.claim(name, due):
+        print(f"⏭️ Job '{name}' ({due.isoformat()}) lief bereits.")
+        return
+    try:
+        callback()
+    except Exception:
+        if journal is not None:
+            journal.finish(name, due, FAILED)
+        raise
+    if journal is not None:
+        journal.finish(name, due, DELIVERED)
+
+
+class Job:
+    """
+    A scheduled callback together with the rule for its next fire time.
+    """
+
+    __slots__ = ("name", "callback", "next_run", "_reschedule", "cancelled", "durable")
+
+    def __init__(self, name, callback, next_run, reschedule=None, durable=False):
+        self.name = name
+        self.callback = callback
+        self.next_run = next_run
+        self._reschedule = reschedule
+        self.cancelled = False
+        self.durable = durable
+
+    def __repr__(self):
+        return f"Job({self.name!r}, next_run={self.next_run.isoformat()})"
+
+
+class Scheduler:
+    """
+    Runs jobs at their fire times, keeping pending jobs in a heap ordered by due time.
+
+    Jobs can be added and cancelled from any thread; the sleeping scheduler is woken up
+    so a new earliest job is never missed. Runs of durable jobs are recorded in a
+    `JobJournal`, so they run at most once and can be caught up after a restart.
+    """
+
+    def __init__(self, tz, journal=None):
+        """
+        Args:
+            tz (pytz.tzinfo.BaseTzInfo): The timezone of the job times.
+            journal (JobJournal, optional): Records the runs of durable jobs.
+        """
+        self.tz = tz
+        self.journal = journal
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._notify_async = None
+        self._running = False
+
+    def every_day(self, at, callback, name=None, durable=False):
+        """
+        Schedules `callback` daily at the given local time of day.
+
+        Args:
+            durable (bool): Record the runs in the journal; the name must then be stable
+                across restarts.
+
+        Returns:
+            Job: The scheduled job.
+        """
+        def reschedule(after):
+            return next_occurrence(after, at, self.tz)
+
+        return self._push(Job(name or f"daily {at:%H:%M}", callback, reschedule(self._now()), reschedule, durable))
+
+    def every_week(self, weekday, at, callback, name=None, durable=False):
+        """
+        Schedules `callback` weekly on `weekday` (0 = Monday) at the given local time of day.
+
+        Args:
+            durable (bool): Record the runs in the journal, see `every_day`.
+
+        Returns:
+            Job: The scheduled job.
+        """
+        def reschedule(after):
+            return next_occurrence(after, at, self.tz, weekday=weekday)
+
+        return self._push(Job(
+            name or f"weekly {weekday} {at:%H:%M}", callback, reschedule(self._now()), reschedule, durable
+        ))
+
+    def run_at(self, when, callback, name=None):
+        """
+        Schedules `callback` once at the tz-aware time `when`.
+
+        Returns:
+            Job: The scheduled job.
+        """
+        return self._push(Job(name or f"once {when.isoformat()}", callback, when))
+
+    def cancel(self, job):
+        """
+        Cancels a job. It is dropped lazily when it reaches the top of the heap.
+        """
+        job.cancelled = True
+        if job.durable and self.journal is not None:
+            self.journal.unplan(job.name, job.next_run)
+        self._notify()
+
+    def catch_up(self, grace):
+        """
+        Runs the durable jobs' runs that were due while the bot was down, if they are at
+        most `grace` late. Call it once after planning the jobs; a missed run is caught up
+        with the callback of the pending job of the same name.
+
+        Args:
+            grace (timedelta): How late a run may still be caught up.
+
+        Returns:
+            list: The catch-up jobs, due immediately.
+        """
+        if self.journal is None:
+            return []
+        with self._lock:
+            callbacks = {job.name: job.callback for _, _, job in self._heap if job.durable and not job.cancelled}
+        jobs = []
+        for name, due in self.journal.recover(self._now(), grace):
+            if name not in callbacks:
+                continue
+            print(f"🔁 Hole Job '{name}' von {due.astimezone(self.tz).isoformat()} nach.")
+            jobs.append(self._push(Job(name, callbacks[name], due.astimezone(self.tz), durable=True)))
+        return jobs
+
+    def next_run(self):
+        """
+        Returns:
+            datetime or None: The fire time of the earliest pending job.
+        """
+        with self._lock:
+            self._drop_cancelled()
+            return self._heap[0][2].next_run if self._heap else None
+
+    def run(self):
+        """
+        Runs due jobs until `stop` is called, sleeping in between.
+        """
+        self._running = True
+        while self._running:
+            self._wakeup.clear()
+            job = self._pop_due()
+            if job is None:
+                continue
+            JOB_LAG.observe(max(0.0, time.time() - job.next_run.timestamp()))
+            try:
+                self._execute(job)
+            except Exception as e:
+                print(f"❌ Job '{job.name}' fehlgeschlagen: {e}")
+            if job._reschedule is not None and not job.cancelled:
+                job.next_run = job._reschedule(max(job.next_run, self._now()))
+                self._push(job)
+
+    async def run_async(self, call):
+        """
+        Runs due jobs as part of an asyncio event loop until `stop` is called or the task is cancelled.
+
+        Args:
+            call (Callable[..., Awaitable]): Runs a blocking callback off the event loop,
+                e.g. `Runtime.call`.
+        """
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        self._notify_async = lambda: loop.call_soon_threadsafe(wakeup.set)
+        self._running = True
+        try:
+            while self._running:
+                wakeup.clear()
+                with self._lock:
+                    self._drop_cancelled()
+                    delay = self._heap[0][0] - time.time() if self._heap else MAX_SLEEP_SECONDS
+                    job = heapq.heappop(self._heap)[2] if delay <= 0 else None
+                if job is None:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), min(delay, MAX_SLEEP_SECONDS))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                JOB_LAG.observe(max(0.0, time.time() - job.next_run.timestamp()))
+                try:
+                    await call(self._execute, job)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"❌ Job '{job.name}' fehlgeschlagen: {e}")
+                if job._reschedule is not None and not job.cancelled:
+                    job.next_run = job._reschedule(max(job.next_run, self._now()))
+                    self._push(job)
+        finally:
+            self._notify_async = None
+
+    def stop(self):
+        """
+        Stops the run loop after the current job.
+        """
+        self._running = False
+        self._notify()
+
+    def _now(self):
+        return datetime.now(self.tz)
+
+    def _push(self, job):
+        if job.durable and self.journal is not None:
+            self.journal.plan(job.name, job.next_run)
+        with self._lock:
+            heapq.heappush(self._heap, (job.next_run.timestamp(), next(self._counter), job))
+        self._notify()
+        return job
+
+    def _execute(self, job):
+        """
+        Runs a job's callback; a durable run is claimed in the journal first and skipped
+        if it already ran, e.g. before a restart.
+        """
+        run_once(self.journal if job.durable else None, job.name, job.next_run, job.callback)
+
+    def _notify(self):
+        """
+        Wakes up the run loop, whether it runs on a thread or on an event loop.
+        """
+        self._wakeup.set()
+        notify_async = self._notify_async
+        if notify_async is not None:
+            try:
+                notify_async()
+            except RuntimeError:
+                pass  # event loop already closed
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+
+    def _pop_due(self):
+        """
+        Pops the earliest job if it is due, otherwise sleeps until it is (or until woken).
+        """
+        with self._lock:
+            self._drop_cancelled()
+            delay = self._heap[0][0] - time.time() if self._heap else MAX_SLEEP_SECONDS
+            if delay <= 0:
+                return heapq.heappop(self._heap)[2]
+        self._wakeup.wait(min(delay, MAX_SLEEP_SECONDS))
+        return None
+
+
+class BatchScheduler:
+    """
+    Fires a daily job for many items, grouped into batches by fire time.
+
+    Every item has its own time of day and timezone. Items whose next occurrence falls
+    on the same instant share one scheduler job, and a wakeup hands the whole batch to
+    a worker pool instead of running one timer per item. The scheduler job returns as
+    soon as the batch is handed over, so a long batch neither blocks the other jobs nor
+    runs into a job timeout.
+
+    With `name` and a journal on the scheduler, every item's runs are recorded like
+    those of durable jobs: each runs at most once, and `catch_up` sends the runs missed
+    while the bot was down.
+    """
+
+    def __init__(self, scheduler, handler, workers=16, prepare=None, name=None):
+        """
+        Args:
+            scheduler (Scheduler): The scheduler that runs the batch jobs.
+            handler (Callable[[Any], None]): Called once per item when its time is due.
+            workers (int): Size of the worker pool a batch is processed with.
+            prepare (Callable[[list], None], optional): Called with the items of a due batch
+                before they are handled, e.g. to load data they share.
+            name (Callable[[Any], str], optional): The stable journal name of an item's runs.
+        """
+        self.scheduler = scheduler
+        self.handler = handler
+        self.prepare = prepare
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        self._buckets = {}  # fire timestamp -> [(item, time of day, timezone)]
+        self._items = {}  # journal name -> item, for catch_up
+        self._pending = set()  # futures of handed-out items
+        self._lock = threading.Lock()
+
+    @property
+    def journal(self):
+        """
+        Returns:
+            JobJournal or None: The journal the items' runs are recorded in, if they are named.
+        """
+        return self.scheduler.journal if self.name is not None else None
+
+    def add(self, item, at, tz):
+        """
+        Plans an item for its next daily occurrence.
+
+        Args:
+            item: The item passed to the handler.
+            at (datetime.time): The local time of day.
+            tz (pytz.tzinfo.BaseTzInfo): The timezone of the item.
+        """
+        self.add_all([(item, at, tz)])
+
+    def add_all(self, entries):
+        """
+        Plans many items at once; their runs are recorded in the journal in one transaction.
+
+        Args:
+            entries (Iterable[tuple]): (item, time of day, timezone) triples, see `add`.
+        """
+        entries = list(entries)
+        if self.name is not None:
+            with self._lock:
+                for item, _, _ in entries:
+                    self._items[self.name(item)] = item
+        self._plan(entries, datetime.now(pytz.utc))
+
+    def bucket_sizes(self):
+        """
+        Returns:
+            dict: Number of planned items per fire time.
+        """
+        with self._lock:
+            return {
+                datetime.fromtimestamp(key, pytz.utc): len(batch)
+                for key, batch in self._buckets.items()
+            }
+
+    def set_workers(self, workers):
+        """
+        Resizes the worker pool. Items already handed out finish on the old pool.
+        """
+        with self._lock:
+            old, self._executor = self._executor, ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        old.shutdown(wait=False)
+
+    def catch_up(self, grace):
+        """
+        Sends the items' runs that were due while the bot was down, if they are at most
+        `grace` late. Call it once after adding the items.
+
+        Args:
+            grace (timedelta): How late a run may still be caught up.
+
+        Returns:
+            int: The number of runs caught up.
+        """
+        journal = self.journal
+        if journal is None:
+            return 0
+        with self._lock:
+            items = dict(self._items)
+        missed = {}
+        for name, due in journal.recover(datetime.now(pytz.utc), grace):
+            if name in items:
+                missed.setdefault(due, []).append(items[name])
+        for due, batch in sorted(missed.items()):
+            print(f"🔁 Hole {len(batch)} Jobs von {due.isoformat()} nach.")
+            self.scheduler.run_at(
+                datetime.now(pytz.utc), lambda due=due, batch=batch: self._dispatch(batch, due),
+                name=f"batch catch-up {due.isoformat()}"
+            )
+        return sum(len(batch) for batch in missed.values())
+
+    def join(self, timeout=None):
+        """
+        Waits until the handed-out items are processed.
+
+        Returns:
+            bool: False if some were still running after `timeout` seconds.
+        """
+        with self._lock:
+            pending = list(self._pending)
+        _, not_done = wait(pending, timeout)
+        return not not_done
+
+    def _plan(self, entries, after):
+        runs = []
+        with self._lock:
+            for item, at, tz in entries:
+                when = next_occurrence(after, at, tz)
+                key = when.timestamp()
+                batch = self._buckets.get(key)
+                if batch is None:
+                    batch = self._buckets[key] = []
+                    self.scheduler.run_at(
+                        when, lambda key=key, when=when: self._fire(key, when), name=f"batch {when.isoformat()}"
+                    )
+                batch.append((item, at, tz))
+                if self.name is not None:
+                    runs.append((self.name(item), when))
+        journal = self.journal
+        if journal is not None and runs:
+            journal.plan_many(runs)
+
+    def _fire(self, key, when):
+        """
+        Hands a due batch to the worker pool and plans each item's next occurrence.
+        """
+        with self._lock:
+            batch = self._buckets.pop(key, [])
+        self._plan(batch, when)
+        self._dispatch([item for item, _, _ in batch], when)
+
+    def _dispatch(self, items, when):
+        """
+        Prepares the items of a batch and submits them to the worker pool; the batch is
+        reported once its last item is done.
+        """
+        started = time.monotonic()
+        if self.prepare is not None:
+            try:
+                self.prepare(items)
+            except Exception as e:
+                print(f"⚠️ Vorbereitung der Jobs fehlgeschlagen: {e}")
+        remaining = len(items)
+
+        def done(future):
+            nonlocal remaining
+            if future.exception() is not None:
+                print(f"❌ Job fehlgeschlagen: {future.exception()}")
+            with self._lock:
+                self._pending.discard(future)
+                remaining -= 1
+                last = remaining == 0
+            if last:
+                print(f"⏰ {len(items)} Jobs in {time.monotonic() - started:.2f} s verarbeitet.")
+
+        with self._lock:
+            executor = self._executor
+            futures = [executor.submit(self._run, item, when) for item in items]
+            self._pending.update(futures)
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _run(self, item, when):
+        if self.name is None:
+            self.handler(item)
+        else:
+            run_once(self.journal, self.name(item), when, lambda: self.handler(item))
@@ -0,0 +1,87 @@
+"""
+subscribers.py
+
+Subscribers of the daily digest when one process serves many users.
+
+Each subscriber has their own Google credentials, conversation, reminder time,
+timezone and city. Subscribers are read from the JSON file configured in
+'SUBSCRIBERS_PATH', a list of objects like:
+
+    {"id": "anna", "conversation_sid": "CH...", "token_path": "tokens/anna.pkl",
+     "reminder_time": "07:30", "timezone": "Europe/Berlin", "city": "Hamburg"}
+
+The tokens must be created beforehand (e.g. by running the bot once with 'token.pkl'
+pointing to them): digests are sent unattended, so a subscriber without a valid token
+is skipped instead of opening the browser flow.
+"""
+
+import json
+import os
+import threading
+
+import pytz
+
+from services.calendar_client import CalendarClient
+from services.event_store import EventStore
+from utils.settings import get_settings
+from utils.time_parse import parse_time_of_day
+
+
+class Subscriber:
+    """
+    One user of the bot together with their lazily created calendar store.
+    """
+
+    def __init__(self, id, conversation_sid, token_path, reminder_time="08:00",
+                 timezone="Europe/Berlin", city="Berlin", secrets_path="credentials.json"):
+        self.id = id
+        self.conversation_sid = conversation_sid
+        self.token_path = token_path
+        self.secrets_path = secrets_path
+        self.reminder_time = parse_time_of_day(reminder_time)
+        self.tz = pytz.timezone(timezone)
+        self.city = city
+        self._store = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    def event_store(self):
+        """
+        Returns:
+            EventStore: The subscriber's own event store, created on first use. Its client
+                raises `AuthorizationRequired` if the subscriber has no valid token.
+        """
+        with self._lock:
+            if self._store is None:
+                self._client = CalendarClient(token_path=self.token_path, secrets_path=self.secrets_path, interactive=False)
+                self._store = EventStore(self.tz, client=self._client, path="")
+            return self._store
+
+    def close_connections(self):
+        """
+        Closes the connections of the subscriber's own client until the next digest.
+        """
+        with self._lock:
+            client = self._client
+        if client is not None:
+            client.close_connections()
+
+    def __repr__(self):
+        return f"Subscriber({self.id!r})"
+
+
+def load_subscribers(path=None):
+    """
+    Loads the subscribers from the JSON file configured in 'SUBSCRIBERS_PATH'.
+
+    Args:
+        path (str, optional): Overrides the configured path.
+
+    Returns:
+        list: Subscriber objects, or an empty list if no file is configured.
+    """
+    path = path or get_settings().subscribers_path
+    if not path or not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [Subscriber(**entry) for entry in json.load(f)]
@@ -1,63 +1,109 @@
+import json
 import os
+import threading
 import time
 from datetime import datetime, timezone
 
-from dotenv import load_dotenv
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
 from twilio.rest import Client
 from utils.formatter import (
     format_today,
     format_tomorrow,
     format_week,
-    format_next_event
+    format_next_event,
+    format_free_slots,
+    format_conflicts,
+    split_message
 )
 
 from services.google_calendar import (
     get_events_for_today,
     get_events_for_tomorrow,
     get_events_for_the_week,
-    get_next_event
+    get_next_event,
+    get_free_slots_for_today,
+    get_conflicts_for_the_week
 )
+from services.range_query import answer_date_query
+from services.outbox import Outbox
+from utils.metrics import COMMAND_LATENCY, COMMANDS_HANDLED, REGISTRY, ApiCall
+from utils.settings import get_settings
+from utils.tracing import span, trace
 
-# Load .env file
-load_dotenv()
+# Configuration snapshot; the credentials are read once when the client is created
+_settings = get_settings()
 
 # Timestamp when the bot was started (timezone-aware)
 BOT_START_TIME = datetime.now(timezone.utc)
 
 # Environment variables
-ACCOUNT_SID = os.getenv("ACCOUNT_SID")
-API_KEY_SID = os.getenv("API_KEY_SID")
-API_KEY_SECRET = os.getenv("API_KEY_SECRET")
-CHAT_SERVICE_SID = os.getenv("CHAT_SERVICE_SID")
-MY_NUMBER = os.getenv("MY_PHONE_NUMBER")
-TWILIO_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER")
+ACCOUNT_SID = _settings.account_sid
+API_KEY_SID = _settings.api_key_sid
+API_KEY_SECRET = _settings.api_key_secret
+CHAT_SERVICE_SID = _settings.chat_service_sid
+MY_NUMBER = _settings.my_phone_number
+TWILIO_NUMBER = _settings.twilio_whatsapp_number
 
 # Create Twilio client
-client = Client(API_KEY_SID, API_KEY_SECRET, ACCOUNT_SID)
+TWILIO_TIMEOUT_SECONDS = 10
+client = Client(API_KEY_SID, API_KEY_SECRET, ACCOUNT_SID, http_client=TwilioHttpClient(timeout=TWILIO_TIMEOUT_SECONDS))
+
+# Number of latest messages searched when checking whether a retried message went out
+DELIVERY_CHECK_LIMIT = 10
+
+# Where the resolved conversation SID is stored
+CONVERSATION_SID_PATH = _settings.conversation_sid_path
+_conversation_sid = None
+_conversation_lock = threading.Lock()
+
+# Longest WhatsApp message body; longer replies are sent in several parts
+MESSAGE_LIMIT = 1600
+
+# Seconds between two polls and messages requested per page
+POLL_INTERVAL_SECONDS = 5
+POLL_PAGE_SIZE = 20
 
 MENU_TEXT = (
     "📋 *MorningSync Menü*\n\n"
     "1️⃣ Heutige Termine\n"
     "2️⃣ Termine für morgen\n"
     "3️⃣ Termine für die Woche\n"
-    "4️⃣ Nächster Termin\n\n"
-    "Bitte wähle eine Option durch Senden der Zahl 1–4."
+    "4️⃣ Nächster Termin\n"
+    "5️⃣ Freie Zeiten heute\n"
+    "6️⃣ Überschneidungen diese Woche\n\n"
+    "Bitte wähle eine Option durch Senden der Zahl 1–6 "
+    "oder frag nach einem Zeitraum, z. B. „Termine am Freitag“ oder „nächste 14 Tage“."
 )
 
 
-# Create or reuse a conversation
-def get_or_create_conversation():
+def _load_conversation_sid():
     """
-    Creates a new Twilio conversation or reuses an existing one.
-    Sends the menu only if a new conversation is created.
+    Reads the persisted conversation SID, if there is one.
+    """
+    if not os.path.exists(CONVERSATION_SID_PATH):
+        return None
+    with open(CONVERSATION_SID_PATH) as f:
+        return f.read().strip() or None
+
+
+def _save_conversation_sid(conversation_sid):
+    with open(CONVERSATION_SID_PATH, "w") as f:
+        f.write(conversation_sid)
+
+
+def _find_or_create_conversation():
+    """
+    Looks up the "HackathonChat" conversation via the API and creates it if it does not exist.
 
     Returns:
-        str: The SID of the conversation.
+        tuple: The SID of the conversation and whether it was newly created.
     """
-    conversations = client.conversations.v1.services(CHAT_SERVICE_SID).conversations.list(limit=20)
+    with ApiCall("twilio", "conversations.list"):
+        conversations = client.conversations.v1.services(CHAT_SERVICE_SID).conversations.list(limit=20)
     for conv in conversations:
         if conv.friendly_name == "HackathonChat":
-            return conv.sid  # Bestehende Konversation -> kein Menü senden
+            return conv.sid, False  # Bestehende Konversation -> kein Menü senden
 
     # Neue Konversation erstellen
     conv = client.conversations.v1 \
@@ -73,88 +119,247 @@ def get_or_create_conversation():
         messaging_binding_address=MY_NUMBER,
         messaging_binding_proxy_address=TWILIO_NUMBER
     )
+    return conv.sid, True
 
-    # Send menu only for new conversation
-    send_message(MENU_TEXT)
-    return conv.sid
 
+# Create or reuse a conversation
+def get_or_create_conversation():
+    """
+    Creates a new Twilio conversation or reuses an existing one.
+    Sends the menu only if a new conversation is created.
 
-# Send message
-def send_message(text):
+    The SID is resolved once and persisted in 'CONVERSATION_SID_PATH'; afterwards it is
+    returned without any API call. Resolution is guarded by a lock, so concurrent callers
+    cannot create duplicate conversations.
+
+    Returns:
+        str: The SID of the conversation.
+    """
+    global _conversation_sid
+
+    with _conversation_lock:
+        if _conversation_sid is None:
+            _conversation_sid = _load_conversation_sid()
+        if _conversation_sid is not None:
+            return _conversation_sid
+
+        conversation_sid, created = _find_or_create_conversation()
+        _save_conversation_sid(conversation_sid)
+        _conversation_sid = conversation_sid
+
+    if created:
+        # Send menu only for new conversation, ahead of any queued message
+        deliver_message(MENU_TEXT)
+    return conversation_sid
+
+
+def invalidate_conversation(conversation_sid):
+    """
+    Forgets a cached conversation SID that turned out to be invalid.
+
+    Args:
+        conversation_sid (str): The SID that failed; a newer cached SID is kept.
     """
-    Sends a message via Twilio Conversations API.
+    global _conversation_sid
+
+    with _conversation_lock:
+        if _conversation_sid == conversation_sid:
+            _conversation_sid = None
+            if os.path.exists(CONVERSATION_SID_PATH):
+                os.remove(CONVERSATION_SID_PATH)
+
+
+def _create_message(conversation_sid, text, key=None):
+    extra = {"attributes": json.dumps({"idempotency_key": key})} if key else {}
+    with ApiCall("twilio", "messages.create"):
+        client.conversations.v1 \
+            .services(CHAT_SERVICE_SID) \
+            .conversations(conversation_sid) \
+            .messages \
+            .create(
+            author="bot",
+            body=text,
+            **extra
+        )
+
+
+def deliver_message(text, key=None, conversation_sid=None):
+    """
+    Sends a message via Twilio Conversations API right away.
+
+    If the cached conversation no longer exists (404), the conversation is resolved
+    again and the message is sent once more.
 
     Args:
         text (str): The message text to send.
+        key (str, optional): Idempotency key stored in the message attributes.
+        conversation_sid (str, optional): Target conversation; defaults to the bot's own conversation.
     """
+    if conversation_sid is not None:
+        _create_message(conversation_sid, text, key)
+        print(f"✅ Nachricht an {conversation_sid} gesendet.")
+        return
+
     conversation_sid = get_or_create_conversation()
-    client.conversations.v1 \
-        .services(CHAT_SERVICE_SID) \
-        .conversations(conversation_sid) \
-        .messages \
-        .create(
-        author="bot",
-        body=text
-    )
+    try:
+        _create_message(conversation_sid, text, key)
+    except TwilioRestException as e:
+        if e.status != 404:
+            raise
+        print(f"⚠️ Konversation {conversation_sid} nicht gefunden, wird neu ermittelt.")
+        invalidate_conversation(conversation_sid)
+        _create_message(get_or_create_conversation(), text, key)
     print(f"✅ Nachricht gesendet: {text}")
 
 
+def is_message_delivered(key, conversation_sid=None):
+    """
+    Checks whether one of the latest bot messages carries the given idempotency key.
+
+    Args:
+        key (str): The idempotency key of the message.
+        conversation_sid (str, optional): The conversation to check; defaults to the bot's own conversation.
+
+    Returns:
+        bool: True if the message is already in the conversation.
+    """
+    conversation_sid = conversation_sid or get_or_create_conversation()
+    with ApiCall("twilio", "messages.list"):
+        messages = client.conversations.v1 \
+            .services(CHAT_SERVICE_SID) \
+            .conversations(conversation_sid) \
+            .messages \
+            .list(order="desc", limit=DELIVERY_CHECK_LIMIT)
+    for msg in messages:
+        if msg.author == "bot" and msg.attributes and key in msg.attributes:
+            return True
+    return False
+
+
+outbox = Outbox(
+    deliver_message,
+    is_delivered=is_message_delivered,
+    maxsize=_settings.outbox_size,
+    rate=_settings.outbox_rate_per_second,
+    burst=_settings.outbox_burst
+)
+REGISTRY.register_stats(
+    "morningsync_outbox", outbox.metrics, "Outgoing message queue", counters=("sent", "failed", "retries")
+)
+
+
+# Send message
+def send_message(text, conversation_sid=None, wait=False):
+    """
+    Queues a message for delivery via Twilio Conversations API.
+
+    The message is sent by the outbox worker, which handles rate limiting and retries;
+    this function returns as soon as the message is enqueued. Messages longer than
+    `MESSAGE_LIMIT` are split into several parts, preferably between days.
+
+    Args:
+        text (str): The message text to send.
+        conversation_sid (str, optional): Target conversation; defaults to the bot's own conversation.
+        wait (bool): Wait for room if the outbox is full instead of dropping the message
+            after `ENQUEUE_TIMEOUT_SECONDS`. Used by digest waves, which produce messages
+            much faster than the outbox may send them.
+    """
+    for part in split_message(text, MESSAGE_LIMIT):
+        if wait:
+            outbox.enqueue(part, recipient=conversation_sid, timeout=None)
+        else:
+            outbox.enqueue(part, recipient=conversation_sid)
+
+
+# Menu number -> (event query, formatter)
+COMMAND_HANDLERS = {
+    "1": (get_events_for_today, format_today),
+    "2": (get_events_for_tomorrow, format_tomorrow),
+    "3": (get_events_for_the_week, format_week),
+    "4": (get_next_event, format_next_event),
+    "5": (get_free_slots_for_today, format_free_slots),
+    "6": (get_conflicts_for_the_week, format_conflicts),
+}
+
+
 def handle_incoming_message(text):
     """
     Handles incoming text messages by interpreting commands and responding accordingly.
 
+    Besides the menu numbers, a date expression such as "Termine am Freitag" or
+    "nächste 14 Tage" is answered with the events of that range (see `range_query`).
+
     Args:
         text (str): The incoming message text.
     """
     text = text.strip()
-
-    if text == "1":
-        events = get_events_for_today()
-        formatted = format_today(events)
-    elif text == "2":
-        events = get_events_for_tomorrow()
-        formatted = format_tomorrow(events)
-    elif text == "3":
-        events = get_events_for_the_week()
-        formatted = format_week(events)
-    elif text == "4":
-        events = get_next_event()
-        formatted = format_next_event(events)
-    else:
-        send_message(MENU_TEXT)
+    handler = COMMAND_HANDLERS.get(text)
+    if handler is None:
+        # Whether this is a date range or anything else is only known after parsing
+        started = time.perf_counter()
+        with trace("Befehl Text"):
+            with span("range"):
+                answer = answer_date_query(text)
+            with span("send"):
+                send_message(answer or MENU_TEXT)
+        command = "range" if answer else "menu"
+        COMMANDS_HANDLED.inc(command=command)
+        COMMAND_LATENCY.observe(time.perf_counter() - started, command=command)
         return
 
-    send_message(formatted)
+    COMMANDS_HANDLED.inc(command=text)
+    with COMMAND_LATENCY.time(command=text), trace(f"Befehl {text}"):
+        get_events, format_events = handler
+        with span("events"):
+            events = get_events()
+        with span("format"):
+            formatted = format_events(events)
+        with span("send"):
+            send_message(formatted)
 
 
-def check_new_messages():
+def _message_date(msg):
+    """
+    Returns the creation time of a message as a timezone-aware datetime.
     """
-    Checks for new incoming messages in a Twilio conversation and handles them.
+    msg_date = msg.date_created if isinstance(msg.date_created, datetime) else datetime.fromisoformat(msg.date_created)
+    if msg_date.tzinfo is None:
+        msg_date = msg_date.replace(tzinfo=timezone.utc)
+    return msg_date
+
 
-    Continuously polls for new messages and responds to valid commands.
+def fetch_new_messages(conversation_sid, cursor):
     """
-    conversation_sid = get_or_create_conversation()
-    # Start from the time when the bot was started
-    last_seen_time = BOT_START_TIME
+    Fetches the messages that arrived after the cursor, newest page first.
+
+    Pages are requested in descending order and reading stops at the first message the
+    cursor has already passed, so a poll costs one small request no matter how long
+    the conversation history is. Before the first message is processed, only messages
+    received after the bot was started are considered new.
 
-    while True:
+    Args:
+        conversation_sid (str): The conversation to poll.
+        cursor (MessageCursor): The read position in the conversation.
+
+    Returns:
+        list: The new messages, oldest first.
+    """
+    new_messages = []
+    with ApiCall("twilio", "messages.list"):
         messages = client.conversations.v1 \
             .services(CHAT_SERVICE_SID) \
             .conversations(conversation_sid) \
             .messages \
-            .list(order="asc")
+            .stream(order="desc", page_size=POLL_PAGE_SIZE)
 
         for msg in messages:
-            # Convert to timezone-aware datetime object
-            msg_date = msg.date_created if isinstance(msg.date_created, datetime) else datetime.fromisoformat(msg.date_created)
-            if msg_date.tzinfo is None:
-                msg_date = msg_date.replace(tzinfo=timezone.utc)
-
-            # Process only messages received after the last seen message
-            if msg.author != "bot" and msg_date > last_seen_time:
-                print(f"📥 Eingehend von {msg.author}: {msg.body}")
-                handle_incoming_message(msg.body)
-                # Update the timestamp of the last processed message
-                last_seen_time = msg_date
-
-        time.sleep(5)
+            if cursor.last_index is None:
+                if _message_date(msg) <= BOT_START_TIME:
+                    break
+            elif msg.index <= cursor.last_index:
+                break
+            if cursor.is_new(msg):
+                new_messages.append(msg)
+
+    new_messages.reverse()
+    return new_messages
@@ -1,55 +1,432 @@
-import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import requests
-from dotenv import load_dotenv
 
+from utils.metrics import REGISTRY, ApiCall
+from utils.settings import get_settings
 
-def get_weather_forecast():
+WEATHER_URL = "https://api.openweathermap.org/data/2.5/weather"
+FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+
+# Strict timeouts, so a hung endpoint cannot stall the daily reminder
+CONNECT_TIMEOUT_SECONDS = 3.05
+READ_TIMEOUT_SECONDS = 10
+
+# Fresh cache lifetime, and how old a cached response may get while it is refreshed
+CACHE_TTL_SECONDS = 600
+MAX_STALE_SECONDS = 6 * 60 * 60
+
+# Number of recent upstream latencies kept for the percentiles
+LATENCY_WINDOW = 200
+
+# The 5-day forecast has one entry every 3 hours, starting at 00:00 UTC
+FORECAST_SLOT_SECONDS = 3 * 60 * 60
+# Cities fetched at the same time when a digest wave is prepared
+PREFETCH_WORKERS = 8
+# Icons by the 'main' group of an OpenWeather condition
+FORECAST_ICONS = {
+    "Thunderstorm": "\u26C8",
+    "Drizzle": "\u2614",
+    "Rain": "\u2614",
+    "Snow": "\u2744",
+    "Clear": "\u2600",
+    "Clouds": "\u2601",
+}
+
+_provider = None
+_provider_lock = threading.Lock()
+_forecast_provider = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; callers arriving meanwhile wait for its
+    result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """
+        Returns `func()`, or the result of the call for `key` that is already running.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result()
+        try:
+            result = func()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class WeatherProvider:
+    """
+    Fetches current weather data from OpenWeather with connection reuse and a TTL cache.
+
+    Responses are cached per city for `ttl` seconds. After that, a cached response up to
+    `max_stale` seconds old is still returned immediately while a background refresh
+    fetches a new one, so a slow or unavailable API does not delay the caller.
+    """
+
+    def __init__(self, api_key, ttl=CACHE_TTL_SECONDS, max_stale=MAX_STALE_SECONDS, url=WEATHER_URL):
+        self.api_key = api_key
+        self.url = url
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.session = requests.Session()
+        self._cache = {}  # city -> (fetched at, data)
+        self._refreshing = set()
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "stale_hits": 0, "misses": 0, "errors": 0}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def current(self, city):
+        """
+        Returns the current weather data for a city.
+
+        Args:
+            city (str): The city name as understood by OpenWeather.
+
+        Returns:
+            dict: The decoded OpenWeather response.
+
+        Raises:
+            requests.RequestException: If nothing usable is cached and the request fails.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(city)
+            age = now - entry[0] if entry else None
+            if entry and age < self.ttl:
+                self._counts["hits"] += 1
+                return entry[1]
+            if entry and age < self.max_stale:
+                self._counts["stale_hits"] += 1
+                if city not in self._refreshing:
+                    self._refreshing.add(city)
+                    threading.Thread(target=self._revalidate, args=(city,), daemon=True).start()
+                return entry[1]
+            self._counts["misses"] += 1
+
+        # Concurrent misses for the same city share one request
+        return self._flight.do(city, lambda: self._fetch(city))
+
+    def metrics(self):
+        """
+        Returns:
+            dict: Cache counters, hit ratio and upstream latency percentiles in seconds.
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = sorted(self._latencies)
+        lookups = counts["hits"] + counts["stale_hits"] + counts["misses"]
+        return {
+            **counts,
+            "hit_ratio": (counts["hits"] + counts["stale_hits"]) / lookups if lookups else None,
+            "upstream_latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "upstream_latency_p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else None,
+        }
+
+    def _fetch(self, city):
+        """
+        Requests the weather for a city from the API and stores it in the cache.
+        """
+        started = time.monotonic()
+        try:
+            with ApiCall("openweather", "weather"):
+                response = self.session.get(
+                    self.url,
+                    params={"q": city, "appid": self.api_key, "units": "metric", "lang": "de"},
+                    timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)
+                )
+                response.raise_for_status()
+                data = response.json()
+        except Exception:
+            with self._lock:
+                self._counts["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+
+        with self._lock:
+            self._cache[city] = (time.monotonic(), data)
+        return data
+
+    def _revalidate(self, city):
+        try:
+            self._fetch(city)
+        except Exception as e:
+            print(f"⚠️ Wetterdaten für {city} konnten nicht aktualisiert werden: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(city)
+
+
+class ForecastProvider:
+    """
+    Fetches the 5-day/3-hour forecast from OpenWeather, cached per city until the next
+    forecast slot begins.
+
+    The forecast only changes when a new slot is computed, so a cached response stays
+    valid up to the next 3-hour boundary; concurrent requests for the same city share
+    one upstream call.
+    """
+
+    def __init__(self, api_key, url=FORECAST_URL):
+        self.api_key = api_key
+        self.url = url
+        self.session = requests.Session()
+        self._cache = {}  # city -> (valid until, slot timestamps, slots)
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "errors": 0}
+
+    def slots(self, city):
+        """
+        Returns the forecast of a city.
+
+        Args:
+            city (str): The city name as understood by OpenWeather.
+
+        Returns:
+            tuple: The start timestamps of the slots and the slots themselves (the 'list'
+                entries of the OpenWeather response), in order.
+
+        Raises:
+            requests.RequestException: If nothing valid is cached and the request fails.
+        """
+        with self._lock:
+            entry = self._cache.get(city)
+            if entry and time.time() < entry[0]:
+                self._counts["hits"] += 1
+                return entry[1], entry[2]
+            self._counts["misses"] += 1
+        return self._flight.do(city, lambda: self._fetch(city))
+
+    def at(self, city, when):
+        """
+        Returns the forecast slot covering a point in time.
+
+        Args:
+            city (str): The city name.
+            when (datetime): A tz-aware point in time.
+
+        Returns:
+            dict or None: The slot, or None if `when` is outside the forecast.
+        """
+        timestamps, slots = self.slots(city)
+        index = bisect_left(timestamps, when.timestamp() - FORECAST_SLOT_SECONDS / 2)
+        if index < len(slots) and abs(timestamps[index] - when.timestamp()) <= FORECAST_SLOT_SECONDS / 2:
+            return slots[index]
+        return None
+
+    def metrics(self):
+        """
+        Returns:
+            dict: Cache counters.
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def _fetch(self, city):
+        try:
+            with ApiCall("openweather", "forecast"):
+                response = self.session.get(
+                    self.url,
+                    params={"q": city, "appid": self.api_key, "units": "metric", "lang": "de"},
+                    timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)
+                )
+                response.raise_for_status()
+                slots = response.json()["list"]
+        except Exception:
+            with self._lock:
+                self._counts["errors"] += 1
+            raise
+
+        timestamps = [slot["dt"] for slot in slots]
+        valid_until = (time.time() // FORECAST_SLOT_SECONDS + 1) * FORECAST_SLOT_SECONDS
+        with self._lock:
+            self._cache[city] = (valid_until, timestamps, slots)
+        return timestamps, slots
+
+
+def get_weather_provider():
+    """
+    Returns the shared weather provider, creating it on first use and again when the API key changes.
+
+    Returns:
+        WeatherProvider: The provider configured with 'OPENWEATHER_API_KEY' and 'WEATHER_CACHE_TTL'.
+    """
+    global _provider
+    settings = get_settings()
+    with _provider_lock:
+        if _provider is None or _provider.api_key != settings.openweather_api_key:
+            _provider = WeatherProvider(settings.openweather_api_key, ttl=settings.weather_cache_ttl)
+        _provider.ttl = settings.weather_cache_ttl
+        return _provider
+
+
+def get_forecast_provider():
+    """
+    Returns the shared forecast provider, creating it on first use and again when the API key changes.
+
+    Returns:
+        ForecastProvider: The provider configured with 'OPENWEATHER_API_KEY'.
+    """
+    global _forecast_provider
+    settings = get_settings()
+    with _provider_lock:
+        if _forecast_provider is None or _forecast_provider.api_key != settings.openweather_api_key:
+            _forecast_provider = ForecastProvider(settings.openweather_api_key)
+        return _forecast_provider
+
+
+REGISTRY.register_stats(
+    "morningsync_weather", lambda: get_weather_provider().metrics(), "Weather provider cache",
+    counters=("hits", "stale_hits", "misses", "errors")
+)
+REGISTRY.register_stats(
+    "morningsync_forecast", lambda: get_forecast_provider().metrics(), "Weather forecast cache",
+    counters=("hits", "misses", "errors")
+)
+
+
+def prefetch_weather(cities):
+    """
+    Loads the weather of many cities into the caches before a digest wave.
+
+    Every distinct city is requested once, and the cities are fetched concurrently, so
+    a wave for many subscribers costs one upstream call per city and data set (current
+    weather if 'INCLUDE_WEATHER_MESSAGE', forecast if 'INCLUDE_EVENT_WEATHER'). Failures
+    are reported and left to the digests, which fall back on their own.
+
+    Args:
+        cities (Iterable[str or None]): The cities; None stands for 'CITY'.
+    """
+    settings = get_settings()
+    cities = {city or settings.city or "Berlin" for city in cities}
+    fetches = []
+    if settings.include_weather:
+        fetches += [(get_weather_provider().current, city) for city in cities]
+    if settings.include_event_weather:
+        fetches += [(get_forecast_provider().slots, city) for city in cities]
+    if not fetches:
+        return
+
+    def fetch(task):
+        load, city = task
+        try:
+            load(city)
+        except Exception as e:
+            print(f"⚠️ Wetterdaten für {city} konnten nicht vorab geladen werden: {e}")
+
+    with ThreadPoolExecutor(max_workers=min(PREFETCH_WORKERS, len(fetches)), thread_name_prefix="weather") as pool:
+        list(pool.map(fetch, fetches))
+
+
+def get_event_weather(events, city=None):
+    """
+    Looks up the forecast for the start of each timed event.
+
+    Args:
+        events (Iterable[Event]): The events, e.g. today's.
+        city (str, optional): The city; defaults to the 'CITY' variable.
+
+    Returns:
+        dict: A short forecast note per event, e.g. "☔ leichter regen, 14°C"; events
+            outside the forecast and all-day events are left out. Empty if the forecast
+            cannot be loaded.
+    """
+    city = city or get_settings().city or "Berlin"
+    provider = get_forecast_provider()
+    notes = {}
+    try:
+        for event in events:
+            if event.all_day:
+                continue
+            slot = provider.at(city, event.start)
+            if slot is not None:
+                notes[event] = format_forecast_note(slot)
+    except Exception as e:
+        print(f"⚠️ Wettervorhersage für {city} nicht verfügbar: {e}")
+        return {}
+    return notes
+
+
+def format_forecast_note(slot):
+    """
+    Summarizes a forecast slot in a few words.
+
+    Args:
+        slot (dict): An entry of the forecast's 'list'.
+
+    Returns:
+        str: The note, e.g. "☔ leichter regen, 14°C".
+    """
+    weather = slot["weather"][0]
+    icon = FORECAST_ICONS.get(weather["main"], "\U0001F324")
+    return f"{icon} {weather['description']}, {round(slot['main']['temp'])}°C"
+
+
+def get_weather_forecast(city=None):
     """
     Fetches the current weather data and generates a summary string.
 
-    Optionally includes a funny comment and a clothing tip based on environment variables.
+    Optionally includes a funny comment and a clothing tip based on the settings.
     Weather output can be disabled entirely using the INCLUDE_WEATHER_MESSAGE variable.
+    The data comes from the cached weather provider, so repeated calls do not hit the API.
+
+    Args:
+        city (str, optional): The city to report on; defaults to the 'CITY' variable.
 
     Returns:
         str: Weather information as a formatted string, or an empty string if disabled.
     """
-    load_dotenv()
-    api_key = os.getenv("OPENWEATHER_API_KEY")
-    city = os.getenv("CITY", "Berlin")
-    include_weather = os.getenv("INCLUDE_WEATHER_MESSAGE", "").lower() == "true"
-    if not include_weather:
+    settings = get_settings()
+    city = city or settings.city or "Berlin"
+    if not settings.include_weather:
         return ""
-    url = (
-        f"http://api.openweathermap.org/data/2.5/weather?"
-        f"q={city}&appid={api_key}&units=metric&lang=de"
-    )
 
     try:
-        response = requests.get(url)
-        data = response.json()
-
-        if response.status_code == 200:
-            description = data["weather"][0]["description"].lower()
-            temp = round(data["main"]["temp"])
-            include_funny = os.getenv("INCLUDE_FUNNY_WEATHER", "").lower() == "true"
-            include_outfit = os.getenv("INCLUDE_OUTFIT_TIP", "").lower() == "true"
-            result = f"{description.capitalize()}, {temp}°C"
-            extra_lines = ""
-            if include_funny:
-                funny_comment = get_funny_weather_comment(description, temp)
-                extra_lines += f"{funny_comment}"
-            if include_outfit:
-                outfit_tip = get_weather_outfit_tip(description, temp)
-                extra_lines += f"Hinweis: {outfit_tip}"
-            if extra_lines:
-                result += f"\n{extra_lines.strip()}"
-            return result
-        else:
-            return "Wetterdaten konnten nicht geladen werden."
+        data = get_weather_provider().current(city)
+    except requests.HTTPError:
+        return "Wetterdaten konnten nicht geladen werden."
     except Exception as e:
         return f"Fehler beim Abrufen der Wetterdaten: {e}"
 
+    description = data["weather"][0]["description"].lower()
+    temp = round(data["main"]["temp"])
+    result = f"{description.capitalize()}, {temp}°C"
+    extra_lines = ""
+    if settings.include_funny_weather:
+        funny_comment = get_funny_weather_comment(description, temp)
+        extra_lines += f"{funny_comment}"
+    if settings.include_outfit_tip:
+        outfit_tip = get_weather_outfit_tip(description, temp)
+        extra_lines += f"Hinweis: {outfit_tip}"
+    if extra_lines:
+        result += f"\n{extra_lines.strip()}"
+    return result
+
 
 def get_funny_weather_comment(description, temp):
     """
@@ -0,0 +1,159 @@
+"""
+webhook.py
+
+Webhook ingress for incoming WhatsApp messages.
+
+Twilio Conversations posts an `onMessageAdded` callback for every new message. The
+callback is verified with the Twilio signature, acknowledged right away and put on a
+work queue; a few workers hand the messages to `handle_incoming_message`, so a slow
+command does not hold up the next one. Every author is served by one fixed worker, so
+the commands of one author are still answered in order. This replaces the 5-second
+polling when 'MESSAGE_MODE' is set to 'webhook'.
+"""
+
+import asyncio
+import zlib
+from http import HTTPStatus
+from types import SimpleNamespace
+
+from twilio.request_validator import RequestValidator
+
+from services.message_cursor import MessageCursor
+from services.twilio_api import get_or_create_conversation, handle_incoming_message
+from utils.http_server import HttpServer, Response
+from utils.settings import get_settings
+
+WEBHOOK_PATH = "/twilio/conversations"
+# Callbacks waiting per worker; when full, Twilio is asked to retry later
+QUEUE_SIZE = 100
+
+
+class TwilioWebhook:
+    """
+    Receives Conversations callbacks and dispatches new messages to the command handler.
+    """
+
+    def __init__(self, auth_token, public_url, conversation_sid, cursor, call=None, workers=1):
+        """
+        Args:
+            auth_token (str): The Twilio auth token used to verify signatures.
+            public_url (str): The public URL Twilio posts to, as configured in the console.
+            conversation_sid (str): The conversation whose messages are handled.
+            cursor (MessageCursor): Remembers processed messages, so Twilio retries are ignored.
+            call (Callable[..., Awaitable], optional): Runs a blocking function off the event
+                loop, e.g. `Runtime.call`; defaults to the loop's default executor.
+            workers (int): Number of workers, each with its own queue; see `run_worker`.
+        """
+        self.validator = RequestValidator(auth_token)
+        self.public_url = public_url
+        self.conversation_sid = conversation_sid
+        self.cursor = cursor
+        self.call = call or _run_in_executor
+        self.queues = [asyncio.Queue(maxsize=QUEUE_SIZE) for _ in range(workers)]
+        self._in_flight = set()
+
+    async def handle(self, request):
+        """
+        Verifies a callback and enqueues the message it announces.
+
+        Args:
+            request (Request): The incoming HTTP request.
+
+        Returns:
+            Response: 200 once enqueued, 403 for a bad signature, 503 if the queue is full.
+        """
+        params = request.form()
+        signature = request.headers.get("x-twilio-signature", "")
+        if not self.validator.validate(self.public_url, params, signature):
+            print("⚠️ Webhook mit ungültiger Signatur abgelehnt.")
+            return Response(HTTPStatus.FORBIDDEN, "Forbidden")
+
+        if (
+            params.get("EventType") != "onMessageAdded"
+            or params.get("ConversationSid") != self.conversation_sid
+            or params.get("Author") == "bot"
+        ):
+            return Response(HTTPStatus.OK)
+
+        message = SimpleNamespace(
+            sid=params.get("MessageSid", ""),
+            index=int(params.get("Index", 0)),
+            author=params.get("Author", ""),
+            body=params.get("Body", ""),
+        )
+        # The same author always lands on the same worker
+        queue = self.queues[zlib.crc32(message.author.encode()) % len(self.queues)]
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            return Response(HTTPStatus.SERVICE_UNAVAILABLE, "Busy")
+        return Response(HTTPStatus.OK)
+
+    async def run_worker(self, index=0):
+        """
+        Handles the messages of one queue one after another, skipping messages already
+        processed or being processed.
+
+        Args:
+            index (int): The worker's queue, 0 <= index < workers.
+        """
+        queue = self.queues[index]
+        while True:
+            message = await queue.get()
+            try:
+                if not self.cursor.seen(message.sid) and message.sid not in self._in_flight:
+                    self._in_flight.add(message.sid)
+                    try:
+                        print(f"📥 Eingehend von {message.author}: {message.body}")
+                        await self.call(handle_incoming_message, message.body)
+                        self.cursor.advance(message)
+                    finally:
+                        self._in_flight.discard(message.sid)
+            except Exception as e:
+                print(f"❌ Nachricht {message.sid} konnte nicht verarbeitet werden: {e!r}")
+            finally:
+                queue.task_done()
+
+
+async def _run_in_executor(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+async def serve_webhook(call=None, workers=None):
+    """
+    Starts the webhook server and processes incoming messages until cancelled.
+
+    Configured via 'TWILIO_AUTH_TOKEN', 'WEBHOOK_PUBLIC_URL', 'WEBHOOK_HOST' and 'WEBHOOK_PORT'.
+
+    Args:
+        call (Callable[..., Awaitable], optional): Runs blocking functions off the event loop.
+        workers (int, optional): Messages handled at the same time; defaults to 'COMMAND_CONCURRENCY'.
+    """
+    settings = get_settings()
+    auth_token = settings.twilio_auth_token
+    public_url = settings.webhook_public_url
+    if not auth_token or not public_url:
+        raise RuntimeError("Für den Webhook-Modus müssen TWILIO_AUTH_TOKEN und WEBHOOK_PUBLIC_URL gesetzt sein.")
+
+    call = call or _run_in_executor
+    workers = workers or settings.command_concurrency
+    conversation_sid = await call(get_or_create_conversation)
+    cursor = MessageCursor(settings.message_cursor_path)
+    if cursor.conversation_sid != conversation_sid:
+        cursor.reset(conversation_sid)
+
+    webhook = TwilioWebhook(auth_token, public_url, conversation_sid, cursor, call=call, workers=workers)
+    server = HttpServer(settings.webhook_host, settings.webhook_port)
+    server.route("POST", WEBHOOK_PATH, webhook.handle)
+    await server.start()
+    try:
+        await asyncio.gather(*(webhook.run_worker(index) for index in range(workers)))
+    finally:
+        await server.stop()
+
+
+def run_webhook_server():
+    """
+    Runs the webhook server on its own event loop, blocking the calling thread.
+    """
+    asyncio.run(serve_webhook())
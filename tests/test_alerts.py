@@ -0,0 +1,66 @@
+"""
+Tests for the event alerts.
+"""
+
+import heapq
+from datetime import datetime, timedelta
+
+import pytz
+
+from services.alerts import AlertEngine
+from services.event import Event
+from services.scheduler import Scheduler
+
+TZ = pytz.timezone("Europe/Berlin")
+
+
+class FlakyStore:
+    """
+    An event store whose calendar is unreachable for the first `failures` syncs.
+    """
+
+    def __init__(self, events, failures):
+        self.events = events
+        self.failures = failures
+
+    def subscribe(self, listener):
+        pass
+
+    def unsubscribe(self, listener):
+        pass
+
+    def sync(self):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("Calendar nicht erreichbar")
+
+    def next_events(self, after, limit=1):
+        self.sync()
+        return self.events
+
+
+def _pop_job(scheduler):
+    with scheduler._lock:
+        scheduler._drop_cancelled()
+        return heapq.heappop(scheduler._heap)[2]
+
+
+def test_start_survives_a_calendar_outage():
+    start = datetime.now(TZ) + timedelta(hours=1)
+    event = Event(start, start + timedelta(hours=1), False, "cal1", "Zahnarzt", "ev1")
+    scheduler = Scheduler(TZ)
+    alerts = AlertEngine(FlakyStore([event], failures=2), scheduler, lambda message: None, timedelta(minutes=15))
+
+    alerts.start()
+    assert alerts.pending() == 0
+    # Retried on the scheduler until the calendar answers
+    _pop_job(scheduler).callback()
+    assert alerts.pending() == 0
+    job = _pop_job(scheduler)
+    assert job.name == "alert load"
+    job.callback()
+    assert alerts.pending() == 1
+
+    names = sorted(job.name for _, _, job in scheduler._heap)
+    assert names == ["alert sync", "event alert"]
+    alerts.stop()
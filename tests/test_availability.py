@@ -0,0 +1,91 @@
+"""
+Tests for the free slots and conflicts sweep.
+"""
+
+from datetime import datetime, timedelta
+from itertools import combinations
+
+import pytz
+
+from services.availability import busy_intervals, find_conflicts, free_slots
+from services.event import Event
+
+TZ = pytz.timezone("Europe/Berlin")
+DAY_START = TZ.localize(datetime(2026, 10, 19, 8, 0))
+DAY_END = TZ.localize(datetime(2026, 10, 19, 20, 0))
+
+
+def _at(hour, minute=0):
+    return TZ.localize(datetime(2026, 10, 19, hour, minute))
+
+
+def _event(id, start, end, all_day=False):
+    return Event(start, end, all_day, "cal1", f"Termin {id}", id)
+
+
+def _all_day(id):
+    return _event(id, TZ.localize(datetime(2026, 10, 19)), TZ.localize(datetime(2026, 10, 20)), all_day=True)
+
+
+def _free(events, min_length=timedelta(minutes=30)):
+    return free_slots(busy_intervals(events), DAY_START, DAY_END, min_length)
+
+
+def test_touching_and_overlapping_events_are_one_busy_block():
+    events = [
+        _event("a", _at(9), _at(10)),
+        _event("b", _at(10), _at(11)),  # touches a
+        _event("c", _at(10, 30), _at(12)),  # overlaps b
+        _event("d", _at(11), _at(11, 30)),  # inside c
+    ]
+    assert busy_intervals(events) == [(_at(9), _at(12))]
+    assert _free(events) == [(DAY_START, _at(9)), (_at(12), DAY_END)]
+
+
+def test_all_day_events_do_not_block_time():
+    events = [_all_day("birthday"), _event("a", _at(13), _at(14))]
+    assert _free(events) == [(DAY_START, _at(13)), (_at(14), DAY_END)]
+    assert _free([_all_day("holiday")]) == [(DAY_START, DAY_END)]
+
+
+def test_gaps_shorter_than_min_length_are_left_out():
+    events = [
+        _event("a", _at(7), _at(8, 20)),  # reaches into the window; 20 min until b
+        _event("b", _at(8, 40), _at(10)),
+        _event("c", _at(10, 30), _at(12)),  # exactly 30 min after b
+        _event("d", _at(19, 45), _at(21)),  # 15 min left at the end of the window
+    ]
+    assert _free(events) == [(_at(10), _at(10, 30)), (_at(12), _at(19, 45))]
+    assert _free(events, timedelta(hours=8)) == []
+
+
+def test_conflicts_are_all_overlapping_pairs():
+    events = [
+        _all_day("birthday"),
+        _event("a", _at(9), _at(12)),
+        _event("b", _at(9, 30), _at(10)),
+        _event("c", _at(10), _at(11)),  # touches b, overlaps a
+        _event("d", _at(10, 30), _at(13)),  # overlaps a and c
+        _event("e", _at(13), _at(14)),  # touches d only
+    ]
+    conflicts = find_conflicts(events)
+
+    assert sorted((earlier.id, later.id) for earlier, later in conflicts) == [
+        ("a", "b"), ("a", "c"), ("a", "d"), ("c", "d")
+    ]
+    # Ordered by the start of the later event
+    assert [later.id for _, later in conflicts] == ["b", "c", "d", "d"]
+
+
+def test_conflicts_match_all_pairs_comparison():
+    # Every event overlaps the next three, so k is about 3n
+    events = [
+        _event(str(i), _at(8) + timedelta(minutes=20 * i), _at(8) + timedelta(minutes=20 * i + 70))
+        for i in range(30)
+    ]
+    expected = {
+        (a.id, b.id) for a, b in combinations(events, 2) if a.start < b.end and b.start < a.end
+    }
+    found = [(earlier.id, later.id) for earlier, later in find_conflicts(events)]
+    assert len(found) == len(expected)
+    assert set(found) == expected
@@ -0,0 +1,87 @@
+"""
+Tests for the calendar client used by many subscribers.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from services import calendar_client
+from services.calendar_client import AuthorizationRequired, CalendarClient
+
+
+def test_unattended_client_without_token_fails_fast(tmp_path, monkeypatch):
+    def browser_flow(*args, **kwargs):
+        raise AssertionError("the browser flow must not run")
+
+    monkeypatch.setattr(calendar_client.InstalledAppFlow, "from_client_secrets_file", browser_flow)
+    client = CalendarClient(token_path=str(tmp_path / "missing.pkl"), interactive=False)
+
+    with pytest.raises(AuthorizationRequired):
+        client.service
+
+
+def test_refreshes_share_one_thread():
+    threads = threading.active_count()
+    clients = []
+    for i in range(200):
+        client = CalendarClient(token_path=f"token-{i}.pkl")
+        client._creds = Credentials(
+            token="token", refresh_token="refresh", expiry=datetime.utcnow() + timedelta(hours=1)
+        )
+        client._schedule_refresh()
+        clients.append(client)
+
+    # At most the shared refresh thread was started
+    assert threading.active_count() - threads <= 1
+    for client in clients:
+        client.close()
+
+
+def _expiring_client(tmp_path, monkeypatch, expires_in):
+    refreshed = []
+
+    def refresh(creds, request):
+        refreshed.append(creds)
+        creds.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    monkeypatch.setattr(Credentials, "refresh", refresh)
+    client = CalendarClient(token_path=str(tmp_path / "token.pkl"), interactive=False)
+    client._save_credentials(Credentials(
+        token="token", refresh_token="refresh", expiry=datetime.utcnow() + expires_in
+    ))
+    return client, refreshed
+
+
+class FakeRequest:
+    methodId = "calendar.events.list"
+
+    def execute(self, http):
+        return {}
+
+
+def test_unattended_client_schedules_no_background_refresh(tmp_path, monkeypatch):
+    client, refreshed = _expiring_client(tmp_path, monkeypatch, timedelta(hours=1))
+
+    client.service
+    client.execute(FakeRequest())
+
+    assert client._refresh_job is None
+    assert refreshed == []
+
+
+def test_unattended_client_refreshes_on_use(tmp_path, monkeypatch):
+    client, refreshed = _expiring_client(tmp_path, monkeypatch, timedelta(minutes=1))
+
+    client.service
+    client.execute(FakeRequest())
+    client.execute(FakeRequest())
+
+    assert len(refreshed) == 1
+    assert client.stats["refresh"] == 1
+    assert client._refresh_job is None
+    # The refreshed token was stored for the next start
+    reloaded = CalendarClient(token_path=client.token_path, interactive=False)._load_credentials()
+    assert reloaded.expiry > datetime.utcnow() + timedelta(minutes=30)
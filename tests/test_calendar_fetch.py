@@ -0,0 +1,50 @@
+"""
+Tests for the streaming merge of several calendars.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.scenarios import BenchEnvironment
+
+CALENDARS = 3
+# Eight pages of 250 events per calendar
+EVENTS = 2000
+
+
+@pytest.fixture(scope="module")
+def env():
+    env = BenchEnvironment(latency=0.0, calendars=CALENDARS, events=EVENTS, history=10)
+    yield env
+    env.close()
+
+
+def _query(timezone):
+    now = datetime.now(timezone)
+    return {"timeMin": (now - timedelta(days=2)).isoformat(), "timeMax": (now + timedelta(days=30)).isoformat()}
+
+
+def test_merge_is_ordered_and_complete(env):
+    from services.calendar_fetch import fetch_events
+    from services.google_calendar import timezone
+
+    events = fetch_events(env.calendar_client.calendar_ids(), timezone, client=env.calendar_client, **_query(timezone))
+
+    assert len(events) == CALENDARS * EVENTS
+    assert [event.start for event in events] == sorted(event.start for event in events)
+
+
+def test_merge_fetches_one_page_ahead(env):
+    from services.calendar_fetch import stream_events
+    from services.google_calendar import timezone
+
+    calendar_ids = env.calendar_client.calendar_ids()
+    before = env.calendar.calls.get("events.list", 0)
+    stream = stream_events(calendar_ids, timezone, client=env.calendar_client, **_query(timezone))
+    first = next(stream)
+
+    # Only the first page of each calendar plus the one requested ahead
+    assert first.summary
+    assert env.calendar.calls.get("events.list", 0) - before <= 2 * len(calendar_ids)
+    assert sum(1 for _ in stream) == CALENDARS * EVENTS - 1
@@ -0,0 +1,99 @@
+"""
+Tests for the calendar watch across leader changes.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytz
+
+from services import calendar_watch
+from services.calendar_watch import CalendarWatcher, serve_calendar_watch
+from services.scheduler import Scheduler
+from utils.metrics import REGISTRY
+from utils.settings import Settings
+
+
+class FakeClient:
+    """
+    Answers `events.watch` and `channels.stop` for one calendar, or fails to open channels.
+    """
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.opened = 0
+
+    def calendar_ids(self):
+        return ["cal1"]
+
+    @property
+    def service(self):
+        return self
+
+    def events(self):
+        return self
+
+    def channels(self):
+        return self
+
+    def watch(self, calendarId, body):
+        return "watch", body
+
+    def stop(self, body):
+        return "stop", body
+
+    def execute(self, request):
+        kind, body = request
+        if kind == "stop":
+            return {}
+        if self.fail:
+            raise OSError("Calendar nicht erreichbar")
+        self.opened += 1
+        return {"id": body["id"], "resourceId": "res1", "expiration": str(int((time.time() + 3600) * 1000))}
+
+
+def _store(client):
+    return SimpleNamespace(client=client, set_watched=lambda cal_id, watched: None, invalidate=lambda cal_id: None)
+
+
+def test_stop_cancels_pending_retries():
+    client = FakeClient(fail=True)
+    scheduler = Scheduler(pytz.utc)
+    watcher = CalendarWatcher(_store(client), scheduler, "https://bot.example/google/calendar")
+
+    watcher.start()
+    assert scheduler.next_run() is not None
+    watcher.stop()
+    assert scheduler.next_run() is None
+
+    # A retry that was already running does not open a channel for the stopped watcher
+    client.fail = False
+    watcher._renew("cal1")
+    assert client.opened == 0
+
+
+def test_metrics_survive_leader_changes(monkeypatch):
+    settings = Settings.from_env({
+        "CALENDAR_WATCH_URL": "https://bot.example/google/calendar",
+        "CALENDAR_WATCH_HOST": "127.0.0.1",
+        "CALENDAR_WATCH_PORT": "0",
+    })
+    monkeypatch.setattr(calendar_watch, "get_settings", lambda: settings)
+    scheduler = Scheduler(pytz.utc)
+
+    async def lead_once():
+        task = asyncio.create_task(serve_calendar_watch(_store(FakeClient()), scheduler))
+        await asyncio.sleep(0.3)
+        metrics = REGISTRY.render()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return metrics
+
+    # Won, lost and won again
+    for _ in range(3):
+        metrics = asyncio.run(lead_once())
+        assert metrics.count("# TYPE morningsync_calendar_watch_channels gauge") == 1
+        assert "morningsync_calendar_watch_channels 1\n" in metrics
+        assert "morningsync_calendar_watch_channels_opened_total 1\n" in metrics
+    assert "morningsync_calendar_watch" not in REGISTRY.render()
@@ -0,0 +1,45 @@
+"""
+Tests for the date expressions of incoming messages.
+"""
+
+from datetime import date
+
+import pytest
+
+from utils.date_parser import MAX_RANGE_DAYS, parse_date_range
+
+# A Saturday
+SATURDAY = date(2026, 10, 17)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Termine am Freitag", (date(2026, 10, 23), date(2026, 10, 23))),
+    ("nächste 14 Tage", (SATURDAY, date(2026, 10, 30))),
+    ("in 3 Tagen", (date(2026, 10, 20), date(2026, 10, 20))),
+    ("Montag bis Mittwoch", (date(2026, 10, 19), date(2026, 10, 21))),
+    # The end rolls over into the week after the start
+    ("Freitag bis Montag", (date(2026, 10, 23), date(2026, 10, 26))),
+    ("Freitag bis Freitag", (date(2026, 10, 23), date(2026, 10, 23))),
+    ("letzten Freitag bis Montag", (date(2026, 10, 16), date(2026, 10, 19))),
+    (f"nächste {MAX_RANGE_DAYS} Tage", (SATURDAY, date(2027, 10, 17))),
+])
+def test_parses_ranges(text, expected):
+    assert parse_date_range(text, SATURDAY) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "in 9999999 Tagen",
+    "in 99999999999 Wochen",
+    "nächste 99999999 Tage",
+    "nächste 9999999999 Tage",
+    f"nächste {MAX_RANGE_DAYS + 1} Tage",
+    "nächste 60 Wochen",
+])
+def test_rejects_too_long_ranges(text):
+    with pytest.raises(ValueError, match="zu lang"):
+        parse_date_range(text, SATURDAY)
+
+
+def test_rejects_end_before_start():
+    with pytest.raises(ValueError, match="vor seinem Anfang"):
+        parse_date_range("24.12. bis 1.12.", SATURDAY)
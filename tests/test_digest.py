@@ -0,0 +1,84 @@
+"""
+Send-time latency of the pre-rendered daily digest.
+
+The digest is built against the benchmark's fake Calendar, Twilio and OpenWeather
+servers. Every fake API call takes 50 ms, so a single call at send time would already
+exceed the budget.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from benchmarks.scenarios import BenchEnvironment
+
+# How late the prepared digest may reach the sender
+SEND_BUDGET_SECONDS = 0.05
+
+
+@pytest.fixture(scope="module")
+def env():
+    env = BenchEnvironment(latency=0.05, history=10)
+    yield env
+    env.close()
+
+
+def test_deliver_sends_prepared_digest_without_api_calls(env):
+    from services.digest import DigestPrefetcher
+    from services.google_calendar import build_daily_digest, get_daily_reminder, timezone
+    from services.scheduler import Scheduler
+
+    def version():
+        env.store.sync(force=True)
+        return env.store.version
+
+    sent = []
+    delivered = threading.Event()
+
+    def send(prepared):
+        calls = env.calls()
+        sent.append((get_daily_reminder(prepared), env.calls() - calls))
+        delivered.set()
+
+    # Prepared in one second, sent two seconds later
+    at = (datetime.now(timezone) + timedelta(seconds=3)).time()
+    scheduler = Scheduler(timezone)
+    prefetcher = DigestPrefetcher(scheduler, build_daily_digest, version, send, at, timedelta(seconds=2))
+    prefetcher.install()
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    try:
+        assert delivered.wait(timeout=10)
+    finally:
+        scheduler.stop()
+        thread.join(timeout=5)
+
+    message, calls_at_send = sent[0]
+    assert prefetcher.stats["builds"] == 1
+    assert message.startswith("📅")
+    assert "Wetter" in message
+    assert calls_at_send == 0
+    assert prefetcher.stats["last_send_lag"] < SEND_BUDGET_SECONDS
+
+
+def test_subscriber_digests_are_journaled_and_follow_settings(tmp_path, monkeypatch):
+    from services import google_calendar
+    from services.subscribers import Subscriber
+    from utils.settings import Settings
+
+    settings = Settings.from_env({"JOB_JOURNAL_PATH": str(tmp_path / "journal.db")})
+    listeners = []
+    monkeypatch.setattr(google_calendar, "get_settings", lambda: settings)
+    monkeypatch.setattr(google_calendar, "on_change", listeners.append)
+    monkeypatch.setattr(google_calendar, "load_subscribers", lambda: [
+        Subscriber("anna", "CH1", "anna.pkl", reminder_time="07:30"),
+        Subscriber("ben", "CH2", "ben.pkl", reminder_time="07:30"),
+    ])
+
+    scheduler = google_calendar.build_reminder_scheduler(lambda *args, **kwargs: None)
+
+    assert scheduler.journal.state("digest anna", scheduler.next_run()) == "planned"
+    assert len(listeners) == 1
+    listeners[0](settings, settings, {"digest_workers"})
+    scheduler.journal.close()
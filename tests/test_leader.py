@@ -0,0 +1,110 @@
+"""
+Failover tests for the leader lease with real processes.
+
+Two bot stand-ins compete for the lease; the leader "sends" by appending to a shared
+file while it holds the lease. The leader is killed with SIGKILL, and the standby must
+take over while no two processes ever send at the same time.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TTL = 1.0
+# How long the standby may take to become leader after the kill
+TAKEOVER_SECONDS = 3 * TTL
+
+# argv: backend, lease path, sends file, name, ttl
+CHILD = r"""
+import asyncio
+import sys
+import time
+
+from services.leader import LeaderElector, create_lease
+
+backend, path, sends_path, name, ttl = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4], float(sys.argv[5])
+
+
+async def main():
+    elector = LeaderElector(create_lease(backend, path), owner=name, ttl=ttl)
+    if not await elector._try():
+        print("STANDBY", flush=True)
+        await elector.acquire()
+    print("LEADER", flush=True)
+
+    async def send():
+        while True:
+            with open(sends_path, "a") as f:
+                f.write(f"{name} {time.time()}\n")
+            await asyncio.sleep(0.05)
+
+    sender = asyncio.create_task(send())
+    await elector.hold()
+    sender.cancel()
+    print("LOST", flush=True)
+
+
+asyncio.run(main())
+"""
+
+
+def _start(tmp_path, backend, name):
+    return subprocess.Popen(
+        [sys.executable, "-c", CHILD, backend, str(tmp_path / "leader.lease"), str(tmp_path / "sends.txt"), name,
+         str(TTL)],
+        cwd=ROOT,
+        env=dict(os.environ, PYTHONPATH=ROOT),
+        stdout=subprocess.PIPE,
+        text=True
+    )
+
+
+def _wait_for(process, marker):
+    # Skips the elector's own log lines
+    for line in process.stdout:
+        if line.strip() == marker:
+            return True
+    return False
+
+
+def _sends(tmp_path):
+    lines = (tmp_path / "sends.txt").read_text().splitlines()
+    return [(name, float(at)) for name, at in (line.split() for line in lines)]
+
+
+@pytest.mark.parametrize("backend", ["file", "sqlite"])
+def test_standby_takes_over_when_leader_dies(tmp_path, backend):
+    leader = _start(tmp_path, backend, "a")
+    standby = None
+    try:
+        assert _wait_for(leader, "LEADER")
+        standby = _start(tmp_path, backend, "b")
+        assert _wait_for(standby, "STANDBY")
+        time.sleep(2 * TTL)
+        # While the leader lives, only it sends
+        assert {name for name, _ in _sends(tmp_path)} == {"a"}
+
+        leader.send_signal(signal.SIGKILL)
+        leader.wait(timeout=10)
+        killed = time.time()
+        assert _wait_for(standby, "LEADER")
+        assert time.time() - killed < TAKEOVER_SECONDS
+        time.sleep(0.5)
+    finally:
+        for process in (leader, standby):
+            if process is not None and process.poll() is None:
+                process.kill()
+                process.wait(timeout=10)
+
+    sends = _sends(tmp_path)
+    names = [name for name, _ in sends]
+    # One block of sends per process: the standby only started after the leader stopped
+    first_b = names.index("b")
+    assert set(names[:first_b]) == {"a"}
+    assert set(names[first_b:]) == {"b"}
+    assert sends[first_b][1] >= max(at for name, at in sends if name == "a")
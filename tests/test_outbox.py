@@ -0,0 +1,50 @@
+"""
+Tests for the outbox under load.
+"""
+
+import threading
+import time
+
+from services.outbox import Outbox
+
+
+def _flood(outbox, producers, per_producer, timeout):
+    results = []
+
+    def produce(producer):
+        for i in range(per_producer):
+            results.append(outbox.enqueue(f"{producer}-{i}", timeout=timeout))
+
+    threads = [threading.Thread(target=produce, args=(producer,)) for producer in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outbox.join(timeout=30)
+    return results
+
+
+def test_waiting_producers_lose_nothing():
+    delivered = []
+    outbox = Outbox(lambda text, key, recipient: delivered.append(text), maxsize=10, rate=200.0, burst=5)
+
+    results = _flood(outbox, producers=16, per_producer=25, timeout=None)
+
+    assert all(results)
+    assert sorted(delivered) == sorted(f"{p}-{i}" for p in range(16) for i in range(25))
+    assert outbox.metrics()["failed"] == 0
+
+
+def test_enqueue_with_timeout_drops_when_full():
+    release = threading.Event()
+    outbox = Outbox(lambda text, key, recipient: release.wait(), maxsize=1, rate=1000.0, burst=10)
+
+    # One message is being delivered, one waits in the queue, the third finds no room
+    assert outbox.enqueue("a")
+    while outbox.metrics()["queue_depth"]:
+        time.sleep(0.01)
+    assert outbox.enqueue("b")
+    assert not outbox.enqueue("c", timeout=0.1)
+    release.set()
+    assert outbox.join(timeout=5)
+    assert outbox.metrics()["failed"] == 1
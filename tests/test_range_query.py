@@ -0,0 +1,54 @@
+"""
+Tests for the answers of the range query engine.
+
+Bot modules are imported inside the tests, see `test_runtime.py`.
+"""
+
+import pytz
+
+TZ = pytz.timezone("Europe/Berlin")
+
+
+class FakeStore:
+    """
+    An event store without events that counts the ranges asked for.
+    """
+
+    version = 1
+
+    def __init__(self):
+        self.ranges = []
+
+    def sync(self):
+        pass
+
+    def events_between(self, start, end):
+        self.ranges.append((start, end))
+        return []
+
+
+def test_too_long_ranges_are_answered_not_raised():
+    from services.range_query import RangeQueryEngine
+
+    store = FakeStore()
+    engine = RangeQueryEngine(store, TZ)
+    for text in ("in 9999999 Tagen", "nächste 99999999 Tage", "nächste 9999999999 Tage"):
+        assert engine.answer(text, "de").startswith("⚠️ Der Zeitraum ist zu lang")
+    assert store.ranges == []
+
+
+def test_weekday_range_over_the_weekend():
+    from services.range_query import RangeQueryEngine
+
+    store = FakeStore()
+    message = RangeQueryEngine(store, TZ).answer("Freitag bis Montag", "de")
+    assert not message.startswith("⚠️")
+    (start, end), = store.ranges
+    assert start.weekday() == 4
+    assert (end - start).days == 4
+
+
+def test_other_text_is_no_query():
+    from services.range_query import RangeQueryEngine
+
+    assert RangeQueryEngine(FakeStore(), TZ).answer("Hallo", "de") is None
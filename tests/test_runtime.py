@@ -0,0 +1,107 @@
+"""
+Tests for the message intake of the asyncio runtime, polled and by webhook.
+
+The runtime is imported inside the test: importing it loads `services.twilio_api`,
+which reads the settings once, and that must not happen before `BenchEnvironment`
+of the digest test has configured the environment.
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+
+# Anna sends two commands, the first of which takes longest; Ben sends one
+COMMANDS = [("anna", "3"), ("anna", "1"), ("ben", "2")]
+
+
+def _handler():
+    """
+    Returns a command handler that records the order of the answers and whether two
+    commands ran at the same time.
+    """
+    answered = []
+    running = set()
+    concurrent = threading.Event()
+    lock = threading.Lock()
+
+    def handle_incoming_message(text):
+        with lock:
+            running.add(text)
+            if len(running) > 1:
+                concurrent.set()
+        # The first command takes longest; a concurrent handler would overtake it
+        time.sleep(0.3 if text == "3" else 0.05)
+        with lock:
+            running.discard(text)
+            answered.append(text)
+
+    return handle_incoming_message, answered, concurrent
+
+
+def test_commands_of_one_author_are_answered_in_order(tmp_path, monkeypatch):
+    from services import runtime
+    from services.message_cursor import MessageCursor
+    from services.runtime import Runtime
+
+    messages = [
+        SimpleNamespace(sid=f"IM{i}", index=i, author=author, body=body)
+        for i, (author, body) in enumerate(COMMANDS + [("bot", "menu")])
+    ]
+    polls = iter([messages])
+    handle_incoming_message, answered, concurrent = _handler()
+
+    monkeypatch.setattr(runtime, "get_or_create_conversation", lambda: "CH1")
+    monkeypatch.setattr(runtime, "fetch_new_messages", lambda conversation_sid, cursor: next(polls, []))
+    monkeypatch.setattr(runtime, "handle_incoming_message", handle_incoming_message)
+    monkeypatch.setattr(runtime, "MessageCursor", lambda path: MessageCursor(str(tmp_path / "cursor.json")))
+
+    async def poll_once():
+        task = asyncio.create_task(Runtime().poll_messages())
+        await asyncio.sleep(1)
+        task.cancel()
+
+    asyncio.run(poll_once())
+
+    assert answered.index("3") < answered.index("1")
+    assert sorted(answered) == ["1", "2", "3"]
+    # Different authors are still answered at the same time
+    assert concurrent.is_set()
+
+
+def test_webhook_answers_commands_of_one_author_in_order(tmp_path, monkeypatch):
+    from twilio.request_validator import RequestValidator
+
+    from services import webhook
+    from services.message_cursor import MessageCursor
+    from services.webhook import TwilioWebhook
+
+    handle_incoming_message, answered, concurrent = _handler()
+    monkeypatch.setattr(webhook, "handle_incoming_message", handle_incoming_message)
+    url = "https://bot.example/twilio/conversations"
+    cursor = MessageCursor(str(tmp_path / "cursor.json"))
+    cursor.reset("CH1")
+
+    def request(i, author, body):
+        params = {
+            "EventType": "onMessageAdded", "ConversationSid": "CH1", "MessageSid": f"IM{i}",
+            "Index": str(i), "Author": author, "Body": body
+        }
+        signature = RequestValidator("token").compute_signature(url, params)
+        return SimpleNamespace(form=lambda: params, headers={"x-twilio-signature": signature})
+
+    async def deliver():
+        hook = TwilioWebhook("token", url, "CH1", cursor, workers=4)
+        workers = [asyncio.create_task(hook.run_worker(index)) for index in range(4)]
+        for i, (author, body) in enumerate(COMMANDS):
+            assert (await hook.handle(request(i, author, body))).status == 200
+        await asyncio.sleep(1)
+        for worker in workers:
+            worker.cancel()
+
+    asyncio.run(deliver())
+
+    assert answered.index("3") < answered.index("1")
+    assert sorted(answered) == ["1", "2", "3"]
+    assert concurrent.is_set()
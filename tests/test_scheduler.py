@@ -0,0 +1,145 @@
+"""
+Tests for the heap-backed scheduler and the batches of subscriber jobs.
+"""
+
+import asyncio
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+from services.job_journal import DELIVERED, JobJournal
+from services.scheduler import BatchScheduler, Scheduler
+
+TZ = pytz.timezone("Europe/Berlin")
+
+# How long the idle scheduler is observed, and the CPU time it may use meanwhile
+IDLE_SECONDS = 3.0
+IDLE_CPU_BUDGET = 0.1
+
+
+def test_idle_scheduler_does_not_poll():
+    scheduler = Scheduler(TZ)
+    scheduler.run_at(datetime.now(TZ) + timedelta(hours=1), lambda: None, name="far away")
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+
+    cpu_before = time.process_time()
+    thread.start()
+    time.sleep(IDLE_SECONDS)
+    cpu_used = time.process_time() - cpu_before
+    scheduler.stop()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert cpu_used < IDLE_CPU_BUDGET
+
+
+def test_idle_async_scheduler_does_not_poll():
+    scheduler = Scheduler(TZ)
+    scheduler.run_at(datetime.now(TZ) + timedelta(hours=1), lambda: None, name="far away")
+
+    async def call(func, *args):
+        return func(*args)
+
+    async def observe():
+        task = asyncio.create_task(scheduler.run_async(call))
+        cpu_before = time.process_time()
+        await asyncio.sleep(IDLE_SECONDS)
+        cpu_used = time.process_time() - cpu_before
+        scheduler.stop()
+        await asyncio.wait_for(task, 5)
+        return cpu_used
+
+    assert asyncio.run(observe()) < IDLE_CPU_BUDGET
+
+
+def test_job_added_while_sleeping_runs_on_time():
+    scheduler = Scheduler(TZ)
+    scheduler.run_at(datetime.now(TZ) + timedelta(hours=1), lambda: None, name="far away")
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+
+    ran = threading.Event()
+    scheduler.run_at(datetime.now(TZ) + timedelta(seconds=0.2), ran.set, name="soon")
+    assert ran.wait(timeout=2)
+    scheduler.stop()
+    thread.join(timeout=5)
+
+
+def _pop_job(scheduler):
+    with scheduler._lock:
+        scheduler._drop_cancelled()
+        return heapq.heappop(scheduler._heap)[2] if scheduler._heap else None
+
+
+def _batches(scheduler, handled, delay=0.0):
+    lock = threading.Lock()
+
+    def handle(item):
+        time.sleep(delay)
+        with lock:
+            handled.append(item)
+
+    return BatchScheduler(scheduler, handle, workers=4, name=lambda item: f"digest {item}")
+
+
+def test_batch_job_returns_before_the_batch_is_sent():
+    scheduler = Scheduler(TZ)
+    handled = []
+    batches = _batches(scheduler, handled, delay=0.5)
+    at = (datetime.now(TZ) + timedelta(hours=1)).time()
+    batches.add_all((f"s{i}", at, TZ) for i in range(8))
+
+    started = time.monotonic()
+    _pop_job(scheduler).callback()
+    # A job timeout of the runtime only covers the hand-over
+    assert time.monotonic() - started < 0.2
+    assert batches.join(timeout=5)
+    assert sorted(handled) == sorted(f"s{i}" for i in range(8))
+    # The next day's batch is planned
+    assert list(batches.bucket_sizes().values()) == [8]
+
+
+def test_batch_items_run_at_most_once(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.db"))
+    at = (datetime.now(TZ) + timedelta(hours=1)).time()
+    handled = []
+    # Two processes sharing the journal, e.g. after a leader failover
+    schedulers = [Scheduler(TZ, journal=journal) for _ in range(2)]
+    for scheduler in schedulers:
+        batches = _batches(scheduler, handled)
+        batches.add_all((item, at, TZ) for item in ("anna", "ben"))
+        job = _pop_job(scheduler)
+        job.callback()
+        assert batches.join(timeout=5)
+
+    assert sorted(handled) == ["anna", "ben"]
+    assert journal.state("digest anna", job.next_run) == DELIVERED
+    journal.close()
+
+
+def test_batch_catches_up_missed_runs(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.db"))
+    due = datetime.now(TZ).replace(microsecond=0) - timedelta(minutes=10)
+    # Planned before the bot went down; "ben" is too late to catch up
+    journal.plan_many([("digest anna", due), ("digest ben", due - timedelta(hours=2))])
+
+    scheduler = Scheduler(TZ, journal=journal)
+    handled = []
+    batches = _batches(scheduler, handled)
+    at = (datetime.now(TZ) + timedelta(hours=1)).time()
+    batches.add_all((item, at, TZ) for item in ("anna", "ben"))
+
+    assert batches.catch_up(timedelta(hours=1)) == 1
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    time.sleep(0.5)
+    assert batches.join(timeout=5)
+    scheduler.stop()
+    thread.join(timeout=5)
+
+    assert handled == ["anna"]
+    assert journal.state("digest anna", due) == DELIVERED
+    journal.close()
@@ -0,0 +1,228 @@
+"""
+date_parser.py
+
+Parses German date expressions in incoming messages into date ranges.
+
+Understood are single days ("heute", "übermorgen", "Freitag", "nächsten Freitag",
+"24.12.", "3. Mai", "in 3 Tagen"), spans ("diese Woche", "nächste Woche",
+"Wochenende", "nächsten Monat", "nächste 14 Tage", "die nächsten 2 Wochen") and ranges
+of two days joined by "bis" ("vom 1.5. bis 7.5.", "Montag bis Mittwoch"). Filler words
+such as "Termine am" or "was steht" are ignored, and umlauts may be written as "ae".
+"""
+
+import re
+from datetime import date, datetime, timedelta
+
+# Longest range that may be requested, in days
+MAX_RANGE_DAYS = 366
+
+WEEKDAYS = ("montag", "dienstag", "mittwoch", "donnerstag", "freitag", "samstag", "sonntag")
+# Month names are matched by their first three letters ("mär" is normalized to "mae")
+MONTHS = ("jan", "feb", "mae", "apr", "mai", "jun", "jul", "aug", "sep", "okt", "nov", "dez")
+RELATIVE_DAYS = {"vorgestern": -2, "gestern": -1, "heute": 0, "morgen": 1, "uebermorgen": 2}
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_FILLER = re.compile(
+    r"\b(termine?|was|ist|steht|stehen|habe|hab|ich|zeig|zeige|mir|meine|alle|bitte|"
+    r"fuer|am|vom|von|den|dem|der|die|an|im|ab)\b"
+)
+_NEXT = r"(?:naechste[nrs]?|kommende[nrs]?)"
+_PATTERNS = (
+    ("span_days", re.compile(rf"^{_NEXT} (\d+) (tage?|wochen?)$")),
+    ("in_days", re.compile(r"^in (\d+) (tagen|wochen)$")),
+    ("week", re.compile(rf"^(diese|{_NEXT}) woche$")),
+    ("weekend", re.compile(rf"^(dieses |{_NEXT} )?wochenende$")),
+    ("month", re.compile(rf"^(diese[nr]?|{_NEXT}) monat$")),
+)
+_DAY = re.compile(
+    rf"^(?:(?P<relative>{'|'.join(RELATIVE_DAYS)})"
+    rf"|(?:(?P<which>{_NEXT}|letzte[nrs]?) )?(?P<weekday>{'|'.join(WEEKDAYS)})"
+    r"|(?P<day>\d{1,2})\.\s*(?:(?P<month>\d{1,2})\.?|(?P<month_name>[a-z]{3})[a-z]*\.?)\s*(?P<year>\d{2,4})?)$"
+)
+
+
+def normalize(text):
+    """
+    Lower-cases the text, replaces umlauts and removes filler words and punctuation
+    other than the dots of dates.
+
+    Returns:
+        str: The words of the expression separated by single spaces.
+    """
+    text = text.lower().translate(_UMLAUTS)
+    text = re.sub(r"[^a-z0-9. ]", " ", text)
+    text = re.sub(r"(\d)\.(?=[a-z])", r"\1. ", text)
+    return " ".join(_FILLER.sub(" ", text).split())
+
+
+def parse_date_range(text, today):
+    """
+    Parses a date expression.
+
+    Args:
+        text (str): The message, e.g. "Termine am Freitag" or "nächste 14 Tage".
+        today (date): The current local date.
+
+    Returns:
+        tuple or None: The first and last day (both included) as dates, or None if the
+            text is not a date expression.
+
+    Raises:
+        ValueError: If the range is empty or longer than `MAX_RANGE_DAYS`.
+    """
+    expression = normalize(text)
+    if not expression:
+        return None
+    if " bis " in expression:
+        first_part, last_part = expression.split(" bis ", 1)
+        first = _parse_single(first_part, today)
+        if first is None:
+            return None
+        # A plain weekday as the end means the next such day from the start on, so
+        # "Freitag bis Montag" runs over the weekend
+        match = _DAY.match(last_part)
+        if match and match["weekday"] and not match["which"]:
+            day = _weekday(WEEKDAYS.index(match["weekday"]), "", first[0])
+            last = day, day
+        else:
+            last = _parse_single(last_part, today)
+        if last is None:
+            return None
+        result = (first[0], last[1])
+    else:
+        result = _parse_single(expression, today)
+        if result is None:
+            return None
+
+    first, last = result
+    if last < first:
+        raise ValueError("Das Ende des Zeitraums liegt vor seinem Anfang.")
+    if (last - first).days >= MAX_RANGE_DAYS:
+        raise _too_long()
+    return result
+
+
+def _too_long():
+    return ValueError(f"Der Zeitraum ist zu lang (höchstens {MAX_RANGE_DAYS} Tage).")
+
+
+def _parse_single(expression, today):
+    """
+    Parses a day or span without "bis" into (first day, last day).
+    """
+    for kind, pattern in _PATTERNS:
+        match = pattern.match(expression)
+        if match:
+            return _SPANS[kind](match, today)
+
+    match = _DAY.match(expression)
+    if match is None:
+        return None
+    if match["relative"]:
+        day = today + timedelta(days=RELATIVE_DAYS[match["relative"]])
+    elif match["weekday"]:
+        day = _weekday(WEEKDAYS.index(match["weekday"]), match["which"] or "", today)
+    else:
+        day = _date(match, today)
+    return day, day
+
+
+def _span_days(match, today):
+    # Checked before building the timedelta, which overflows for huge counts
+    count = int(match[1]) * (7 if match[2].startswith("woche") else 1)
+    if count < 1:
+        raise ValueError("Der Zeitraum muss mindestens einen Tag umfassen.")
+    if count > MAX_RANGE_DAYS:
+        raise _too_long()
+    return today, today + timedelta(days=count - 1)
+
+
+def _in_days(match, today):
+    count = int(match[1]) * (7 if match[2] == "wochen" else 1)
+    if count > MAX_RANGE_DAYS:
+        raise _too_long()
+    day = today + timedelta(days=count)
+    return day, day
+
+
+def _week(match, today):
+    monday = today - timedelta(days=today.weekday())
+    if match[1] == "diese":
+        return today, monday + timedelta(days=6)
+    return monday + timedelta(days=7), monday + timedelta(days=13)
+
+
+def _weekend(match, today):
+    saturday = today + timedelta(days=5 - today.weekday())
+    if match[1] and not match[1].startswith("dieses"):
+        saturday += timedelta(days=7)
+    return max(saturday, today), saturday + timedelta(days=1)
+
+
+def _month(match, today):
+    first = today.replace(day=1)
+    if not match[1].startswith("diese"):
+        first = (first + timedelta(days=32)).replace(day=1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return max(first, today), last
+
+
+_SPANS = {"span_days": _span_days, "in_days": _in_days, "week": _week, "weekend": _weekend, "month": _month}
+
+
+def _weekday(weekday, which, today):
+    """
+    Resolves a weekday: plain names mean today or the next such day, "nächsten" the one
+    of next week and "letzten" the most recent one before today.
+    """
+    if which.startswith("letzte"):
+        return today - timedelta(days=(today.weekday() - weekday - 1) % 7 + 1)
+    if which:
+        monday = today - timedelta(days=today.weekday())
+        return monday + timedelta(days=7 + weekday)
+    return today + timedelta(days=(weekday - today.weekday()) % 7)
+
+
+def _date(match, today):
+    """
+    Resolves a calendar date; without a year, the occurrence closest to today is meant.
+    """
+    if match["month_name"]:
+        if match["month_name"] not in MONTHS:
+            raise ValueError(f"Unbekannter Monat '{match['month_name']}'.")
+        month = MONTHS.index(match["month_name"]) + 1
+    else:
+        month = int(match["month"])
+    day = int(match["day"])
+    try:
+        if match["year"]:
+            year = int(match["year"])
+            return date(year + 2000 if year < 100 else year, month, day)
+        candidates = []
+        for year in (today.year - 1, today.year, today.year + 1):
+            try:
+                candidates.append(date(year, month, day))
+            except ValueError:
+                pass  # 29.2. outside of leap years
+        if not candidates:
+            raise ValueError
+    except ValueError:
+        raise ValueError(f"Ungültiges Datum {day}.{month}.") from None
+    return min(candidates, key=lambda candidate: abs((candidate - today).days))
+
+
+def day_bounds(first, last, tz):
+    """
+    Converts a range of days into a time range.
+
+    Args:
+        first (date): The first day.
+        last (date): The last day, included.
+        tz (pytz.tzinfo.BaseTzInfo): The local timezone.
+
+    Returns:
+        tuple: The tz-aware start of `first` and the start of the day after `last`.
+    """
+    start = tz.localize(datetime.combine(first, datetime.min.time()))
+    end = tz.localize(datetime.combine(last + timedelta(days=1), datetime.min.time()))
+    return start, end
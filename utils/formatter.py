@@ -1,213 +1,410 @@
-import datetime
-from collections import defaultdict
+from utils.settings import get_settings
+
+# Localized names and message templates. Weekday and month names are indexed by
+# `date.weekday()` and `date.month - 1`, so rendering does not depend on the system locale.
+LOCALES = {
+    "de": {
+        "weekdays": ("Montag", "Dienstag", "Mittwoch", "Donnerstag", "Freitag", "Samstag", "Sonntag"),
+        "months": (
+            "Januar", "Februar", "März", "April", "Mai", "Juni",
+            "Juli", "August", "September", "Oktober", "November", "Dezember"
+        ),
+        "date": "{weekday}, {day}. {month}",
+        "line": "\U0001F552 {time} – {summary}\n",
+        "line_note": "\U0001F552 {time} – {summary} ({note})\n",
+        "today_empty": "\U0001F4C5 Keine Termine für heute.",
+        "today_header": "\U0001F4C5 Dein Tagesplan für {date}:\n\n",
+        "today_footer": "\n\U0001F4DD Insgesamt {count} Termine heute.\n\u2705 Viel Erfolg!",
+        "tomorrow_empty": "\U0001F4C5 Keine Termine für morgen.",
+        "tomorrow_header": "\U0001F4C5 Dein Tagesplan für {date}:\n\n",
+        "tomorrow_footer": "\n\U0001F4DD Insgesamt {count} Termine morgen.\n\u2705 Viel Erfolg!",
+        "week_empty": "\U0001F4C5 Keine Termine diese Woche.",
+        "week_header": "\U0001F4C5 Dein Wochenplan:\n",
+        "week_day": "\n\U0001F4CC {date}:\n",
+        "week_footer": "\n\U0001F4DD Insgesamt {count} Termine diese Woche.\n\u2705 Viel Erfolg!",
+        "next_empty": "\U0001F4C5 Keine Termine für heute.",
+        "next_header": "\U0001F4C5 Dein nächster Termin ist am {date}:\n\n",
+        "next_footer": "\n\u2705 Viel Erfolg!",
+        "alert": "\u23F0 In {minutes} Minuten: {time} – {summary}",
+        "range_day": "am {date}",
+        "range": "vom {first} bis {last}",
+        "range_empty": "\U0001F4C5 Keine Termine {range}.",
+        "range_header": "\U0001F4C5 Deine Termine {range}:\n",
+        "range_footer": "\n\U0001F4DD Insgesamt {count} Termine.\n\u2705 Viel Erfolg!",
+        "free_empty": "\U0001F4C5 Heute keine freien Zeiten mehr.",
+        "free_header": "\U0001F7E2 Deine freien Zeiten am {date}:\n\n",
+        "free_line": "\U0001F552 {start}–{end} ({duration})\n",
+        "free_footer": "\n\U0001F4DD Insgesamt {duration} frei.",
+        "conflicts_empty": "\u2705 Keine Überschneidungen diese Woche.",
+        "conflicts_header": "\u26A0\uFE0F Überschneidungen diese Woche:\n",
+        "conflict": "\U0001F552 {first_time} {first} \u2194 {second_time} {second}\n",
+        "conflicts_footer": "\n\U0001F4DD Insgesamt {count} Überschneidungen.",
+    },
+    "en": {
+        "weekdays": ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"),
+        "months": (
+            "January", "February", "March", "April", "May", "June",
+            "July", "August", "September", "October", "November", "December"
+        ),
+        "date": "{weekday}, {month} {day}",
+        "line": "\U0001F552 {time} – {summary}\n",
+        "line_note": "\U0001F552 {time} – {summary} ({note})\n",
+        "today_empty": "\U0001F4C5 No events for today.",
+        "today_header": "\U0001F4C5 Your schedule for {date}:\n\n",
+        "today_footer": "\n\U0001F4DD A total of {count} events today.\n\u2705 Good luck!",
+        "tomorrow_empty": "\U0001F4C5 No events for tomorrow.",
+        "tomorrow_header": "\U0001F4C5 Your schedule for {date}:\n\n",
+        "tomorrow_footer": "\n\U0001F4DD A total of {count} events tomorrow.\n\u2705 Good luck!",
+        "week_empty": "\U0001F4C5 No events scheduled this week.",
+        "week_header": "\U0001F4C5 Your week:\n",
+        "week_day": "\n\U0001F4CC {date}:\n",
+        "week_footer": "\n\U0001F4DD A total of {count} events this week.\n\u2705 Good luck!",
+        "next_empty": "\U0001F4C5 No upcoming events.",
+        "next_header": "\U0001F4C5 Your next event is on {date}:\n\n",
+        "next_footer": "\n\u2705 Good luck!",
+        "alert": "\u23F0 In {minutes} minutes: {time} – {summary}",
+        "range_day": "on {date}",
+        "range": "from {first} to {last}",
+        "range_empty": "\U0001F4C5 No events {range}.",
+        "range_header": "\U0001F4C5 Your events {range}:\n",
+        "range_footer": "\n\U0001F4DD A total of {count} events.\n\u2705 Good luck!",
+        "free_empty": "\U0001F4C5 No free time left today.",
+        "free_header": "\U0001F7E2 Your free time on {date}:\n\n",
+        "free_line": "\U0001F552 {start}–{end} ({duration})\n",
+        "free_footer": "\n\U0001F4DD {duration} free in total.",
+        "conflicts_empty": "\u2705 No overlapping events this week.",
+        "conflicts_header": "\u26A0\uFE0F Overlapping events this week:\n",
+        "conflict": "\U0001F552 {first_time} {first} \u2194 {second_time} {second}\n",
+        "conflicts_footer": "\n\U0001F4DD A total of {count} overlaps.",
+    },
+}
+
+
+class Formatter:
+    """
+    Renders event lists into messages for one locale.
+
+    The locale tables are looked up once on construction; messages are assembled from a
+    list of parts joined at the end.
+    """
+
+    def __init__(self, locale="de"):
+        """
+        :param locale: Key into LOCALES, e.g. "de" or "en".
+        """
+        self.texts = LOCALES[locale]
+        self._weekdays = self.texts["weekdays"]
+        self._months = self.texts["months"]
+        self._date = self.texts["date"]
+        self._line = self.texts["line"]
+
+    def format_date(self, dt):
+        """
+        Render a date like "Montag, 1. April" without relying on the system locale.
+
+        :param dt: A date or datetime.
+        :return: The localized date string.
+        """
+        return self._date.format(weekday=self._weekdays[dt.weekday()], day=dt.day, month=self._months[dt.month - 1])
+
+    def format_day(self, event_list, kind, notes=None):
+        """
+        Render a single-day plan ("today", "tomorrow") or the next event ("next").
+
+        :param event_list: List of Event objects.
+        :param kind: Selects the templates, one of "today", "tomorrow", "next".
+        :param notes: Optional dict of a short note per event, e.g. the forecast at its start.
+        :return: The formatted message string.
+        """
+        texts = self.texts
+        events = sorted(event_list, key=_start)
+        if not events:
+            return texts[f"{kind}_empty"]
+
+        parts = [texts[f"{kind}_header"].format(date=self.format_date(events[0].start))]
+        line = self._line
+        line_note = texts["line_note"]
+        notes = notes or {}
+        for event in events:
+            note = notes.get(event)
+            if note:
+                parts.append(line_note.format(time=_time(event.start), summary=event.summary, note=note))
+            else:
+                parts.append(line.format(time=_time(event.start), summary=event.summary))
+        parts.append(texts[f"{kind}_footer"].format(count=len(events)))
+        return "".join(parts)
+
+    def format_week(self, event_list, ordered=False):
+        """
+        Render a week plan grouped by day in a single pass over the sorted events.
+
+        :param event_list: Iterable of Event objects.
+        :param ordered: The events already come in start-time order (e.g. from
+            `stream_events`); they are then rendered as they arrive, without a copy.
+        :return: The formatted message string.
+        """
+        texts = self.texts
+        return self._format_by_day(event_list, ordered, texts["week_header"], texts["week_footer"], texts["week_empty"])
+
+    def format_range(self, event_list, first, last):
+        """
+        Render the events of any range of days, grouped by day.
+
+        :param event_list: Iterable of Event objects.
+        :param first: The first day of the range.
+        :param last: The last day of the range, included.
+        :return: The formatted message string.
+        """
+        texts = self.texts
+        if first == last:
+            label = texts["range_day"].format(date=self.format_date(first))
+        else:
+            label = texts["range"].format(first=self.format_date(first), last=self.format_date(last))
+        return self._format_by_day(
+            event_list, False, texts["range_header"].format(range=label), texts["range_footer"],
+            texts["range_empty"].format(range=label)
+        )
+
+    def _format_by_day(self, event_list, ordered, header, footer, empty):
+        """
+        Render events grouped by day in a single pass over the sorted events.
+        """
+        events = event_list if ordered else sorted(event_list, key=_start)
+
+        parts = [header]
+        week_day = self.texts["week_day"]
+        line = self._line
+        current_date = None
+        count = 0
+        for event in events:
+            start = event.start
+            event_date = start.date()
+            if event_date != current_date:
+                current_date = event_date
+                parts.append(week_day.format(date=self.format_date(start)))
+            parts.append(line.format(time=_time(start), summary=event.summary))
+            count += 1
+        if not count:
+            return empty
+        parts.append(footer.format(count=count))
+        return "".join(parts)
+
+    def format_alert(self, event, minutes):
+        """
+        Render the reminder shortly before an event.
+
+        :param event: The upcoming Event.
+        :param minutes: Minutes left until it starts.
+        :return: The formatted message string.
+        """
+        return self.texts["alert"].format(minutes=minutes, time=_time(event.start), summary=event.summary)
+
+    def format_free_slots(self, slots):
+        """
+        Render the free slots of a day with their lengths.
+
+        :param slots: List of (start, end) datetime pairs.
+        :return: The formatted message string.
+        """
+        texts = self.texts
+        if not slots:
+            return texts["free_empty"]
+
+        parts = [texts["free_header"].format(date=self.format_date(slots[0][0]))]
+        line = texts["free_line"]
+        total = 0
+        for start, end in slots:
+            seconds = (end - start).total_seconds()
+            total += seconds
+            parts.append(line.format(start=_time(start), end=_time(end), duration=_duration(seconds)))
+        parts.append(texts["free_footer"].format(duration=_duration(total)))
+        return "".join(parts)
+
+    def format_conflicts(self, conflicts):
+        """
+        Render pairs of overlapping events, grouped by the day the later one starts.
+
+        :param conflicts: List of (earlier, later) Event pairs.
+        :return: The formatted message string.
+        """
+        texts = self.texts
+        if not conflicts:
+            return texts["conflicts_empty"]
+
+        parts = [texts["conflicts_header"]]
+        week_day = texts["week_day"]
+        conflict = texts["conflict"]
+        current_date = None
+        for first, second in conflicts:
+            start = second.start
+            if start.date() != current_date:
+                current_date = start.date()
+                parts.append(week_day.format(date=self.format_date(start)))
+            parts.append(conflict.format(
+                first_time=_time(first.start), first=first.summary, second_time=_time(start), second=second.summary
+            ))
+        parts.append(texts["conflicts_footer"].format(count=len(conflicts)))
+        return "".join(parts)
+
+
+def _start(event):
+    return event.start
+
+
+def _time(dt):
+    return f"{dt.hour:02d}:{dt.minute:02d}"
+
+
+def _duration(seconds):
+    minutes = int(seconds // 60)
+    return f"{minutes // 60}:{minutes % 60:02d} h"
+
+
+_formatters = {}
+
+
+def get_formatter(locale=None):
+    """
+    Return the shared formatter for a locale.
+
+    :param locale: Key into LOCALES; defaults to the 'MESSAGE_LANGUAGE' variable or "de".
+    :return: A Formatter instance, created once per locale.
+    """
+    locale = locale or get_settings().message_language
+    if locale not in LOCALES:
+        locale = "de"
+    formatter = _formatters.get(locale)
+    if formatter is None:
+        formatter = _formatters[locale] = Formatter(locale)
+    return formatter
 
 
-def format_today(event_list):
+def format_today(event_list, locale=None, notes=None):
     """
     Generate a formatted message for today's events.
 
-    :param event_list: List of event entries.
+    :param event_list: List of Event objects.
+    :param locale: Optional locale key, see get_formatter.
+    :param notes: Optional dict of a short note per event, see Formatter.format_day.
     :return: A formatted message string for today's events.
     """
-    events = []
-    for entry in event_list:
-        if not entry.startswith("–"):
-            continue
-        entry = entry.lstrip("– ").strip()
-        timestamp, description = entry.split(" Uhr: ", 1)
-        if timestamp.endswith("Z"):
-            timestamp = timestamp[:-1] + "+00:00"
-        dt = datetime.datetime.fromisoformat(timestamp)
-        time_str = dt.strftime("%H:%M")
-        events.append((dt, time_str, description))
-
-    events.sort(key=lambda x: x[0])
-
-    if not events:
-        return "\U0001F4C5 Keine Termine für heute."
-
-    dt0 = events[0][0]
-    weekday = dt0.strftime("%A")
-    day = dt0.day
-    month = dt0.strftime("%B")
-
-    weekday_map = {
-        "Monday": "Montag", "Tuesday": "Dienstag", "Wednesday": "Mittwoch",
-        "Thursday": "Donnerstag", "Friday": "Freitag", "Saturday": "Samstag", "Sunday": "Sonntag"
-    }
-    month_map = {
-        "January": "Januar", "February": "Februar", "March": "März", "April": "April",
-        "May": "Mai", "June": "Juni", "July": "Juli", "August": "August",
-        "September": "September", "October": "Oktober", "November": "November", "December": "Dezember"
-    }
-
-    weekday_de = weekday_map[weekday]
-    month_de = month_map[month]
-
-    header = f"\U0001F4C5 Dein Tagesplan für {weekday_de}, {day}. {month_de}:\n\n"
-    body = ""
-    for _, time_str, description in events:
-        body += f"\U0001F552 {time_str} – {description}\n"
-    footer = f"\n\U0001F4DD Insgesamt {len(events)} Termine heute.\n\u2705 Viel Erfolg!"
-    final_message = header + body + footer
-
-    return final_message
-
-
-def format_tomorrow(event_list):
+    return get_formatter(locale).format_day(event_list, "today", notes)
+
+
+def format_tomorrow(event_list, locale=None):
     """
     Generate a formatted message for tomorrow's events.
 
-    :param event_list: List of event entries.
+    :param event_list: List of Event objects.
+    :param locale: Optional locale key, see get_formatter.
     :return: A formatted message string for tomorrow's events.
     """
-    events = []
-    for entry in event_list:
-        if not entry.startswith("–"):
-            continue
-        entry = entry.lstrip("– ").strip()
-        timestamp, description = entry.split(" Uhr: ", 1)
-        if timestamp.endswith("Z"):
-            timestamp = timestamp[:-1] + "+00:00"
-        dt = datetime.datetime.fromisoformat(timestamp)
-        time_str = dt.strftime("%H:%M")
-        events.append((dt, time_str, description))
-
-    events.sort(key=lambda x: x[0])
-
-    if not events:
-        return "\U0001F4C5 Keine Termine für morgen."
-
-    dt0 = events[0][0]
-    weekday = dt0.strftime("%A")
-    day = dt0.day
-    month = dt0.strftime("%B")
-
-    weekday_map = {
-        "Monday": "Montag", "Tuesday": "Dienstag", "Wednesday": "Mittwoch",
-        "Thursday": "Donnerstag", "Friday": "Freitag", "Saturday": "Samstag", "Sunday": "Sonntag"
-    }
-    month_map = {
-        "January": "Januar", "February": "Februar", "March": "März", "April": "April",
-        "May": "Mai", "June": "Juni", "July": "Juli", "August": "August",
-        "September": "September", "October": "Oktober", "November": "November", "December": "Dezember"
-    }
-
-    weekday_de = weekday_map[weekday]
-    month_de = month_map[month]
-
-    header = f"\U0001F4C5 Dein Tagesplan für {weekday_de}, {day}. {month_de}:\n\n"
-    body = ""
-    for _, time_str, description in events:
-        body += f"\U0001F552 {time_str} – {description}\n"
-    footer = f"\n\U0001F4DD Insgesamt {len(events)} Termine morgen.\n\u2705 Viel Erfolg!"
-    final_message = header + body + footer
-
-    return final_message
-
-
-def format_week(event_list):
+    return get_formatter(locale).format_day(event_list, "tomorrow")
+
+
+def format_week(event_list, locale=None, ordered=False):
     """
     Generate a formatted message for all events in the current week.
 
-    :param event_list: List of event entries.
+    :param event_list: Iterable of Event objects.
+    :param locale: Optional locale key, see get_formatter.
+    :param ordered: The events are already in start-time order, see Formatter.format_week.
     :return: A formatted message string representing the week's events.
     """
-    events = []
-    for entry in event_list:
-        if not entry.startswith("–"):
-            continue
-        entry = entry.lstrip("– ").strip()
-        timestamp, description = entry.split(" Uhr: ", 1)
-        if timestamp.endswith("Z"):
-            timestamp = timestamp[:-1] + "+00:00"
-        dt = datetime.datetime.fromisoformat(timestamp)
-        time_str = dt.strftime("%H:%M")
-        events.append((dt, time_str, description))
-
-    events.sort(key=lambda x: x[0])
-
-    if not events:
-        return "\U0001F4C5 Keine Termine diese Woche."
-
-    weekday_map = {
-        "Monday": "Montag", "Tuesday": "Dienstag", "Wednesday": "Mittwoch",
-        "Thursday": "Donnerstag", "Friday": "Freitag", "Saturday": "Samstag", "Sunday": "Sonntag"
-    }
-    month_map = {
-        "January": "Januar", "February": "Februar", "March": "März", "April": "April",
-        "May": "Mai", "June": "Juni", "July": "Juli", "August": "August",
-        "September": "September", "October": "Oktober", "November": "November", "December": "Dezember"
-    }
-
-    grouped_events = defaultdict(list)
-    for dt, time_str, description in events:
-        date_key = dt.date()
-        grouped_events[date_key].append((dt, time_str, description))
-
-    header = "\U0001F4C5 Dein Wochenplan:\n"
-    body = ""
-
-    for date_key in sorted(grouped_events):
-        dt_sample = grouped_events[date_key][0][0]
-        weekday = weekday_map[dt_sample.strftime("%A")]
-        day = dt_sample.day
-        month = month_map[dt_sample.strftime("%B")]
-        body += f"\n\U0001F4CC {weekday}, {day}. {month}:\n"
-        for _, time_str, description in grouped_events[date_key]:
-            body += f"\U0001F552 {time_str} – {description}\n"
-
-    footer = f"\n\U0001F4DD Insgesamt {len(events)} Termine diese Woche.\n\u2705 Viel Erfolg!"
-    final_message = header + body + footer
-
-    return final_message
-
-
-def format_next_event(event_list):
+    return get_formatter(locale).format_week(event_list, ordered)
+
+
+def format_next_event(event_list, locale=None):
     """
     Generate a formatted message for the next event.
 
-    :param event_list: List of event entries.
+    :param event_list: List of Event objects.
+    :param locale: Optional locale key, see get_formatter.
     :return: A formatted message string for the next event.
     """
-    events = []
-    for entry in event_list:
-        if not entry.startswith("–"):
-            continue
-        entry = entry.lstrip("– ").strip()
-        timestamp, description = entry.split(" Uhr: ", 1)
-        if timestamp.endswith("Z"):
-            timestamp = timestamp[:-1] + "+00:00"
-        dt = datetime.datetime.fromisoformat(timestamp)
-        time_str = dt.strftime("%H:%M")
-        events.append((dt, time_str, description))
-
-    if not events:
-        return "\U0001F4C5 Keine Termine für heute."
-
-    dt0 = events[0][0]
-    weekday = dt0.strftime("%A")
-    day = dt0.day
-    month = dt0.strftime("%B")
-
-    weekday_map = {
-        "Monday": "Montag", "Tuesday": "Dienstag", "Wednesday": "Mittwoch",
-        "Thursday": "Donnerstag", "Friday": "Freitag", "Saturday": "Samstag", "Sunday": "Sonntag"
-    }
-    month_map = {
-        "January": "Januar", "February": "Februar", "March": "März", "April": "April",
-        "May": "Mai", "June": "Juni", "July": "Juli", "August": "August",
-        "September": "September", "October": "Oktober", "November": "November", "December": "Dezember"
-    }
-
-    weekday_de = weekday_map[weekday]
-    month_de = month_map[month]
-
-    header = f"\U0001F4C5 Dein nächster Termin ist am {weekday_de}, {day}. {month_de}:\n\n"
-    body = ""
-    for _, time_str, description in events:
-        body += f"\U0001F552 {time_str} – {description}\n"
-    footer = f"\n\u2705 Viel Erfolg!"
-    final_message = header + body + footer
-
-    return final_message
+    return get_formatter(locale).format_day(event_list, "next")
+
+
+def format_range(event_list, first, last, locale=None):
+    """
+    Generate a formatted message for the events of a range of days.
+
+    :param event_list: Iterable of Event objects.
+    :param first: The first day of the range.
+    :param last: The last day of the range, included.
+    :param locale: Optional locale key, see get_formatter.
+    :return: A formatted message string.
+    """
+    return get_formatter(locale).format_range(event_list, first, last)
+
+
+def split_message(text, limit):
+    """
+    Split a long message into parts of at most `limit` characters.
+
+    Parts end at a blank line (e.g. between days) where possible, otherwise at a line
+    break; only a single line longer than the limit is cut.
+
+    :param text: The message.
+    :param limit: The maximum length of a part.
+    :return: A list of parts; just [text] if it fits.
+    """
+    if len(text) <= limit:
+        return [text]
+    parts = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            # Prefer the last blank line, unless that leaves the part less than half full
+            cut = current.rfind("\n\n")
+            if cut < limit // 2:
+                cut = len(current) - 1
+            parts.append(current[:cut + 1])
+            current = current[cut + 1:]
+            if len(current) + len(line) > limit:
+                parts.append(current)
+                current = ""
+        current += line
+    if current:
+        parts.append(current)
+    return [part.strip("\n") for part in parts if part.strip()]
+
+
+def format_free_slots(slots, locale=None):
+    """
+    Generate a formatted message for today's free time.
+
+    :param slots: List of (start, end) datetime pairs.
+    :param locale: Optional locale key, see get_formatter.
+    :return: A formatted message string.
+    """
+    return get_formatter(locale).format_free_slots(slots)
+
+
+def format_conflicts(conflicts, locale=None):
+    """
+    Generate a formatted message for overlapping events.
+
+    :param conflicts: List of (earlier, later) Event pairs.
+    :param locale: Optional locale key, see get_formatter.
+    :return: A formatted message string.
+    """
+    return get_formatter(locale).format_conflicts(conflicts)
+
+
+def format_alert(event, minutes, locale=None):
+    """
+    Generate the reminder message sent shortly before an event.
+
+    :param event: The upcoming Event.
+    :param minutes: Minutes left until it starts.
+    :param locale: Optional locale key, see get_formatter.
+    :return: A formatted message string.
+    """
+    return get_formatter(locale).format_alert(event, minutes)
@@ -0,0 +1,170 @@
+"""
+http_server.py
+
+A minimal asyncio HTTP/1.1 server for the bot's local endpoints (webhooks, metrics).
+
+Only what the endpoints need is supported: one request per connection, bodies with
+Content-Length, and routing on method and path.
+"""
+
+import asyncio
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+# Limits for a single request
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+READ_TIMEOUT_SECONDS = 10
+
+
+class Request:
+    """
+    A parsed HTTP request.
+
+    Attributes:
+        method (str): The request method, e.g. "POST".
+        path (str): The path without the query string.
+        query (dict): The query string parameters.
+        headers (dict): The request headers with lower-case names.
+        body (bytes): The raw request body.
+    """
+
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = dict(parse_qsl(url.query))
+        self.headers = headers
+        self.body = body
+
+    def form(self):
+        """
+        Returns:
+            dict: The parameters of a form-encoded body.
+        """
+        return dict(parse_qsl(self.body.decode("utf-8"), keep_blank_values=True))
+
+
+class Response:
+    """
+    An HTTP response returned by a route handler.
+    """
+
+    __slots__ = ("status", "body", "content_type")
+
+    def __init__(self, status=200, body=b"", content_type="text/plain; charset=utf-8"):
+        self.status = status
+        self.body = body.encode("utf-8") if isinstance(body, str) else body
+        self.content_type = content_type
+
+
+class HttpServer:
+    """
+    Serves registered async route handlers on one host and port.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self._routes = {}
+        self._server = None
+
+    def route(self, method, path, handler):
+        """
+        Registers a handler for a method and path.
+
+        Args:
+            method (str): The HTTP method, e.g. "POST".
+            path (str): The exact request path.
+            handler (Callable[[Request], Awaitable[Response]]): The async request handler.
+        """
+        self._routes[(method, path)] = handler
+
+    async def start(self):
+        """
+        Starts listening for connections.
+        """
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # With port 0 the OS picks a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"🌐 HTTP-Server lauscht auf {self.host}:{self.port}")
+
+    async def stop(self):
+        """
+        Stops accepting connections and waits for the listener to close.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(self._read_request(reader), READ_TIMEOUT_SECONDS)
+            if request is None:
+                response = Response(HTTPStatus.BAD_REQUEST, "Bad Request")
+            else:
+                handler = self._routes.get((request.method, request.path))
+                if handler is None:
+                    response = Response(HTTPStatus.NOT_FOUND, "Not Found")
+                else:
+                    response = await handler(request)
+        except asyncio.TimeoutError:
+            response = Response(HTTPStatus.REQUEST_TIMEOUT, "Request Timeout")
+        except Exception as e:
+            print(f"❌ Fehler bei der HTTP-Anfrage: {e}")
+            response = Response(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal Server Error")
+
+        try:
+            writer.write(self._encode(response))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """
+        Reads and parses one request, or returns None if it is malformed or too large.
+        """
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return None
+        if len(head) > MAX_HEADER_BYTES:
+            return None
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+            if length > MAX_BODY_BYTES:
+                return None
+            body = await reader.readexactly(length) if length else b""
+        except (ValueError, asyncio.IncompleteReadError):
+            return None
+        return Request(method, target, headers, body)
+
+    @staticmethod
+    def _encode(response):
+        reason = HTTPStatus(response.status).phrase
+        head = (
+            f"HTTP/1.1 {int(response.status)} {reason}\r\n"
+            f"Content-Type: {response.content_type}\r\n"
+            f"Content-Length: {len(response.body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        return head.encode("latin-1") + response.body
@@ -0,0 +1,282 @@
+"""
+metrics.py
+
+Process metrics in the Prometheus text format.
+
+Counters and histograms are updated where things happen (API calls, commands,
+scheduled jobs); statistics that components already keep (`stats` dicts, `metrics()`
+methods) are read through collectors when `/metrics` is scraped, so they cost nothing
+in between. `serve_metrics` exposes the registry via the bot's small HTTP server.
+"""
+
+import bisect
+import threading
+import time
+from http import HTTPStatus
+
+from utils.http_server import HttpServer, Response
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds (seconds) of the latency buckets: API calls take milliseconds to seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base class of a metric with optional labels.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(key, value))
+        return lines
+
+    def _samples(self, key, value):
+        return [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"]
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, e.g. handled commands.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that is set to the latest measurement, e.g. the reminder lag.
+    """
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """
+    A distribution of observed values in cumulative buckets, e.g. call latencies.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """
+        Returns:
+            Timer: A context manager that observes the duration of its block.
+        """
+        return Timer(self, labels)
+
+    def _samples(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Timer:
+    """
+    Observes the wall time of a `with` block in a histogram, also when it raises.
+    """
+
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    """
+    The set of metrics and collectors rendered on a scrape.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def register_stats(self, prefix, source, help, counters=()):
+        """
+        Exposes a statistics dict that a component already keeps.
+
+        Each numeric entry becomes a metric named `<prefix>_<key>`; entries listed in
+        `counters` are exported as counters (with a `_total` suffix), all others as
+        gauges. Entries that are None are left out.
+
+        Args:
+            prefix (str): The metric name prefix, e.g. "morningsync_outbox".
+            source (Callable[[], dict]): Returns the current statistics.
+            help (str): Describes the component.
+            counters (Iterable[str]): The keys that only ever increase.
+        """
+        with self._lock:
+            self._collectors.append((prefix, source, help, frozenset(counters)))
+
+    def render(self):
+        """
+        Returns:
+            str: All metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for prefix, source, help, counters in collectors:
+            try:
+                stats = source()
+            except Exception as e:
+                print(f"⚠️ Metriken für {prefix} nicht verfügbar: {e}")
+                continue
+            for key, value in sorted(stats.items()):
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                kind = "counter" if key in counters else "gauge"
+                name = f"{prefix}_{key}_total" if kind == "counter" else f"{prefix}_{key}"
+                lines += [f"# HELP {name} {help}: {key}", f"# TYPE {name} {kind}", f"{name} {_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+# Registry served on /metrics
+REGISTRY = Registry()
+
+API_LATENCY = REGISTRY.histogram(
+    "morningsync_api_request_seconds", "Latency of calls to external APIs", labels=("api", "operation")
+)
+API_ERRORS = REGISTRY.counter(
+    "morningsync_api_errors_total", "Failed calls to external APIs", labels=("api", "operation")
+)
+COMMANDS_HANDLED = REGISTRY.counter("morningsync_commands_total", "Incoming commands handled", labels=("command",))
+COMMAND_LATENCY = REGISTRY.histogram(
+    "morningsync_command_seconds", "Time to answer a command, up to enqueueing the reply", labels=("command",)
+)
+JOB_LAG = REGISTRY.histogram(
+    "morningsync_job_lag_seconds", "Delay between a scheduled job's due time and its start",
+    buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0)
+)
+REMINDER_LAG = REGISTRY.gauge(
+    "morningsync_reminder_lag_seconds", "Delay of the last daily reminder behind its scheduled time"
+)
+
+
+class ApiCall:
+    """
+    Times an external API call and counts it as failed if the block raises.
+
+        with ApiCall("twilio", "messages.create"):
+            ...
+    """
+
+    __slots__ = ("api", "operation", "started")
+
+    def __init__(self, api, operation):
+        self.api = api
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        API_LATENCY.observe(time.perf_counter() - self.started, api=self.api, operation=self.operation)
+        if exc_type is not None:
+            API_ERRORS.inc(api=self.api, operation=self.operation)
+
+
+async def serve_metrics(host, port, registry=REGISTRY):
+    """
+    Starts an HTTP server answering `GET /metrics`.
+
+    Returns:
+        HttpServer: The started server; stop it with `await server.stop()`.
+    """
+    async def metrics(request):
+        return Response(HTTPStatus.OK, registry.render(), content_type=CONTENT_TYPE)
+
+    server = HttpServer(host, port)
+    server.route("GET", "/metrics", metrics)
+    await server.start()
+    return server
@@ -0,0 +1,258 @@
+"""
+settings.py
+
+The bot's configuration as an immutable snapshot.
+
+All variables are read from the process environment and the `.env` file, parsed and
+validated once into a `Settings` object. Hot paths read its attributes instead of
+calling `load_dotenv`/`os.getenv` again. A watcher thread checks the modification time
+of `.env` and swaps in a new snapshot when the file changes; listeners registered with
+`on_change` are told which fields differ, e.g. so the scheduler can move the reminder.
+Variables set in the real environment take precedence over the file, as with
+`load_dotenv`.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from dotenv import dotenv_values
+
+from utils.time_parse import parse_time_of_day, parse_weekly_time
+
+ENV_PATH = ".env"
+# Seconds between two checks of the .env modification time
+WATCH_INTERVAL_SECONDS = 5
+
+
+def _bool(value):
+    return value.strip().lower() == "true"
+
+
+def _minutes(value):
+    return timedelta(minutes=float(value))
+
+
+def _lower(value):
+    return value.strip().lower()
+
+
+# (field, variable, parser, default); empty variables count as unset
+FIELDS = (
+    # Calendar and digest
+    ("daily_reminder_time", "DAILY_REMINDER_TIME", parse_time_of_day, parse_time_of_day("08:00")),
+    ("weekly_summary_time", "WEEKLY_SUMMARY_TIME", parse_weekly_time, None),
+    ("digest_lead", "DIGEST_LEAD_MINUTES", _minutes, timedelta(minutes=5)),
+    ("digest_workers", "DIGEST_WORKERS", int, 16),
+    ("alert_lead", "EVENT_ALERT_MINUTES", _minutes, None),
+    ("job_journal_path", "JOB_JOURNAL_PATH", str, "job_journal.db"),
+    ("catch_up_grace", "CATCH_UP_GRACE_MINUTES", _minutes, timedelta(minutes=60)),
+    ("subscribers_path", "SUBSCRIBERS_PATH", str, None),
+    ("calendar_fetch_workers", "CALENDAR_FETCH_WORKERS", int, 8),
+    ("calendar_fetch_timeout", "CALENDAR_FETCH_TIMEOUT", float, 10.0),
+    ("event_store_path", "EVENT_STORE_PATH", str, None),
+    ("event_store_max_age", "EVENT_STORE_MAX_AGE", float, 60.0),
+    ("calendar_watch_url", "CALENDAR_WATCH_URL", str, None),
+    ("calendar_watch_token", "CALENDAR_WATCH_TOKEN", str, None),
+    ("calendar_watch_ttl", "CALENDAR_WATCH_TTL", int, 7 * 24 * 60 * 60),
+    ("calendar_watch_host", "CALENDAR_WATCH_HOST", str, "0.0.0.0"),
+    ("calendar_watch_port", "CALENDAR_WATCH_PORT", int, 8001),
+    ("free_day_start", "FREE_DAY_START", parse_time_of_day, parse_time_of_day("08:00")),
+    ("free_day_end", "FREE_DAY_END", parse_time_of_day, parse_time_of_day("20:00")),
+    ("free_slot_min", "FREE_SLOT_MINUTES", _minutes, timedelta(minutes=30)),
+    ("use_freebusy", "USE_FREEBUSY", _bool, False),
+    ("message_language", "MESSAGE_LANGUAGE", _lower, "de"),
+    # Weather
+    ("city", "CITY", str, None),
+    ("openweather_api_key", "OPENWEATHER_API_KEY", str, None),
+    ("weather_cache_ttl", "WEATHER_CACHE_TTL", float, 600.0),
+    ("include_weather", "INCLUDE_WEATHER_MESSAGE", _bool, False),
+    ("include_funny_weather", "INCLUDE_FUNNY_WEATHER", _bool, False),
+    ("include_outfit_tip", "INCLUDE_OUTFIT_TIP", _bool, False),
+    ("include_event_weather", "INCLUDE_EVENT_WEATHER", _bool, False),
+    # Twilio
+    ("account_sid", "ACCOUNT_SID", str, None),
+    ("api_key_sid", "API_KEY_SID", str, None),
+    ("api_key_secret", "API_KEY_SECRET", str, None),
+    ("chat_service_sid", "CHAT_SERVICE_SID", str, None),
+    ("my_phone_number", "MY_PHONE_NUMBER", str, None),
+    ("twilio_whatsapp_number", "TWILIO_WHATSAPP_NUMBER", str, None),
+    ("conversation_sid_path", "CONVERSATION_SID_PATH", str, "conversation_sid.txt"),
+    ("message_cursor_path", "MESSAGE_CURSOR_PATH", str, "message_cursor.json"),
+    ("outbox_size", "OUTBOX_SIZE", int, 100),
+    ("outbox_rate_per_second", "OUTBOX_RATE_PER_SECOND", float, 1.0),
+    ("outbox_burst", "OUTBOX_BURST", int, 5),
+    # Message intake
+    ("message_mode", "MESSAGE_MODE", _lower, "polling"),
+    ("command_concurrency", "COMMAND_CONCURRENCY", int, 4),
+    ("twilio_auth_token", "TWILIO_AUTH_TOKEN", str, None),
+    ("webhook_public_url", "WEBHOOK_PUBLIC_URL", str, None),
+    ("webhook_host", "WEBHOOK_HOST", str, "0.0.0.0"),
+    ("webhook_port", "WEBHOOK_PORT", int, 8000),
+    # Running several copies
+    ("leader_backend", "LEADER_BACKEND", _lower, None),
+    ("leader_lease_path", "LEADER_LEASE_PATH", str, "leader.lease"),
+    ("leader_lease_ttl", "LEADER_LEASE_TTL", float, 6.0),
+    # Observability
+    ("metrics_host", "METRICS_HOST", str, "127.0.0.1"),
+    ("metrics_port", "METRICS_PORT", int, None),
+    ("trace_commands", "TRACE_COMMANDS", _bool, False),
+)
+
+
+class Settings(namedtuple("Settings", [field[0] for field in FIELDS])):
+    """
+    An immutable, parsed configuration snapshot.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_env(cls, env):
+        """
+        Parses and validates the configuration.
+
+        Args:
+            env (Mapping[str, str]): The variables, e.g. `os.environ`.
+
+        Returns:
+            Settings: The parsed snapshot.
+
+        Raises:
+            ValueError: If any variable cannot be parsed; the message lists all of them.
+        """
+        values = {}
+        errors = []
+        for name, variable, parse, default in FIELDS:
+            raw = env.get(variable)
+            if raw is None or not raw.strip():
+                values[name] = default
+                continue
+            try:
+                values[name] = parse(raw.strip())
+            except (ValueError, KeyError) as e:
+                errors.append(f"{variable}={raw!r} ({e})")
+        if errors:
+            raise ValueError("Ungültige Einstellungen: " + ", ".join(errors))
+        return cls(**values)
+
+    def changed(self, other):
+        """
+        Returns:
+            set: The names of the fields whose values differ from `other`.
+        """
+        return {name for name, a, b in zip(self._fields, self, other) if a != b}
+
+
+def load_settings(path=ENV_PATH):
+    """
+    Reads the configuration from `path` and the process environment.
+
+    Args:
+        path (str): The .env file; a missing file is treated as empty.
+
+    Returns:
+        Settings: The parsed snapshot.
+    """
+    env = {key: value for key, value in dotenv_values(path).items() if value is not None}
+    env.update(os.environ)
+    return Settings.from_env(env)
+
+
+_settings = None
+_settings_lock = threading.Lock()
+_listeners = []
+_watcher = None
+
+
+def get_settings():
+    """
+    Returns the current snapshot, loading it on first use.
+
+    The snapshot is replaced as a whole on reload, so a caller that reads several fields
+    from one returned object always sees a consistent configuration.
+
+    Returns:
+        Settings: The current configuration.
+    """
+    global _settings
+    settings = _settings
+    if settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = load_settings()
+            settings = _settings
+    return settings
+
+
+def on_change(listener):
+    """
+    Registers a listener called as `listener(old, new, changed)` after a reload changed
+    at least one field. Listeners run on the watcher thread.
+
+    Args:
+        listener (Callable[[Settings, Settings, set], None]): The listener.
+    """
+    _listeners.append(listener)
+
+
+def reload_settings(path=ENV_PATH):
+    """
+    Loads a new snapshot and notifies the listeners if anything changed.
+
+    An invalid configuration is reported and the previous snapshot stays in place.
+
+    Returns:
+        set: The names of the changed fields.
+    """
+    global _settings
+    old = get_settings()
+    try:
+        new = load_settings(path)
+    except ValueError as e:
+        print(f"⚠️ {e} – bisherige Einstellungen bleiben aktiv.")
+        return set()
+    changed = new.changed(old)
+    if not changed:
+        return changed
+    with _settings_lock:
+        _settings = new
+    print(f"🔧 Einstellungen neu geladen: {', '.join(sorted(changed))}")
+    for listener in list(_listeners):
+        try:
+            listener(old, new, changed)
+        except Exception as e:
+            print(f"❌ Einstellungen konnten nicht übernommen werden: {e}")
+    return changed
+
+
+def watch_settings(path=ENV_PATH, interval=WATCH_INTERVAL_SECONDS):
+    """
+    Starts the background thread that reloads the snapshot when `path` changes.
+    Calling it again has no effect.
+    """
+    global _watcher
+    get_settings()
+    with _settings_lock:
+        if _watcher is None:
+            _watcher = threading.Thread(target=_watch, args=(path, interval), name="settings", daemon=True)
+            _watcher.start()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _watch(path, interval):
+    last = _mtime(path)
+    while True:
+        time.sleep(interval)
+        current = _mtime(path)
+        if current != last:
+            last = current
+            reload_settings(path)
@@ -0,0 +1,38 @@
+"""
+time_parse.py
+
+Parses the wall clock times used in the configuration, e.g. `DAILY_REMINDER_TIME=08:00`
+or `WEEKLY_SUMMARY_TIME=Mo 07:30`.
+"""
+
+from datetime import datetime
+
+WEEKDAYS = {"mo": 0, "di": 1, "mi": 2, "do": 3, "fr": 4, "sa": 5, "so": 6}
+
+
+def parse_time_of_day(value):
+    """
+    Parses a wall clock time in the format 'HH:MM'.
+
+    Args:
+        value (str): The time string, e.g. "08:00".
+
+    Returns:
+        datetime.time: The parsed time of day.
+    """
+    hour, minute = map(int, value.strip().split(":"))
+    return datetime.min.replace(hour=hour, minute=minute).time()
+
+
+def parse_weekly_time(value):
+    """
+    Parses a weekday and wall clock time in the format 'Mo 07:30'.
+
+    Args:
+        value (str): German weekday abbreviation (Mo–So) followed by 'HH:MM'.
+
+    Returns:
+        tuple: The weekday (0 = Monday) and the time of day.
+    """
+    day, at = value.split()
+    return WEEKDAYS[day.strip().lower()[:2]], parse_time_of_day(at)
@@ -0,0 +1,105 @@
+"""
+tracing.py
+
+Optional span tracing of single operations, e.g. one command.
+
+`trace(name)` opens a root span on the current thread and `span(name)` nests a child
+span inside it; when the root ends, the tree with its durations is printed as one
+line. Tracing is switched on with 'TRACE_COMMANDS=true'. When it is off, or when
+`span` is used outside of a trace (such as on a worker thread), both return a shared
+no-op context manager, so instrumented code pays only for a flag check.
+"""
+
+import threading
+import time
+
+from utils.settings import get_settings
+
+_local = threading.local()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    A timed section of a trace.
+
+    Attributes:
+        name (str): What the section does.
+        duration (float or None): Seconds the section took, None while it runs.
+        children (list): The spans opened inside this one.
+    """
+
+    __slots__ = ("name", "started", "duration", "children", "parent")
+
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.duration = None
+
+    def __enter__(self):
+        if self.parent is not None:
+            self.parent.children.append(self)
+        _local.current = self
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        _local.current = self.parent
+        if self.parent is None:
+            print(f"🔍 {format_span(self)}" + (f" (Fehler: {exc!r})" if exc_type else ""))
+        return False
+
+
+def trace(name):
+    """
+    Opens a root span if tracing is enabled.
+
+    Args:
+        name (str): The traced operation, e.g. "Befehl 1".
+
+    Returns:
+        Span or the no-op span.
+    """
+    if not get_settings().trace_commands:
+        return NOOP_SPAN
+    return Span(name, getattr(_local, "current", None))
+
+
+def span(name):
+    """
+    Opens a child span inside the current thread's trace.
+
+    Args:
+        name (str): The traced section, e.g. "events".
+
+    Returns:
+        Span or the no-op span if no trace is active on this thread.
+    """
+    parent = getattr(_local, "current", None)
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent)
+
+
+def format_span(root):
+    """
+    Renders a finished span tree like 'Befehl 1 182.4 ms [events 170.2 ms [sync 168.0 ms], format 1.1 ms]'.
+    """
+    text = f"{root.name} {root.duration * 1000:.1f} ms"
+    if root.children:
+        text += " [" + ", ".join(format_span(child) for child in root.children) + "]"
+    return text